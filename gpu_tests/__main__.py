@@ -0,0 +1,7 @@
+import sys
+
+from gpu_tests.cli import main
+
+# Guarded so that worker processes spawned by the tests can re-import this module without re-running the CLI
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import math
+import statistics
+
+from gpu_tests.warmup import slope
+
+# A measurement stops once the 95% confidence interval of its mean throughput is within ±DEFAULT_REL_WIDTH of the
+# mean, after at least MIN_ITERATIONS iterations and MIN_SECONDS; MAX_SECONDS is as long as it may take
+DEFAULT_REL_WIDTH = 0.01
+MIN_ITERATIONS = 5
+MIN_SECONDS = 10
+MAX_SECONDS = 60
+
+# The rule is evaluated at most once per CHECK_INTERVAL seconds, so that it costs little however short the iterations
+CHECK_INTERVAL = 1.0
+
+# The interval is that of the means of at most MAX_BATCHES consecutive batches of iterations, so that long runs of
+# correlated iterations (clock and temperature drift) do not look more certain than they are
+MAX_BATCHES = 20
+
+# Early results that send a GPU on to the full length run: a peak temperature this close to the 85°C limit of the
+# performance report, on top of a throughput that does not settle or fails its verdict
+SUSPICIOUS_TEMPERATURE = 80
+
+# Two-sided 95% quantiles of Student's t distribution by degrees of freedom (1.96 beyond the table)
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+        2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def t_quantile(degrees_of_freedom):
+    return T_95[degrees_of_freedom - 1] if degrees_of_freedom <= len(T_95) else 1.96
+
+
+def confidence_interval(values, max_batches=MAX_BATCHES):
+    # (mean, half width) of the 95% interval of the mean, or None for fewer than 2 values. Up to `max_batches`
+    # values each is its own batch; beyond that the most recent values are split into `max_batches` batches.
+    if len(values) < 2:
+        return None
+    batches = min(len(values), max_batches)
+    size = len(values) // batches
+    recent = values[len(values) - batches * size:]
+    means = [statistics.fmean(recent[i:i + size]) for i in range(0, len(recent), size)]
+    return statistics.fmean(values), t_quantile(batches - 1) * statistics.stdev(means) / math.sqrt(batches)
+
+
+class AdaptiveStop:
+    # Stopping rule for a throughput measurement: add() every iteration's value, stop when it returns True.
+    # Besides a narrow interval, the least squares trend over the whole measurement must also be within the
+    # width: a throughput sliding steadily (e.g. as the GPU heats up) has a narrow interval but is not settled.
+    # The caller keeps its own time limit (MAX_SECONDS); summary() says whether the rule got there first.
+
+    def __init__(self, rel_width=DEFAULT_REL_WIDTH, min_iterations=MIN_ITERATIONS, min_seconds=MIN_SECONDS,
+                 max_seconds=MAX_SECONDS):
+        self.rel_width = rel_width
+        self.min_iterations = min_iterations
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.values = []
+        self.times = []
+        self.interval = None
+        self.trend = None
+        self.converged = False
+        self.last_check = None
+
+    def add(self, value, elapsed):
+        # `elapsed`: seconds since the measurement started
+        self.values.append(value)
+        self.times.append(elapsed)
+        if len(self.values) < self.min_iterations or elapsed < self.min_seconds:
+            return False
+        if self.last_check is not None and elapsed - self.last_check < CHECK_INTERVAL:
+            return False
+        self.last_check = elapsed
+        self.interval = confidence_interval(self.values)
+        mean, half_width = self.interval
+        if mean <= 0:
+            return False
+        # Change of the fitted line from the first to the last iteration, as a fraction of the mean
+        self.trend = abs(slope(self.times, self.values) or 0.0) * (self.times[-1] - self.times[0]) / mean
+        self.converged = half_width <= self.rel_width * mean and self.trend <= self.rel_width
+        return self.converged
+
+    def summary(self):
+        mean, half_width = self.interval or (statistics.fmean(self.values) if self.values else None, None)
+        return {"state": "converged" if self.converged else "max time", "rel_width": self.rel_width,
+                "seconds": self.times[-1] if self.times else 0.0, "iterations": len(self.values), "mean": mean,
+                "half_width": half_width, "trend": self.trend, "max_seconds": self.max_seconds, "escalated": []}
+
+
+def escalation_reasons(summary, verdict=None, peak_temperature=None):
+    # Why an adaptive measurement should be repeated at full length; [] if it looks healthy
+    reasons = []
+    if summary["state"] != "converged":
+        reasons.append(f"throughput did not settle within ±{summary['rel_width']:.1%} in {summary['max_seconds']:.0f}s")
+        if summary["trend"] is not None and summary["trend"] > summary["rel_width"]:
+            reasons.append(f"throughput trending by {summary['trend']:.1%} over the measurement")
+    if verdict is not None:
+        reasons.extend(verdict["reasons"])
+    if peak_temperature is not None and peak_temperature >= SUSPICIOUS_TEMPERATURE:
+        reasons.append(f"peak temperature {peak_temperature}°C")
+    return reasons
+
+
+def format_adaptive(summary):
+    line = f"Adaptive: {summary['state']} after {summary['seconds']:.0f}s ({summary['iterations']} iterations"
+    if summary["half_width"] is not None and summary["mean"]:
+        line += f", ±{summary['half_width'] / summary['mean']:.2%} at 95%"
+    lines = [line + ")"]
+    if summary["escalated"]:
+        lines.append(f"Escalated to the full length run: {'; '.join(summary['escalated'])}")
+    return lines
@@ -0,0 +1,277 @@
+import contextlib
+import os
+import threading
+import time
+
+import torch
+
+from gpu_tests import devices
+from gpu_tests.recorder import TimeSeriesRecorder
+from gpu_tests.timing import summarize
+from gpu_tests.verdict import throttling
+
+# gemm: half precision matrix multiplications (SMs, clocks and power)
+# hbm:  device memory to device memory copies (HBM bandwidth)
+# p2p:  copies to the next GPU in a ring (NVLink/NVSwitch, or PCIe)
+WORKLOADS = ["gemm", "hbm", "p2p"]
+
+# Fraction of every DUTY_PERIOD each workload is busy; busy phases start together at the top of each period,
+# so the workloads overlap as much as their duty cycles allow
+DEFAULT_MIX = {"gemm": 1.0, "hbm": 1.0, "p2p": 1.0}
+DUTY_PERIOD = 2.0  # seconds
+SOLO_SECONDS = 10
+
+# A workload is flagged when it keeps less than this fraction of its solo throughput while the others run
+MIN_SHARED_FRACTION = 0.5
+
+
+def parse_mix(text):
+    # "gemm=1,hbm=0.5,p2p=0.25" -> {"gemm": 1.0, "hbm": 0.5, "p2p": 0.25}; workloads left out do not run
+    mix = {}
+    for part in text.split(","):
+        name, _, duty = part.strip().partition("=")
+        if name not in WORKLOADS:
+            raise ValueError(f"Unknown burn-in workload: {name} (choose from {', '.join(WORKLOADS)})")
+        duty = float(duty) if duty else 1.0
+        if not 0 < duty <= 1:
+            raise ValueError(f"The duty cycle of {name} must be in (0, 1], not {duty}")
+        mix[name] = duty
+    return mix
+
+
+class Workload:
+    # One resource exercised on its own stream of one GPU; step() issues one unit of work of `amount` (FLOPs or
+    # bytes), reported in `unit` after dividing by `scale`
+
+    name = None
+    unit = None
+    scale = None
+
+    def __init__(self, gpu_index, device):
+        self.gpu_index = gpu_index
+        self.device = device
+        self.stream = torch.cuda.Stream(device) if device.type == "cuda" else None
+        self.amount = None
+
+    def stream_context(self):
+        return torch.cuda.stream(self.stream) if self.stream is not None else contextlib.nullcontext()
+
+    def synchronize(self):
+        if self.stream is not None:
+            self.stream.synchronize()
+
+    def step(self):
+        raise NotImplementedError
+
+
+class GemmWorkload(Workload):
+    name = "gemm"
+    unit = "TFLOPS"
+    scale = 1e12
+
+    def __init__(self, gpu_index, device, size=None):
+        super().__init__(gpu_index, device)
+        size = size or (8192 if device.type == "cuda" else 256)
+        dtype = torch.float16 if device.type == "cuda" else torch.float32
+        self.a = torch.randn(size, size, dtype=dtype, device=device)
+        self.b = torch.randn(size, size, dtype=dtype, device=device)
+        self.c = torch.empty(size, size, dtype=dtype, device=device)
+        self.amount = 2 * size**3
+
+    def step(self):
+        with self.stream_context():
+            torch.matmul(self.a, self.b, out=self.c)
+
+
+class HBMWorkload(Workload):
+    name = "hbm"
+    unit = "GB/s"
+    scale = 1e9
+
+    def __init__(self, gpu_index, device, size_bytes=None):
+        super().__init__(gpu_index, device)
+        size_bytes = size_bytes or (2 * 1024**3 if device.type == "cuda" else 16 * 1024**2)
+        self.src = torch.empty(size_bytes, dtype=torch.uint8, device=device)
+        self.dst = torch.empty_like(self.src)
+        # Every byte is read once and written once
+        self.amount = 2 * size_bytes
+
+    def step(self):
+        with self.stream_context():
+            self.dst.copy_(self.src)
+
+
+class P2PWorkload(Workload):
+    name = "p2p"
+    unit = "GB/s"
+    scale = 1e9
+
+    def __init__(self, gpu_index, device, peer_index, peer_device, size_bytes=None):
+        super().__init__(gpu_index, device)
+        size_bytes = size_bytes or (256 * 1024**2 if device.type == "cuda" else 16 * 1024**2)
+        self.peer_index = peer_index
+        self.src = torch.empty(size_bytes, dtype=torch.uint8, device=device)
+        self.dst = torch.empty(size_bytes, dtype=torch.uint8, device=peer_device)
+        self.amount = size_bytes
+
+    def step(self):
+        # The copy runs on the source GPU's stream, as in gpu_tests/p2p.py
+        with self.stream_context():
+            self.dst.copy_(self.src, non_blocking=True)
+
+
+def make_workloads(backend, gpus, names):
+    # One workload of each name per GPU; p2p sends to the next GPU of `gpus` and needs at least two
+    workloads = []
+    for i, gpu_index in enumerate(gpus):
+        device = devices.get_device(backend, gpu_index)
+        if "gemm" in names:
+            workloads.append(GemmWorkload(gpu_index, device))
+        if "hbm" in names:
+            workloads.append(HBMWorkload(gpu_index, device))
+        if "p2p" in names and len(gpus) > 1:
+            peer = gpus[(i + 1) % len(gpus)]
+            workloads.append(P2PWorkload(gpu_index, device, peer, devices.get_device(backend, peer)))
+    return workloads
+
+
+def series_name(workload):
+    if workload.name == "p2p":
+        return f"p2p_gpu{workload.gpu_index}_to_gpu{workload.peer_index}"
+    return f"{workload.name}_gpu{workload.gpu_index}"
+
+
+class BurnIn:
+    # Runs workloads concurrently, each on its own thread and stream, busy for its duty cycle of every period.
+    # Every busy phase is timed as a burst (its steps, then a stream synchronisation) and recorded per workload
+    # in a time series together with how many other workloads were busy at the time.
+
+    def __init__(self, workloads, mix, timeseries_dir, period=DUTY_PERIOD):
+        self.workloads = workloads
+        self.mix = mix
+        self.timeseries_dir = timeseries_dir
+        self.period = period
+        self.busy = 0
+        self.lock = threading.Lock()
+        self.errors = {}
+
+    def _bursts(self, workload, recorder, start_time, end_time, duty):
+        while time.monotonic() < end_time:
+            now = time.monotonic()
+            period_start = start_time + (now - start_time) // self.period * self.period
+            busy_until = min(period_start + duty * self.period, end_time)
+            if now >= busy_until:
+                time.sleep(min(period_start + self.period, end_time) - now)
+                continue
+            with self.lock:
+                self.busy += 1
+            try:
+                # The other workloads busy at the end of each step, averaged over the burst
+                steps, others = 0, 0
+                burst_start = time.perf_counter()
+                while time.monotonic() < busy_until:
+                    workload.step()
+                    workload.synchronize()
+                    steps += 1
+                    others += self.busy - 1
+                elapsed = time.perf_counter() - burst_start
+            finally:
+                with self.lock:
+                    self.busy -= 1
+            recorder.record(throughput=workload.amount * steps / elapsed / workload.scale, steps=steps,
+                            concurrent=others / steps)
+
+    def _run_workload(self, workload, phase, duration, duty):
+        path = os.path.join(self.timeseries_dir, phase, series_name(workload))
+        with TimeSeriesRecorder(path, ["throughput", "steps", "concurrent"]) as recorder:
+            try:
+                start_time = time.monotonic()
+                self._bursts(workload, recorder, start_time, start_time + duration, duty)
+            except Exception as e:
+                self.errors[series_name(workload)] = f"{type(e).__name__}: {e}"
+                print(f"Burn-in workload {series_name(workload)} failed: {e}")
+        return recorder
+
+    def run_phase(self, phase, workloads, duration, mix):
+        # Runs `workloads` together for `duration` seconds; returns {series name: recorder}
+        recorders = {}
+        def run(workload):
+            recorders[series_name(workload)] = self._run_workload(workload, phase, duration, mix[workload.name])
+        threads = [threading.Thread(target=run, args=(workload,), name=series_name(workload))
+                   for workload in workloads]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return recorders
+
+    def run(self, duration, solo_seconds=SOLO_SECONDS):
+        # Each kind of workload first runs alone (on all GPUs, fully busy) for `solo_seconds` as its reference,
+        # then all of them run together with the duty cycle mix for `duration` seconds
+        solo = {}
+        for name in self.mix:
+            kind = [workload for workload in self.workloads if workload.name == name]
+            if kind and solo_seconds:
+                print(f"Solo reference: {name} for {solo_seconds:.0f}s")
+                solo.update(self.run_phase("solo", kind, solo_seconds, {name: 1.0}))
+        print(f"Burn-in: {', '.join(f'{name} {duty:.0%}' for name, duty in self.mix.items())} "
+              f"of every {self.period:g}s for {duration:.0f}s")
+        mixed = self.run_phase("mixed", self.workloads, duration, self.mix)
+        return summarize_burn_in(self.workloads, solo, mixed, self.errors)
+
+
+def summarize_burn_in(workloads, solo, mixed, errors):
+    # One row per workload: median throughput alone and mixed, the fraction kept under interference, the median
+    # while every other workload was busy, and any throttling of the mixed series (gpu_tests/verdict.py)
+    rows = []
+    for workload in workloads:
+        name = series_name(workload)
+        row = {"workload": workload.name, "series": name, "gpu": workload.gpu_index, "unit": workload.unit,
+               "solo": None, "mixed": None, "p5": None, "fraction": None, "all_busy": None, "throttling": None,
+               "timeseries": None, "error": errors.get(name)}
+        if name in solo:
+            stats = summarize(solo[name].overview.series("throughput"))
+            row["solo"] = stats["median"] if stats else None
+        if name in mixed:
+            recorder = mixed[name]
+            values = recorder.overview.series("throughput")
+            times = recorder.overview.series("timestamp")
+            stats = summarize(values)
+            if stats:
+                row["mixed"] = stats["median"]
+                row["p5"] = stats["p5"]
+                row["fraction"] = row["mixed"] / row["solo"] if row["solo"] else None
+                concurrent = [round(c) for c in recorder.overview.series("concurrent")]
+                busiest = max(concurrent)
+                row["all_busy"] = summarize([v for v, c in zip(values, concurrent) if c == busiest])["median"]
+                row["throttling"] = throttling(values, [t - times[0] for t in times])
+            row["timeseries"] = recorder.path
+        row["verdict"] = burn_in_verdict(row)
+        rows.append(row)
+    return rows
+
+
+def burn_in_verdict(row):
+    if row["error"] or row["mixed"] is None:
+        return "FAIL"
+    if row["throttling"] is not None:
+        return "FAIL"
+    if row["fraction"] is not None and row["fraction"] < MIN_SHARED_FRACTION:
+        return "FAIL"
+    return "PASS"
+
+
+def format_burn_in_table(rows):
+    header = f"{'workload':<24} {'unit':>7} {'solo':>9} {'mixed':>9} {'kept':>6} {'all busy':>9} {'verdict':>8}"
+    lines = [header, "-" * len(header)]
+    def value(v, fmt):
+        return format(v, fmt) if v is not None else "-"
+    for row in rows:
+        lines.append(f"{row['series']:<24} {row['unit']:>7} {value(row['solo'], '9.2f')} {value(row['mixed'], '9.2f')} "
+                     f"{value(row['fraction'], '6.0%')} {value(row['all_busy'], '9.2f')} {row['verdict']:>8}")
+        if row["error"]:
+            lines.append(f"  error: {row['error']}")
+        if row["throttling"] is not None:
+            lines.append(f"  degraded from {row['throttling']['onset_s']:.0f}s on, "
+                         f"{row['throttling']['severity']:.0%} below its earlier throughput")
+    return lines
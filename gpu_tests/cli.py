@@ -0,0 +1,224 @@
+import argparse
+import datetime
+import os
+import time
+import traceback
+
+from gpu_tests import fleet, profiling, results, slurm
+from gpu_tests.registry import default_suite, load_plugins
+
+# gpu_tests.devices.BACKENDS, spelled out so that building the parser does not import torch
+BACKENDS = ["cuda", "cpu"]
+
+
+def add_shared_arguments(parser):
+    parser.add_argument("--gpu", type=int, nargs='*', help="GPU indices to test (default: all GPUs)")
+    parser.add_argument("--device", choices=BACKENDS, default="cuda", help="Device backend; 'cpu' runs on fake devices for testing (default: cuda)")
+    parser.add_argument("--duration", type=float, help="Seconds to run each timed test (default: the test's own duration)")
+    parser.add_argument("--profile", metavar="DIR", help="Time the hot sections of the tests and write a Chrome trace and summary per process to DIR (default: off)")
+    parser.add_argument("--torch-profiler", action="store_true", help="With --profile, also run torch.profiler and export its trace; for short runs")
+
+
+def build_parser(tests):
+    parser = argparse.ArgumentParser(prog="python -m gpu_tests", description="GPU node validation tests")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List the available tests")
+    test_parsers = {}
+    for name, test in tests.items():
+        test_parsers[name] = subparsers.add_parser(name, help=test.help, description=test.help)
+        add_shared_arguments(test_parsers[name])
+        test.add_arguments(test_parsers[name])
+    suite = subparsers.add_parser("suite", help="Run several tests one after another, e.g. one node validation per job",
+                                  description="Run several tests one after another with their default options")
+    suite.add_argument("tests", nargs='*', help=f"Tests to run, in order: {', '.join(tests)} (default: {', '.join(default_suite(tests))})")
+    add_shared_arguments(suite)
+
+    results_parser = subparsers.add_parser("results", help="Query the baseline store of structured results",
+                                           description="Query the baseline store of structured results (gpu_tests/results.py)")
+    actions = results_parser.add_subparsers(dest="action", required=True)
+    import_parser = actions.add_parser("import", help="Add JSONL result files, e.g. collected from many nodes, to the store")
+    import_parser.add_argument("files", nargs='+', help="JSONL files written by the tests")
+    outliers_parser = actions.add_parser("outliers", help="GPUs whose latest result is far from the fleet median for their model")
+    outliers_parser.add_argument("--test", required=True, help="Test name, e.g. perf, stress, nvlink")
+    outliers_parser.add_argument("--metric", required=True, help="Metric name, e.g. flops_median or bandwidth_gbps_median")
+    outliers_parser.add_argument("--sigma", type=float, default=3.0, help="Robust standard deviations from the fleet median (default: 3)")
+    outliers_parser.add_argument("--model", help="Only this GPU model")
+    outliers_parser.add_argument("--min-group", type=int, default=3, help="Smallest fleet worth comparing against (default: 3)")
+    export_parser = actions.add_parser("export", help="Write the stored results as CSV")
+    export_parser.add_argument("--test", help="Only this test")
+    export_parser.add_argument("--csv", required=True, help="Output CSV file")
+    for action in [import_parser, outliers_parser, export_parser]:
+        action.add_argument("--db", default=results.DEFAULT_BASELINE_DB, help=f"Baseline store (default: {results.DEFAULT_BASELINE_DB})")
+
+    fleet_parser = subparsers.add_parser("fleet", help="Aggregate the result files of many nodes into one report",
+                                         description="Aggregate JSONL results and text reports of many nodes (gpu_tests/fleet.py)")
+    fleet_parser.add_argument("paths", nargs='+', help="Result files (*.jsonl, hostname.txt, hostname_performance.txt) or directories of them")
+    fleet_parser.add_argument("--html", help="Also write a self-contained HTML report to this file")
+    fleet_parser.add_argument("--jobs", type=int, help="Processes parsing the files (default: one per CPU)")
+    fleet_parser.add_argument("--sigma", type=float, default=3.0, help="Robust standard deviations from the model median for an outlier (default: 3)")
+    fleet_parser.add_argument("--min-group", type=int, default=3, help="Smallest group of GPUs worth comparing against (default: 3)")
+
+    slurm_parser = subparsers.add_parser("slurm", help="Run the tests on many nodes through SLURM",
+                                         description="Run the tests on many nodes through SLURM (gpu_tests/slurm.py)")
+    actions = slurm_parser.add_subparsers(dest="action", required=True)
+    submit_parser = actions.add_parser("submit", help="Write and submit a batch script running the tests on every node")
+    submit_parser.add_argument("tests", nargs='*', help=f"Tests to run on each node, in order: {', '.join(tests)} (default: {', '.join(default_suite(tests))})")
+    submit_parser.add_argument("--nodes", type=int, help="Number of nodes (default: the length of --nodelist)")
+    submit_parser.add_argument("--nodelist", nargs='*', help="Nodes to test; needs --mode srun")
+    submit_parser.add_argument("--mode", choices=slurm.MODES, default="srun", help="One srun task per node of a single allocation, or one job array task per node; array tasks may share a node (default: srun)")
+    submit_parser.add_argument("--results-dir", required=True, help="Shared directory the nodes write their results to, one subdirectory per node")
+    submit_parser.add_argument("--account", help="SLURM account")
+    submit_parser.add_argument("--partition", help="SLURM partition")
+    submit_parser.add_argument("--gpus-per-node", help="GPUs to allocate on each node, e.g. A100:4")
+    submit_parser.add_argument("--time", default="01:00:00", help="Time limit of each job (default: 01:00:00)")
+    submit_parser.add_argument("--module", nargs='*', default=[], help="Environment modules to load, e.g. PyTorch/1.12.1-gimkl-2022a-Python-3.10.5-CUDA-11.6.2")
+    submit_parser.add_argument("--python", default="python", help="Python interpreter on the nodes (default: python)")
+    submit_parser.add_argument("--sbatch", default="sbatch", help="sbatch command; 'python -m gpu_tests.fake_slurm sbatch' runs the job locally (default: sbatch)")
+    submit_parser.add_argument("--wait", action="store_true", help="Wait for the job to finish and print the fleet summary of its results")
+    submit_parser.add_argument("--dry-run", action="store_true", help="Write the batch script without submitting it")
+    add_shared_arguments(submit_parser)
+    node_parser = actions.add_parser("node", help="Run the tests on this node of a job (used by the batch script)")
+    node_parser.add_argument("tests", nargs='*', help="Tests to run, in order (default: those of suite)")
+    node_parser.add_argument("--results-dir", required=True, help="Shared results directory")
+    add_shared_arguments(node_parser)
+    status_parser = actions.add_parser("status", help="Which nodes have finished, and how")
+    status_parser.add_argument("--results-dir", required=True, help="Shared results directory")
+    return parser, test_parsers
+
+
+def run_suite(tests, test_parsers, args):
+    # Runs each test with its own defaults plus the shared options; a failing test does not stop the rest
+    failed = []
+    for name in args.tests or default_suite(tests):
+        test_args = test_parsers[name].parse_args([])
+        test_args.gpu, test_args.device, test_args.duration = args.gpu, args.device, args.duration
+        test_args.profile, test_args.torch_profiler = args.profile, args.torch_profiler
+        print(f"=== {name} ===")
+        start_time = time.time()
+        try:
+            with profiling.session(args.profile, name, args.torch_profiler):
+                tests[name].run(test_args)
+            print(f"=== {name} finished in {time.time() - start_time:.0f}s ===")
+        except Exception:
+            traceback.print_exc()
+            print(f"=== {name} FAILED after {time.time() - start_time:.0f}s ===")
+            failed.append(name)
+    if failed:
+        print(f"Failed tests: {', '.join(failed)}")
+    return 1 if failed else 0
+
+
+def run_results(args):
+    if args.action == "import":
+        read, added = results.import_jsonl(args.db, args.files)
+        print(f"Added {added} results to {args.db}" + (f" ({read - added} already stored)" if read > added else ""))
+        return 0
+    with results.BaselineStore(args.db) as store:
+        if args.action == "export":
+            records = store.records(args.test)
+            results.write_csv(args.csv, records)
+            print(f"Wrote {len(records)} results to {args.csv}")
+            return 0
+        entries = store.latest(args.test, args.metric, args.model)
+    flagged = results.outliers(entries, args.sigma, args.min_group)
+    print(f"{len(flagged)} of {len(entries)} GPUs beyond {args.sigma:g} sigma of the fleet median ({args.test} {args.metric})")
+    if flagged:
+        print("\n".join(results.format_outliers(flagged, args.metric)))
+    return 1 if flagged else 0
+
+
+def run_fleet(args):
+    records, errors = fleet.load_results(args.paths, args.jobs)
+    summary = fleet.aggregate(records, args.sigma, args.min_group)
+    print("\n".join(fleet.format_summary(summary, errors)))
+    if args.html:
+        with open(args.html, 'w') as f:
+            f.write(fleet.format_html(summary, errors))
+        print(f"HTML report saved to {args.html}")
+    return 1 if summary["failures"] or summary["outliers"] else 0
+
+
+def run_slurm(tests, test_parsers, args):
+    if args.action == "status":
+        statuses = slurm.read_statuses(args.results_dir)
+        for node, status in statuses.items():
+            outcome = "ok" if status["returncode"] == 0 else "FAILED"
+            print(f"{node:<20} {outcome:<7} job {status['job_id']} GPUs {status['gpus']} finished {status['end']}")
+        failed = [node for node, status in statuses.items() if status["returncode"] != 0]
+        print(f"{len(statuses)} nodes finished, {len(failed)} with failed tests")
+        return 1 if failed else 0
+
+    if args.action == "node":
+        # Each node works in its own subdirectory, so reports named after the host cannot collide
+        directory = os.path.join(os.path.abspath(args.results_dir), slurm.node_name())
+        os.makedirs(directory, exist_ok=True)
+        os.chdir(directory)
+        count = slurm.node_gpu_count()
+        if args.gpu is None and count is not None:
+            args.gpu = list(range(count))
+        print(f"Node {slurm.node_name()}: GPUs {args.gpu if args.gpu is not None else 'all'}, results in {directory}")
+        start_time = datetime.datetime.now(datetime.timezone.utc)
+        returncode = run_suite(tests, test_parsers, args)
+        slurm.write_status(directory, args.tests or default_suite(tests), returncode, start_time)
+        return returncode
+
+    nodes = args.nodes or len(args.nodelist or [])
+    if nodes < 1:
+        raise SystemExit("slurm submit: give --nodes or --nodelist")
+    if args.nodelist and args.mode != "srun":
+        raise SystemExit("slurm submit: --nodelist needs --mode srun")
+    results_dir = os.path.abspath(args.results_dir)
+    os.makedirs(os.path.join(results_dir, "slog"), exist_ok=True)
+    script = slurm.batch_script(args.tests, results_dir, nodes, args.mode, args.account, args.partition,
+                                args.gpus_per_node, args.time, ",".join(args.nodelist or []) or None, args.module,
+                                args.python, args.device, args.duration)
+    script_path = os.path.join(results_dir, f"gpu_tests_{datetime.datetime.now():%Y%m%d_%H%M%S}.sl")
+    with open(script_path, 'w') as f:
+        f.write(script)
+    print(f"Batch script written to {script_path}")
+    if args.dry_run:
+        return 0
+    job_id, job_returncode = slurm.submit(script_path, args.sbatch, args.wait)
+    print(f"Job {job_id}: {nodes} nodes, results in {results_dir}")
+    if not args.wait:
+        print(f"When it has finished: python -m gpu_tests slurm status --results-dir {results_dir}")
+        print(f"                      python -m gpu_tests fleet {results_dir}")
+        return 0
+    if job_returncode:
+        print(f"Job {job_id} exited with code {job_returncode}")
+    returncode = run_slurm(tests, test_parsers, argparse.Namespace(action="status", results_dir=results_dir))
+    # Nodes that were never started or died before writing their status leave nothing to find
+    reported = len(slurm.read_statuses(results_dir))
+    if reported != nodes:
+        print(f"{reported} of {nodes} nodes reported a status")
+    summary = fleet.aggregate(fleet.load_results([results_dir])[0])
+    print("\n".join(fleet.format_summary(summary)))
+    return 1 if job_returncode or returncode or reported != nodes or summary["failures"] else 0
+
+
+def main(argv=None):
+    tests = load_plugins()
+    parser, test_parsers = build_parser(tests)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name, test in tests.items():
+            print(f"{name:<12} {test.help}")
+        return 0
+    if args.command == "suite":
+        unknown = [name for name in args.tests if name not in tests]
+        if unknown:
+            parser.error(f"unknown tests: {', '.join(unknown)}")
+        return run_suite(tests, test_parsers, args)
+    if args.command == "results":
+        return run_results(args)
+    if args.command == "fleet":
+        return run_fleet(args)
+    if args.command == "slurm":
+        unknown = [name for name in getattr(args, "tests", []) if name not in tests]
+        if unknown:
+            parser.error(f"unknown tests: {', '.join(unknown)}")
+        return run_slurm(tests, test_parsers, args)
+    with profiling.session(args.profile, args.command, args.torch_profiler):
+        tests[args.command].run(args)
+    return 0
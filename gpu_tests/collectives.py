@@ -0,0 +1,194 @@
+import os
+import re
+import subprocess
+import time
+
+import torch
+import torch.distributed as dist
+
+from gpu_tests.h2d import format_size, iterations_for
+
+COLLECTIVES = ["all_reduce", "all_gather", "reduce_scatter", "broadcast", "all_to_all"]
+
+# Bus bandwidth = algorithm bandwidth x this factor for n ranks, as in nccl-tests (doc/PERFORMANCE.md):
+# the traffic over the busiest link of an optimal ring, comparable with the hardware link bandwidth
+BUS_FACTORS = {
+    "all_reduce": lambda n: 2 * (n - 1) / n,
+    "all_gather": lambda n: (n - 1) / n,
+    "reduce_scatter": lambda n: (n - 1) / n,
+    "broadcast": lambda n: 1.0,
+    "all_to_all": lambda n: (n - 1) / n,
+}
+
+DEFAULT_PORT = 29500
+
+# Called _all_gather_base and _reduce_scatter_base before PyTorch 1.13
+all_gather_into_tensor = getattr(dist, "all_gather_into_tensor", None) or getattr(dist, "_all_gather_base", None)
+reduce_scatter_tensor = getattr(dist, "reduce_scatter_tensor", None) or getattr(dist, "_reduce_scatter_base", None)
+
+
+def distributed_environment(environ=None):
+    # (rank, world size, local rank) when launched by torchrun or by srun with several tasks, else None
+    environ = os.environ if environ is None else environ
+    if "RANK" in environ and "WORLD_SIZE" in environ:
+        return int(environ["RANK"]), int(environ["WORLD_SIZE"]), int(environ.get("LOCAL_RANK", 0))
+    if int(environ.get("SLURM_NTASKS", "1")) > 1 and "SLURM_PROCID" in environ:
+        return int(environ["SLURM_PROCID"]), int(environ["SLURM_NTASKS"]), int(environ.get("SLURM_LOCALID", 0))
+    return None
+
+
+def expand_nodelist(nodelist):
+    # SLURM node list ("wmg[001-003,005],wbl001") to host names; scontrol when available, else a simple expansion
+    try:
+        result = subprocess.run(["scontrol", "show", "hostnames", nodelist], capture_output=True, text=True)
+        if result.returncode == 0 and result.stdout.strip():
+            return result.stdout.split()
+    except OSError:
+        pass
+    hosts = []
+    for prefix, ranges, plain in re.findall(r"([^,\[]+)\[([^\]]+)\]|([^,\[\]]+)", nodelist):
+        if plain:
+            hosts.append(plain)
+            continue
+        for part in ranges.split(","):
+            first, _, last = part.partition("-")
+            for number in range(int(first), int(last or first) + 1):
+                hosts.append(f"{prefix}{number:0{len(first)}d}")
+    return hosts
+
+
+def master_address(environ=None):
+    environ = os.environ if environ is None else environ
+    if environ.get("MASTER_ADDR"):
+        return environ["MASTER_ADDR"]
+    if environ.get("SLURM_JOB_NODELIST"):
+        return expand_nodelist(environ["SLURM_JOB_NODELIST"])[0]
+    return "127.0.0.1"
+
+
+def init_process_group(backend, rank, world_size):
+    # nccl for GPUs, gloo for CPU tensors; the rendezvous is rank 0's host unless MASTER_ADDR says otherwise
+    os.environ["MASTER_ADDR"] = master_address()
+    os.environ.setdefault("MASTER_PORT", str(DEFAULT_PORT))
+    dist.init_process_group("nccl" if backend == "cuda" else "gloo", rank=rank, world_size=world_size)
+
+
+class CollectiveBenchmark:
+    # Times collectives over message sizes up to `max_size` bytes, with buffers allocated once for the largest.
+    # As in nccl-tests, the size of a message is that of the whole buffer: all_gather gathers size / n bytes
+    # from every rank, reduce_scatter and all_to_all send size / n bytes to every rank.
+
+    def __init__(self, device, max_size, dtype=torch.float32):
+        self.device = device
+        self.world_size = dist.get_world_size()
+        self.rank = dist.get_rank()
+        self.element_size = torch.tensor([], dtype=dtype).element_size()
+        elements = self.elements(max_size)
+        # Zeros, so that repeated in-place reductions neither overflow nor change the data
+        self.input = torch.zeros(elements, dtype=dtype, device=device)
+        self.output = torch.zeros(elements, dtype=dtype, device=device)
+        self.gloo = dist.get_backend() == "gloo"
+
+    def elements(self, size):
+        # Elements of a message of about `size` bytes, a multiple of the world size so it splits evenly
+        return max(1, size // self.element_size // self.world_size) * self.world_size
+
+    def _run(self, collective, elements):
+        n = self.world_size
+        chunk = elements // n
+        if collective == "all_reduce":
+            dist.all_reduce(self.input[:elements])
+        elif collective == "broadcast":
+            dist.broadcast(self.input[:elements], src=0)
+        elif collective == "all_gather":
+            if self.gloo:
+                dist.all_gather(list(self.output[:elements].chunk(n)), self.input[:chunk])
+            else:
+                all_gather_into_tensor(self.output[:elements], self.input[:chunk])
+        elif collective == "reduce_scatter":
+            reduce_scatter_tensor(self.output[:chunk], self.input[:elements])
+        elif collective == "all_to_all":
+            dist.all_to_all_single(self.output[:elements], self.input[:elements])
+        else:
+            raise ValueError(f"Unknown collective: {collective}")
+
+    def synchronize(self):
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+
+    def time(self, collective, size, iterations, warmup_iterations=5):
+        # Seconds per operation, the slowest rank's average over `iterations`
+        elements = self.elements(size)
+        for _ in range(warmup_iterations):
+            self._run(collective, elements)
+        self.synchronize()
+        dist.barrier()
+        start_time = time.perf_counter()
+        for _ in range(iterations):
+            self._run(collective, elements)
+        self.synchronize()
+        elapsed = torch.tensor([(time.perf_counter() - start_time) / iterations], dtype=torch.float64, device=self.device)
+        dist.all_reduce(elapsed, op=dist.ReduceOp.MAX)
+        return elapsed.item()
+
+    def check_all_reduce(self):
+        # Sum of rank + 1 over all ranks, so a broken link or rank shows up as a wrong value rather than a slow one
+        n = self.world_size
+        value = torch.full((self.elements(1024 * 1024),), self.rank + 1, dtype=self.input.dtype, device=self.device)
+        dist.all_reduce(value)
+        return bool((value == n * (n + 1) / 2).all().item())
+
+    def sweep(self, collectives, sizes, warmup_iterations=5):
+        # One row per collective and size: {"collective", "size", "count", "iterations", "time_us", "algbw_gbps",
+        # "busbw_gbps", "error"}; a collective the backend does not implement gets one row with the error
+        rows = []
+        for collective in collectives:
+            for size in sizes:
+                elements = self.elements(size)
+                iterations = iterations_for(elements * self.element_size)
+                try:
+                    seconds = self.time(collective, size, iterations, warmup_iterations)
+                except (RuntimeError, NotImplementedError) as e:
+                    # gloo implements only some collectives; with nccl every error is a real failure
+                    if not self.gloo:
+                        raise
+                    rows.append({"collective": collective, "size": None, "count": None, "iterations": 0,
+                                 "time_us": None, "algbw_gbps": None, "busbw_gbps": None,
+                                 "error": f"not supported by gloo: {str(e).splitlines()[0]}"})
+                    break
+                algbw = elements * self.element_size / seconds / 1e9
+                rows.append({"collective": collective, "size": elements * self.element_size, "count": elements,
+                             "iterations": iterations, "time_us": seconds * 1e6, "algbw_gbps": algbw,
+                             "busbw_gbps": algbw * BUS_FACTORS[collective](self.world_size), "error": None})
+        return rows
+
+
+def summarize_collectives(rows):
+    # {collective: {"busbw_gbps_peak", "busbw_gbps_avg", "algbw_gbps_peak", "time_us_min_size"}} over the sizes,
+    # the average bus bandwidth being the figure nccl-tests prints at the end of a run
+    summary = {}
+    for collective in dict.fromkeys(row["collective"] for row in rows):
+        timed = [row for row in rows if row["collective"] == collective and row["error"] is None]
+        if timed:
+            summary[collective] = {
+                "busbw_gbps_peak": max(row["busbw_gbps"] for row in timed),
+                "busbw_gbps_avg": sum(row["busbw_gbps"] for row in timed) / len(timed),
+                "algbw_gbps_peak": max(row["algbw_gbps"] for row in timed),
+                "time_us_min_size": timed[0]["time_us"],
+            }
+    return summary
+
+
+def format_collective_table(rows):
+    header = f"{'collective':<15} {'size':>8} {'count':>12} {'time(us)':>11} {'algbw(GB/s)':>12} {'busbw(GB/s)':>12}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        if row["error"]:
+            lines.append(f"{row['collective']:<15} {row['error']}")
+        else:
+            lines.append(f"{row['collective']:<15} {format_size(row['size']):>8} {row['count']:>12} "
+                         f"{row['time_us']:>11.1f} {row['algbw_gbps']:>12.2f} {row['busbw_gbps']:>12.2f}")
+    for collective, stats in summarize_collectives(rows).items():
+        lines.append(f"{collective}: average bus bandwidth {stats['busbw_gbps_avg']:.2f} GB/s, "
+                     f"peak {stats['busbw_gbps_peak']:.2f} GB/s")
+    return lines
@@ -0,0 +1,214 @@
+import random
+import time
+
+import torch
+
+# GEMM checksums are compared with a tolerance of ABFT_TOLERANCE x N x epsilon times the sum of |a||b| over the
+# checksum, a bound on the rounding error of the N term dot products and sums involved: bit flips above it are
+# caught, rounding never is
+ABFT_TOLERANCE = 4
+MAX_LOCATIONS = 10  # error locations kept per device and kind
+MAX_FLIP_SAMPLES = 1024  # wrong words per chunk whose flipped bits are looked at
+
+CROSS_CHECK_BLOCK = 128  # rows and columns of C recomputed by the cross-check
+CROSS_CHECK_INTERVAL = 60  # seconds
+
+PATTERN_CHUNK = 16 * 1024 * 1024  # elements written or verified at a time
+# Alternating address patterns, so that every bit of every word is written as both 0 and 1
+PATTERNS = ["address", "inverse address"]
+
+
+def seeded_generator(device, seed):
+    # Inputs drawn from this generator are the same on every run with the same seed, so a failure reproduces
+    return torch.Generator(device=device).manual_seed(seed)
+
+
+def gemm_epsilon(dtype, device):
+    # Unit roundoff of a matmul in `dtype`; float32 matmuls may run as TF32 on Ampere and later
+    if dtype == torch.float32 and device.type == "cuda" and torch.backends.cuda.matmul.allow_tf32:
+        return 2.0**-10
+    return torch.finfo(dtype).eps
+
+
+class CorruptionLog:
+    # Data errors found on one device: a count and the first MAX_LOCATIONS locations per kind of check
+
+    def __init__(self, gpu_index):
+        self.gpu_index = gpu_index
+        self.counts = {}
+        self.locations = {}
+        self.checks = {}
+
+    def checked(self, kind):
+        self.checks[kind] = self.checks.get(kind, 0) + 1
+        self.counts.setdefault(kind, 0)
+
+    def add(self, kind, count, locations=()):
+        self.counts[kind] = self.counts.get(kind, 0) + count
+        kept = self.locations.setdefault(kind, [])
+        kept.extend(list(locations)[:MAX_LOCATIONS - len(kept)])
+        print(f"GPU {self.gpu_index}: {count} data errors found by the {kind} check, e.g. at {list(locations)[:3]}")
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def to_dict(self):
+        return {"total": self.total, "counts": self.counts, "checks": self.checks, "locations": self.locations}
+
+    def format(self):
+        counts = ", ".join(f"{kind} {count} in {self.checks.get(kind, 0)} checks" for kind, count in self.counts.items())
+        lines = [f"Data Errors: {self.total} ({counts or 'no checks run'})"]
+        for kind, locations in self.locations.items():
+            if locations:
+                lines.append(f"Data Error Locations ({kind}): {', '.join(str(location) for location in locations)}")
+        return lines
+
+
+class AbftChecker:
+    # Algorithm based fault tolerance for C = A @ B with constant A and B: the column sums of C must equal
+    # (column sums of A) @ B and the row sums A @ (row sums of B). The expected sums are computed once, so each
+    # check only reads C twice. A wrong element shows up in one row and one column sum, which locate it.
+
+    def __init__(self, a, b):
+        n = a.shape[1]
+        self.expected_columns = a.sum(0) @ b
+        self.expected_rows = a @ b.sum(1)
+        # Sums of |a||b|, in row blocks so that no N x N temporary is needed next to a full memory stress test
+        abs_columns = torch.zeros(a.shape[1], dtype=a.dtype, device=a.device)
+        abs_rows = torch.zeros(a.shape[0], dtype=a.dtype, device=a.device)
+        abs_b_rows = torch.zeros(b.shape[0], dtype=b.dtype, device=b.device)
+        block = max(1, PATTERN_CHUNK // n)
+        for i in range(0, a.shape[0], block):
+            abs_columns += a[i:i + block].abs().sum(0)
+        for k in range(0, b.shape[0], block):
+            abs_b_rows[k:k + block] = b[k:k + block].abs().sum(1)
+        magnitude_columns = torch.zeros(b.shape[1], dtype=b.dtype, device=b.device)
+        for k in range(0, b.shape[0], block):
+            magnitude_columns += abs_columns[k:k + block] @ b[k:k + block].abs()
+        for i in range(0, a.shape[0], block):
+            abs_rows[i:i + block] = a[i:i + block].abs() @ abs_b_rows
+        epsilon = gemm_epsilon(a.dtype, a.device)
+        self.column_tolerance = ABFT_TOLERANCE * n * epsilon * magnitude_columns + torch.finfo(a.dtype).tiny
+        self.row_tolerance = ABFT_TOLERANCE * n * epsilon * abs_rows + torch.finfo(a.dtype).tiny
+
+    def check(self, c):
+        # (errors, [(row, column), ...]); the count is the larger of the failing rows and columns
+        bad_columns = ((c.sum(0) - self.expected_columns).abs() > self.column_tolerance).nonzero().flatten().tolist()
+        bad_rows = ((c.sum(1) - self.expected_rows).abs() > self.row_tolerance).nonzero().flatten().tolist()
+        if not bad_columns and not bad_rows:
+            return 0, []
+        if bad_rows and bad_columns:
+            locations = [(row, column) for row in bad_rows[:MAX_LOCATIONS] for column in bad_columns[:MAX_LOCATIONS]]
+        else:
+            # Only one of the sums is off, e.g. an error in the checksum itself; its index is still worth reporting
+            locations = [f"row {row}" for row in bad_rows] + [f"column {column}" for column in bad_columns]
+        return max(len(bad_rows), len(bad_columns)), locations
+
+
+class CrossChecker:
+    # Recomputes a block of C = A @ B on another device (a second GPU, or the CPU) in float64 and compares it with
+    # the tested device's result; a different block each time, so a long run covers much of C
+
+    def __init__(self, a, b, reference_device, block=CROSS_CHECK_BLOCK, seed=0):
+        self.a = a
+        self.b = b
+        self.reference_device = reference_device
+        self.block = min(block, a.shape[0], b.shape[1])
+        self.random = random.Random(seed)
+        self.epsilon = gemm_epsilon(a.dtype, a.device)
+
+    def check(self, c):
+        row = self.random.randrange(self.a.shape[0] - self.block + 1)
+        column = self.random.randrange(self.b.shape[1] - self.block + 1)
+        a = self.a[row:row + self.block].to(self.reference_device, torch.float64)
+        b = self.b[:, column:column + self.block].to(self.reference_device, torch.float64)
+        expected = a @ b
+        tolerance = ABFT_TOLERANCE * a.shape[1] * self.epsilon * (a.abs() @ b.abs()) + torch.finfo(torch.float64).tiny
+        actual = c[row:row + self.block, column:column + self.block].to(self.reference_device, torch.float64)
+        bad = ((actual - expected).abs() > tolerance).nonzero().tolist()
+        return len(bad), [(row + i, column + j) for i, j in bad[:MAX_LOCATIONS]]
+
+
+class GemmVerifier:
+    # The checks of the stress kernel's GEMM: ABFT on every check, a cross-check every `cross_check_interval`
+    # seconds, and the reduction result, which must repeat (to within rounding) as long as A and B do not change
+
+    def __init__(self, kernel, log, reference_device=None, cross_check_interval=CROSS_CHECK_INTERVAL, seed=0):
+        self.kernel = kernel
+        self.log = log
+        self.abft = AbftChecker(kernel.a, kernel.b)
+        self.cross_checker = CrossChecker(kernel.a, kernel.b, reference_device or torch.device("cpu"), seed=seed)
+        self.cross_check_interval = cross_check_interval
+        self.last_cross_check = None
+        self.first_result = None
+        # Each element of d is sin + cos, at most sqrt(2) in magnitude, so this bounds the rounding of their sum
+        self.result_tolerance = 4 * kernel.a.shape[0] * kernel.b.shape[1] * torch.finfo(kernel.a.dtype).eps
+
+    def check_gemm(self):
+        # Call between kernel.gemm() and kernel.elementwise(), which overwrites C in place mode
+        self.log.checked("abft")
+        errors, locations = self.abft.check(self.kernel.c)
+        if errors:
+            self.log.add("abft", errors, locations)
+        now = time.monotonic()
+        if self.last_cross_check is None or now - self.last_cross_check >= self.cross_check_interval:
+            self.last_cross_check = now
+            self.log.checked("cross_check")
+            errors, locations = self.cross_checker.check(self.kernel.c)
+            if errors:
+                self.log.add("cross_check", errors, locations)
+
+    def check_result(self, value):
+        self.log.checked("consistency")
+        if self.first_result is None:
+            self.first_result = value
+        elif not abs(value - self.first_result) <= self.result_tolerance:
+            self.log.add("consistency", 1, [f"{value!r} != {self.first_result!r}"])
+
+
+class PatternTester:
+    # Writes address-derived patterns over a whole tensor and reads them back, like a memory tester does for
+    # DRAM. The tensor is viewed as 32-bit words; errors are reported as byte offsets, with the bits that flipped.
+
+    def __init__(self, tensor, log, chunk=PATTERN_CHUNK):
+        self.words = tensor.view(-1).view(torch.int32)
+        self.log = log
+        self.chunk = chunk
+
+    def expected(self, start, end, pattern_pass, seed):
+        index = torch.arange(start, end, dtype=torch.int64, device=self.words.device)
+        values = (index ^ (index >> 31) ^ seed) & 0x7FFFFFFF
+        if PATTERNS[pattern_pass % len(PATTERNS)] == "inverse address":
+            values = ~values
+        return values.to(torch.int32)
+
+    def write(self, pattern_pass, seed=0):
+        for start in range(0, self.words.numel(), self.chunk):
+            end = min(start + self.chunk, self.words.numel())
+            self.words[start:end] = self.expected(start, end, pattern_pass, seed)
+
+    def verify(self, pattern_pass, seed=0):
+        # Number of wrong words; the first locations and flipped bits go to the log
+        self.log.checked("pattern")
+        errors, locations, flipped = 0, [], 0
+        for start in range(0, self.words.numel(), self.chunk):
+            end = min(start + self.chunk, self.words.numel())
+            expected = self.expected(start, end, pattern_pass, seed)
+            wrong = (self.words[start:end] != expected).nonzero().flatten()
+            if wrong.numel():
+                errors += wrong.numel()
+                sample = wrong[:MAX_FLIP_SAMPLES]
+                for bits in (self.words[start:end][sample] ^ expected[sample]).tolist():
+                    flipped |= bits & 0xFFFFFFFF
+                locations += [f"byte {(start + i) * 4:#x}" for i in wrong[:MAX_LOCATIONS].tolist()]
+        if errors:
+            self.log.add("pattern", errors, [f"flipped bits {flipped:#010x}"] + locations)
+        return errors
+
+    def run(self, pattern_pass, seed=0, between=None):
+        # Write, optionally do something else while the pattern sits in memory, then verify
+        self.write(pattern_pass, seed)
+        if between is not None:
+            between()
+        return self.verify(pattern_pass, seed)
@@ -0,0 +1,79 @@
+import contextlib
+import time
+
+import torch
+
+from gpu_tests.slurm import node_gpu_count
+from gpu_tests.telemetry import FakeBackend, NvidiaSmiBackend
+
+# The "cpu" backend stands in for GPUs so orchestration can be exercised on machines without them
+BACKENDS = ["cuda", "cpu"]
+FAKE_DEVICE_COUNT = 2
+FAKE_DEVICE_MEMORY = 256 * 1024 * 1024  # bytes reported per fake device
+
+
+def is_available(backend):
+    return backend == "cpu" or torch.cuda.is_available()
+
+
+def device_count(backend):
+    if backend == "cpu":
+        return FAKE_DEVICE_COUNT
+    # Inside a SLURM job only the GPUs allocated on this node, even where the driver shows the others
+    allocated = node_gpu_count()
+    return torch.cuda.device_count() if allocated is None else min(allocated, torch.cuda.device_count())
+
+
+def get_device(backend, index):
+    if backend == "cpu":
+        return torch.device("cpu")
+    return torch.device(f'cuda:{index}')
+
+
+def device_name(backend, index):
+    if backend == "cpu":
+        return f"Fake device {index} (CPU)"
+    return torch.cuda.get_device_name(index)
+
+
+def total_memory(device):
+    # Bytes of device memory
+    if device.type == "cpu":
+        return FAKE_DEVICE_MEMORY
+    return torch.cuda.get_device_properties(device).total_memory
+
+
+def synchronize(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def nvidia_smi_uuid(gpu_index):
+    # UUID by which nvidia-smi knows CUDA device `gpu_index`. CUDA indices are renumbered by CUDA_VISIBLE_DEVICES and
+    # ordered by CUDA_DEVICE_ORDER, so they need not match the nvidia-smi index; the UUID names the same GPU in both.
+    uuid = str(torch.cuda.get_device_properties(gpu_index).uuid)
+    return uuid if uuid.startswith("GPU-") else f"GPU-{uuid}"
+
+
+def telemetry_backend(backend, gpus):
+    if backend == "cpu":
+        return FakeBackend(gpus=gpus)
+    return NvidiaSmiBackend(gpus={gpu_index: nvidia_smi_uuid(gpu_index) for gpu_index in gpus})
+
+
+def init_contexts(backend, gpus):
+    # Creates the CUDA context of every device up front and returns {gpu index: seconds}. Tests run afterwards in
+    # the same process reuse the contexts, instead of each paying for them (and for a process and torch import).
+    seconds = {}
+    for gpu_index in gpus:
+        device = get_device(backend, gpu_index)
+        start_time = time.perf_counter()
+        torch.empty(1, device=device)
+        synchronize(device)
+        seconds[gpu_index] = time.perf_counter() - start_time
+    return seconds
+
+
+def device_context(device):
+    # Makes `device` the current CUDA device, e.g. for a thread that works on one GPU
+    return torch.cuda.device(device) if device.type == "cuda" else contextlib.nullcontext()
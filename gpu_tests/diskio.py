@@ -0,0 +1,127 @@
+import concurrent.futures
+import mmap
+import os
+import threading
+import time
+
+from gpu_tests.timing import summarize
+
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+DIRECT_ALIGNMENT = 4096
+
+
+class DiskIOEngine:
+    # Writes and reads one file with large blocks from a pool of `queue_depth` threads.
+    # Each thread owns a page-aligned buffer filled with random data once, so no pass regenerates data or
+    # holds a file-sized copy in host memory. With direct=True the file is opened with O_DIRECT; otherwise the
+    # file's page cache is dropped after writing so that reads measure the storage rather than memory.
+
+    def __init__(self, path, file_size, block_size=DEFAULT_BLOCK_SIZE, queue_depth=4, direct=False, fsync=True):
+        if direct and block_size % DIRECT_ALIGNMENT:
+            raise ValueError(f"O_DIRECT needs a block size that is a multiple of {DIRECT_ALIGNMENT} bytes")
+        self.path = path
+        self.block_size = block_size
+        self.num_blocks = max(1, file_size // block_size)
+        self.file_size = self.num_blocks * block_size
+        self.queue_depth = queue_depth
+        self.direct = direct
+        self.fsync = fsync
+        # Anonymous mmaps are page aligned, as O_DIRECT requires
+        self.buffers = [mmap.mmap(-1, block_size) for _ in range(queue_depth)]
+        for buffer in self.buffers:
+            buffer.write(os.urandom(block_size))
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=queue_depth)
+
+    def _open(self, flags):
+        if self.direct:
+            flags |= os.O_DIRECT
+        return os.open(self.path, flags, 0o644)
+
+    def _run_ops(self, fd, op):
+        # Issue one op per block with `queue_depth` in flight until the last blocks; returns per-op latencies in
+        # seconds. Each thread owns one buffer and takes the next block as soon as its previous op completes, so
+        # the queue stays full rather than draining at the end of every batch of `queue_depth` blocks.
+        blocks = iter(range(self.num_blocks))
+        lock = threading.Lock()
+
+        def task(buffer):
+            latencies = []
+            while True:
+                with lock:
+                    block = next(blocks, None)
+                if block is None:
+                    return latencies
+                start = time.perf_counter_ns()
+                op(fd, buffer, block * self.block_size)
+                latencies.append((time.perf_counter_ns() - start) / 1e9)
+
+        latencies = []
+        for future in [self.pool.submit(task, buffer) for buffer in self.buffers]:
+            latencies.extend(future.result())
+        return latencies
+
+    def write_pass(self):
+        fd = self._open(os.O_WRONLY | os.O_CREAT)
+        try:
+            start = time.perf_counter_ns()
+            latencies = self._run_ops(fd, lambda fd, buffer, offset: os.pwrite(fd, buffer, offset))
+            write_time = (time.perf_counter_ns() - start) / 1e9
+            if self.fsync:
+                os.fsync(fd)
+            total_time = (time.perf_counter_ns() - start) / 1e9
+            if not self.direct:
+                # DONTNEED only drops clean pages: without the timed fsync the data is flushed here, untimed,
+                # or the next read pass would come from memory
+                if not self.fsync:
+                    os.fdatasync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        return {"op": "write", "bytes": self.file_size, "seconds": total_time,
+                "gbps": self.file_size / total_time / 1e9, "fsync_seconds": total_time - write_time,
+                "latency": summarize(latencies)}
+
+    def read_pass(self):
+        fd = self._open(os.O_RDONLY)
+        try:
+            start = time.perf_counter_ns()
+            latencies = self._run_ops(fd, lambda fd, buffer, offset: os.preadv(fd, [buffer], offset))
+            total_time = (time.perf_counter_ns() - start) / 1e9
+            if not self.direct:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        return {"op": "read", "bytes": self.file_size, "seconds": total_time,
+                "gbps": self.file_size / total_time / 1e9, "latency": summarize(latencies)}
+
+    def run(self, num_operations):
+        results = []
+        for _ in range(num_operations):
+            results.append(self.write_pass())
+            results.append(self.read_pass())
+        return results
+
+    def close(self):
+        self.pool.shutdown()
+        for buffer in self.buffers:
+            buffer.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def format_io_summary(results, label):
+    # One line per op type: median throughput and median / p95 per-block latency
+    lines = []
+    for op in ["write", "read"]:
+        passes = [r for r in results if r["op"] == op]
+        if not passes:
+            continue
+        throughput = summarize([r["gbps"] for r in passes])
+        latency_p50 = summarize([r["latency"]["median"] for r in passes])["median"]
+        latency_p95 = summarize([r["latency"]["p95"] for r in passes])["median"]
+        line = (f"{label} {op}: {throughput['median']:.2f} GB/s median over {len(passes)} passes "
+                f"(min {throughput['min']:.2f}), block latency p50 {latency_p50 * 1e3:.1f}ms p95 {latency_p95 * 1e3:.1f}ms")
+        if op == "write":
+            line += f", fsync {summarize([r['fsync_seconds'] for r in passes])['median']:.2f}s"
+        lines.append(line)
+    return lines
@@ -0,0 +1,89 @@
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+
+from gpu_tests.slurm import gpu_count
+
+# Local stand-ins for sbatch and srun, so the launcher can be run end to end without a cluster:
+#   python -m gpu_tests slurm submit --sbatch "python -m gpu_tests.fake_slurm sbatch" --device cpu ...
+# sbatch runs the script's array tasks one after another on this machine, each as its own fake node; srun runs its
+# command once per node of the fake allocation, concurrently. Only the options the launcher generates are understood.
+
+FAKE_NODE = "fake-node{}"
+SRUN_SHIM = """#!/bin/sh
+exec {python} -m gpu_tests.fake_slurm srun "$@"
+"""
+
+
+def directives(script):
+    # {option: value} from the #SBATCH lines
+    options = {}
+    for line in script.splitlines():
+        match = re.match(r"#SBATCH\s+--([\w-]+)(?:[=\s]+(.*))?", line)
+        if match:
+            options[match.group(1)] = (match.group(2) or "").strip()
+    return options
+
+
+def output_path(pattern, job_id, task_id):
+    return pattern.replace("%A", job_id).replace("%a", str(task_id)).replace("%j", job_id)
+
+
+def sbatch(argv):
+    wait = "--wait" in argv
+    script_path = [arg for arg in argv if not arg.startswith("-")][-1]
+    with open(script_path) as f:
+        options = directives(f.read())
+    job_id = str(os.getpid())
+    print(f"Submitted batch job {job_id}", flush=True)
+
+    nodes = int(options.get("nodes", "1"))
+    gpus = str(gpu_count(options["gpus-per-node"])) if options.get("gpus-per-node") else None
+    if "array" in options:
+        first, last = map(int, options["array"].split("-"))
+        tasks = list(range(first, last + 1))
+    else:
+        tasks = [None]
+
+    returncode = 0
+    with tempfile.TemporaryDirectory() as shim_dir:
+        with open(os.path.join(shim_dir, "srun"), 'w') as f:
+            f.write(SRUN_SHIM.format(python=shlex.quote(sys.executable)))
+        os.chmod(os.path.join(shim_dir, "srun"), 0o755)
+        for task in tasks:
+            first_node = task if task is not None else 0
+            nodelist = [FAKE_NODE.format(first_node + i) for i in range(nodes)]
+            environ = dict(os.environ, SLURM_JOB_ID=job_id, SLURM_JOB_NUM_NODES=str(nodes),
+                           SLURM_JOB_NODELIST=",".join(nodelist), SLURMD_NODENAME=nodelist[0],
+                           PATH=shim_dir + os.pathsep + os.environ.get("PATH", ""))
+            if gpus is not None:
+                environ["SLURM_GPUS_ON_NODE"] = gpus
+            if task is not None:
+                environ.update(SLURM_ARRAY_JOB_ID=job_id, SLURM_ARRAY_TASK_ID=str(task))
+            output = output_path(options.get("output", "slurm-%j.out"), job_id, task)
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            with open(output, 'w') as log:
+                returncode |= subprocess.run(["bash", script_path], env=environ, stdout=log, stderr=subprocess.STDOUT).returncode
+    # A real sbatch returns at once unless --wait is given, in which case it exits with the job's status
+    return returncode if wait else 0
+
+
+def srun(argv):
+    command = list(argv)
+    while command and command[0].startswith("-"):
+        command.pop(0)
+    nodelist = os.environ.get("SLURM_JOB_NODELIST", FAKE_NODE.format(0)).split(",")
+    processes = [subprocess.Popen(command, env=dict(os.environ, SLURMD_NODENAME=node, SLURM_NODEID=str(i),
+                                                    SLURM_PROCID=str(i)))
+                 for i, node in enumerate(nodelist)]
+    return max(process.wait() for process in processes)
+
+
+if __name__ == "__main__":
+    commands = {"sbatch": sbatch, "srun": srun}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        sys.exit("usage: python -m gpu_tests.fake_slurm sbatch|srun ...")
+    sys.exit(commands[sys.argv[1]](sys.argv[2:]))
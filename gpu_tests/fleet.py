@@ -0,0 +1,409 @@
+import concurrent.futures
+import datetime
+import html
+import json
+import os
+import re
+import socket
+import statistics
+
+from gpu_tests.results import format_outliers, make_result, outliers, parameters_key
+
+# Text reports by file name suffix; the other text reports (GEMM sweep, host transfer, staging) have no per-GPU
+# verdict to aggregate and are skipped. Structured results (*.jsonl) carry everything and are preferred: the text
+# reports of a host and test that also has JSONL results are left out.
+TEXT_REPORTS = [("_performance.txt", "perf"), ("_gemm_sweep.txt", None), ("_host_transfer.txt", None),
+                ("_staging.txt", None), ("_collectives.txt", None), ("_burn_in.txt", None)]
+# The stress report is just `hostname.txt`; host names have no underscores, unlike the other .txt files in a
+# results directory (profiles, nvidia_smi_topo_log.txt)
+STRESS_REPORT = re.compile(r"([^_]+)\.txt")
+TEXT_RUN_ID = "text:"
+
+# "Label: value" lines of the text reports and the structured metric each one becomes
+TEXT_METRICS = [
+    (re.compile(r"Peak Memory Utilization: ([\d.]+)%"), ["memory_utilization_pct"]),
+    (re.compile(r"Peak Temperature: ([\d.]+)"), ["peak_temperature_c"]),
+    (re.compile(r"Allocations per Iteration: ([\d.]+)"), ["allocations_per_iteration"]),
+    (re.compile(r"Data Errors: (\d+)"), ["data_errors"]),
+    (re.compile(r"Performance: ([\d.e+-]+) FLOPS"), ["flops_median"]),
+    (re.compile(r"Performance p5/p95: ([\d.e+-]+) / ([\d.e+-]+) FLOPS"), ["flops_p5", "flops_p95"]),
+]
+GPU_LINE = re.compile(r"GPU (\d+): (.*)")
+
+# Metrics shown per test; tests not listed here show all of their numeric metrics
+FLEET_METRICS = {
+    "stress": ["memory_utilization_pct", "peak_temperature_c", "data_errors"],
+    "perf": ["flops_median", "peak_temperature_c", "throttle_severity"],
+    "gemm_sweep": ["tflops", "efficiency"],
+    "nvlink": ["bandwidth_gbps_median"],
+    "nvlink_sweep": ["latency_us_min_size", "bandwidth_gbps_max_size"],
+    "io": ["write_gbps_median", "read_gbps_median"],
+    "collectives": ["busbw_gbps_avg", "busbw_gbps_peak"],
+    "burnin": ["mixed", "kept_fraction"],
+}
+# Parameters that split a test's results into separately compared groups (e.g. one per NVLink link type);
+# the other parameters are ignored so that a fleet run with slightly different options still pools together
+GROUP_PARAMETERS = {
+    "nvlink": ["mode", "link", "size_gb"],
+    "gemm_sweep": ["dtype", "shape"],
+    "collectives": ["collective", "backend", "world_size", "nodes"],
+    "burnin": ["workload", "mix"],
+}
+
+HISTOGRAM_BINS = 20
+# NVLink pairs below this fraction of the fleet median for the same pair are highlighted
+LOW_BANDWIDTH = 0.9
+
+
+def find_result_files(paths):
+    # Result files in `paths`, descending into directories
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in sorted(names) if name.endswith((".jsonl", ".txt"))]
+        else:
+            files.append(path)
+    return files
+
+
+def text_report_test(path):
+    name = os.path.basename(path)
+    for suffix, test in TEXT_REPORTS:
+        if name.endswith(suffix):
+            return name[:-len(suffix)], test
+    match = STRESS_REPORT.fullmatch(name)
+    if match:
+        return match.group(1), "stress"
+    return None, None
+
+
+def parse_text_report(path):
+    # Result records from a `hostname.txt` (stress) or `hostname_performance.txt` (perf) report.
+    # The host is taken from the file name and the timestamp from its modification time.
+    host, test = text_report_test(path)
+    if test is None:
+        return []
+    timestamp = datetime.datetime.fromtimestamp(os.path.getmtime(path), datetime.timezone.utc)
+    run_id = f"{TEXT_RUN_ID}{host}:{timestamp.timestamp():.0f}"
+    blocks = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            match = GPU_LINE.fullmatch(line)
+            if match:
+                blocks.append({"gpu_index": int(match.group(1)), "gpu_model": match.group(2), "status": None,
+                               "metrics": {}, "errors": []})
+            elif blocks and line.startswith("Status: "):
+                blocks[-1]["status"] = line[len("Status: "):]
+            elif blocks and line.startswith(("Error: ", "Performance FAIL: ")):
+                blocks[-1]["errors"].append(line.split(": ", 1)[1])
+            elif blocks:
+                for pattern, names in TEXT_METRICS:
+                    match = pattern.match(line)
+                    if match:
+                        blocks[-1]["metrics"].update(zip(names, map(float, match.groups())))
+    records = []
+    for block in blocks:
+        record = make_result(test, block["gpu_index"], block["gpu_model"], {}, block["metrics"], block["status"],
+                             error="; ".join(block["errors"]) or None, run_id=run_id, host=host)
+        record["timestamp"] = timestamp.isoformat(timespec="seconds")
+        records.append(record)
+    return records
+
+
+def load_file(path):
+    # (path, records, error); runs in a worker process
+    try:
+        if path.endswith(".jsonl"):
+            with open(path) as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = parse_text_report(path)
+        return path, records, None
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        return path, [], str(e)
+
+
+def load_results(paths, jobs=None):
+    # Parses the files in a process pool; returns (records, {path: error})
+    files = find_result_files(paths)
+    records, errors = [], {}
+    if not files:
+        return records, errors
+    jobs = jobs or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        for path, file_records, error in pool.map(load_file, files, chunksize=max(1, len(files) // (4 * jobs))):
+            records += file_records
+            if error:
+                errors[path] = error
+    return prefer_structured(records), errors
+
+
+def prefer_structured(records):
+    # Drops text report records of a (host, test) that also has JSONL records: the text report of a run is written
+    # next to its JSONL, and the two would otherwise count as different GPUs (keyed by index and by UUID)
+    structured = {(record["host"], record["test"]) for record in records
+                  if not record["run_id"].startswith(TEXT_RUN_ID)}
+    return [record for record in records
+            if not (record["run_id"].startswith(TEXT_RUN_ID) and (record["host"], record["test"]) in structured)]
+
+
+def group_label(record):
+    # The parameters a result is compared on, as text
+    names = GROUP_PARAMETERS.get(record["test"], [])
+    return parameters_key({name: record["parameters"].get(name) for name in names if name in record["parameters"]})
+
+
+def latest_results(records):
+    # Most recent record per (test, host, GPU, parameters), so reruns replace earlier attempts
+    latest = {}
+    for record in sorted(records, key=lambda record: record["timestamp"]):
+        gpu = record["gpu"]
+        key = (record["test"], record["host"], gpu["uuid"] or gpu["index"], parameters_key(record["parameters"]))
+        latest[key] = record
+    return list(latest.values())
+
+
+def describe(values):
+    # count/min/p5/median/p95/max, with percentiles interpolated linearly like gpu_tests.timing.percentile
+    if len(values) == 1:
+        return {"count": 1, "min": values[0], "p5": values[0], "median": values[0], "p95": values[0], "max": values[0]}
+    quantiles = statistics.quantiles(values, n=20, method="inclusive")
+    return {"count": len(values), "min": min(values), "p5": quantiles[0], "median": statistics.median(values),
+            "p95": quantiles[-1], "max": max(values)}
+
+
+def metric_entries(records):
+    # {(test, metric): [entry]} in the form of BaselineStore.latest, with the group label as the parameters
+    entries = {}
+    for record in records:
+        names = FLEET_METRICS.get(record["test"], list(record["metrics"]))
+        for name in names:
+            value = record["metrics"].get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gpu = record["gpu"]
+                entries.setdefault((record["test"], name), []).append(
+                    {"host": record["host"], "gpu_index": "-" if gpu["index"] is None else gpu["index"], "gpu_uuid": gpu["uuid"],
+                     "gpu_model": gpu["model"], "parameters": group_label(record), "timestamp": record["timestamp"],
+                     "value": value})
+    return entries
+
+
+def distributions(entries):
+    # [{"test", "metric", "model", "group", "values", **describe}] per (test, metric, model, parameter group)
+    groups = {}
+    for (test, metric), values in entries.items():
+        for entry in values:
+            groups.setdefault((test, metric, str(entry["gpu_model"]), entry["parameters"]), []).append(entry["value"])
+    return [dict(describe(values), test=test, metric=metric, model=model, group=group, values=values)
+            for (test, metric, model, group), values in sorted(groups.items())]
+
+
+def nvlink_matrices(records):
+    # {(host, model, mode): {(src, dst): (median GB/s, verdict)}} from the per-pair nvlink records
+    matrices = {}
+    for record in records:
+        if record["test"] != "nvlink" or record["metrics"].get("bandwidth_gbps_median") is None:
+            continue
+        key = (record["host"], record["gpu"]["model"], record["parameters"].get("mode"))
+        pair = (record["gpu"]["index"], record["parameters"]["dst"])
+        matrices.setdefault(key, {})[pair] = (record["metrics"]["bandwidth_gbps_median"], record["verdict"])
+    return matrices
+
+
+def fleet_nvlink(matrices):
+    # {(model, mode): {(src, dst): median over hosts}}
+    pairs = {}
+    for (_, model, mode), matrix in matrices.items():
+        for pair, (value, _) in matrix.items():
+            pairs.setdefault((model, mode), {}).setdefault(pair, []).append(value)
+    return {key: {pair: statistics.median(values) for pair, values in matrix.items()} for key, matrix in pairs.items()}
+
+
+def degraded_hosts(matrices, fleet):
+    # Hosts with a failed pair or a pair below LOW_BANDWIDTH of the fleet median for that pair
+    degraded = []
+    for (host, model, mode), matrix in sorted(matrices.items(), key=lambda item: [str(k) for k in item[0]]):
+        reference = fleet[(model, mode)]
+        if any(verdict == "FAIL" or value < LOW_BANDWIDTH * reference[pair] for pair, (value, verdict) in matrix.items()):
+            degraded.append((host, model, mode))
+    return degraded
+
+
+def aggregate(records, sigmas=3.0, min_group=3):
+    # Everything the reports show, from the latest record of every GPU
+    records = latest_results(records)
+    entries = metric_entries(records)
+    matrices = nvlink_matrices(records)
+    fleet = fleet_nvlink(matrices)
+    tests = {}
+    for record in records:
+        counts = tests.setdefault(record["test"], {"results": 0, "FAIL": 0, "hosts": set(), "gpus": set()})
+        counts["results"] += 1
+        counts["hosts"].add(record["host"])
+        if record["gpu"]["index"] is not None:
+            counts["gpus"].add((record["host"], record["gpu"]["index"]))
+        if record["verdict"] == "FAIL":
+            counts["FAIL"] += 1
+    return {
+        "records": records,
+        "hosts": sorted({record["host"] for record in records}),
+        "gpus": len({(record["host"], record["gpu"]["uuid"] or record["gpu"]["index"]) for record in records
+                     if record["gpu"]["index"] is not None}),
+        "tests": {test: dict(counts, hosts=len(counts["hosts"]), gpus=len(counts["gpus"]))
+                  for test, counts in sorted(tests.items())},
+        "failures": sorted((record for record in records if record["verdict"] == "FAIL"),
+                           key=lambda record: (record["host"], str(record["gpu"]["index"]), record["test"])),
+        "distributions": distributions(entries),
+        "outliers": {key: flagged for key, flagged in sorted(
+            (key, outliers(values, sigmas, min_group)) for key, values in entries.items()) if flagged},
+        "nvlink": matrices,
+        "nvlink_fleet": fleet,
+        "nvlink_degraded": degraded_hosts(matrices, fleet),
+        "sigmas": sigmas,
+    }
+
+
+def format_summary(fleet, errors=None):
+    lines = [f"{len(fleet['hosts'])} hosts, {fleet['gpus']} GPUs, {len(fleet['records'])} results"]
+    if errors:
+        lines.append(f"{len(errors)} unreadable files:")
+        lines += [f"  {path}: {error}" for path, error in sorted(errors.items())]
+    lines.append("")
+    for test, counts in fleet["tests"].items():
+        lines.append(f"{test:<14} {counts['hosts']:>5} hosts {counts['gpus']:>6} GPUs {counts['results']:>7} results "
+                     f"{counts['FAIL']:>5} FAIL")
+
+    lines += ["", f"{'test':<12} {'metric':<24} {'model':<28} {'group':<40} {'n':>5} {'median':>10} {'p5':>10} {'p95':>10}"]
+    lines.append("-" * len(lines[-1]))
+    for row in fleet["distributions"]:
+        group = " ".join(f"{k}={v}" for k, v in json.loads(row["group"]).items())
+        lines.append(f"{row['test']:<12} {row['metric']:<24} {row['model']:<28} {group:<40} {row['count']:>5} "
+                     f"{row['median']:>10.4g} {row['p5']:>10.4g} {row['p95']:>10.4g}")
+
+    for (test, metric), flagged in fleet["outliers"].items():
+        lines += ["", f"Outliers beyond {fleet['sigmas']:g} sigma: {test} {metric}"]
+        lines += format_outliers(flagged, metric)
+
+    if fleet["nvlink_degraded"]:
+        lines += ["", "NVLink matrices with failed or low pairs:"]
+        lines += [f"  {host} ({model}, {mode})" for host, model, mode in fleet["nvlink_degraded"]]
+
+    if fleet["failures"]:
+        lines += ["", "Failures:"]
+        for record in fleet["failures"]:
+            lines.append(f"  {record['host']} GPU {record['gpu']['index']} {record['test']}: {record['error'] or 'FAIL'}")
+    return lines
+
+
+# Self-contained HTML: inline CSS and SVG only, so the report opens on a cluster without network access
+HTML_STYLE = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+table { border-collapse: collapse; margin: 0.5em 0 1.5em; }
+th, td { border: 1px solid #ccc; padding: 2px 6px; text-align: right; font-size: 90%; }
+th { background: #eee; }
+td.text { text-align: left; }
+.fail { color: #b00; font-weight: bold; }
+.heatmap td { min-width: 3.5em; }
+"""
+
+
+def cell(value, css_class="", style=""):
+    attributes = (f' class="{css_class}"' if css_class else "") + (f' style="{style}"' if style else "")
+    return f"<td{attributes}>{html.escape(str(value))}</td>"
+
+
+def histogram_svg(values, width=200, height=40):
+    low, high = min(values), max(values)
+    counts = [0] * HISTOGRAM_BINS
+    for value in values:
+        counts[min(int((value - low) / (high - low) * HISTOGRAM_BINS), HISTOGRAM_BINS - 1) if high > low else 0] += 1
+    bar = width / HISTOGRAM_BINS
+    bars = "".join(f'<rect x="{i * bar:.1f}" y="{height - height * count / max(counts):.1f}" width="{bar - 1:.1f}" '
+                   f'height="{height * count / max(counts):.1f}" fill="#4a7ab5"/>' for i, count in enumerate(counts) if count)
+    return f'<svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg">{bars}</svg>'
+
+
+def heat_color(ratio):
+    # Red for pairs far below the fleet median, white at it
+    ratio = max(0.0, min(ratio, 1.0))
+    shade = int(255 * ratio)
+    return f"background: rgb(255, {shade}, {shade})"
+
+
+def heatmap_table(matrix, reference):
+    # `matrix`: {(src, dst): (value, verdict)}, coloured by the ratio to `reference` {(src, dst): value}
+    gpus = sorted({gpu for pair in matrix for gpu in pair})
+    rows = ["<table class=\"heatmap\"><tr><th>src\\dst</th>" + "".join(f"<th>GPU{dst}</th>" for dst in gpus) + "</tr>"]
+    for src in gpus:
+        cells = []
+        for dst in gpus:
+            if (src, dst) not in matrix:
+                cells.append(cell(""))
+                continue
+            value, verdict = matrix[(src, dst)]
+            ratio = value / reference[(src, dst)] if reference.get((src, dst)) else 1.0
+            cells.append(cell(f"{value:.1f}", "fail" if verdict == "FAIL" else "", heat_color(ratio)))
+        rows.append(f"<tr><th>GPU{src}</th>{''.join(cells)}</tr>")
+    return "".join(rows) + "</table>"
+
+
+def format_html(fleet, errors=None):
+    parts = [f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>GPU fleet report</title>"
+             f"<style>{HTML_STYLE}</style></head><body>",
+             f"<h1>GPU fleet report</h1><p>{len(fleet['hosts'])} hosts, {fleet['gpus']} GPUs, "
+             f"{len(fleet['records'])} results; generated on {html.escape(socket.gethostname())} at "
+             f"{datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')}</p>"]
+    if errors:
+        parts.append("<h2>Unreadable files</h2><ul>" + "".join(
+            f"<li>{html.escape(path)}: {html.escape(error)}</li>" for path, error in sorted(errors.items())) + "</ul>")
+
+    parts.append("<h2>Tests</h2><table><tr><th>test</th><th>hosts</th><th>GPUs</th><th>results</th><th>FAIL</th></tr>")
+    for test, counts in fleet["tests"].items():
+        parts.append(f"<tr>{cell(test, 'text')}{cell(counts['hosts'])}{cell(counts['gpus'])}{cell(counts['results'])}"
+                     f"{cell(counts['FAIL'], 'fail' if counts['FAIL'] else '')}</tr>")
+    parts.append("</table>")
+
+    if fleet["failures"]:
+        parts.append("<h2>Failures</h2><table><tr><th>host</th><th>GPU</th><th>model</th><th>test</th><th>error</th></tr>")
+        for record in fleet["failures"]:
+            parts.append(f"<tr>{cell(record['host'], 'text')}{cell(record['gpu']['index'])}"
+                         f"{cell(record['gpu']['model'], 'text')}{cell(record['test'], 'text')}"
+                         f"{cell(record['error'] or 'FAIL', 'text')}</tr>")
+        parts.append("</table>")
+
+    parts.append("<h2>Distributions per GPU model</h2><table><tr><th>test</th><th>metric</th><th>model</th>"
+                 "<th>group</th><th>n</th><th>min</th><th>p5</th><th>median</th><th>p95</th><th>max</th>"
+                 "<th>histogram</th></tr>")
+    for row in fleet["distributions"]:
+        group = " ".join(f"{k}={v}" for k, v in json.loads(row["group"]).items())
+        parts.append(f"<tr>{cell(row['test'], 'text')}{cell(row['metric'], 'text')}{cell(row['model'], 'text')}"
+                     f"{cell(group, 'text')}{cell(row['count'])}"
+                     + "".join(cell(f"{row[stat]:.4g}") for stat in ["min", "p5", "median", "p95", "max"])
+                     + f"<td>{histogram_svg(row['values'])}</td></tr>")
+    parts.append("</table>")
+
+    if fleet["outliers"]:
+        parts.append(f"<h2>Outliers beyond {fleet['sigmas']:g} sigma</h2><table><tr><th>test</th><th>metric</th>"
+                     "<th>host</th><th>GPU</th><th>model</th><th>value</th><th>fleet median</th><th>sigmas</th>"
+                     "<th>n</th></tr>")
+        for (test, metric), flagged in fleet["outliers"].items():
+            for entry in flagged:
+                value, median, deviation = f"{entry['value']:.4g}", f"{entry['fleet_median']:.4g}", f"{entry['sigmas']:.1f}"
+                parts.append(f"<tr>{cell(test, 'text')}{cell(metric, 'text')}{cell(entry['host'], 'text')}"
+                             f"{cell(entry['gpu_index'])}{cell(entry['gpu_model'], 'text')}{cell(value)}{cell(median)}"
+                             f"{cell(deviation, 'fail')}{cell(entry['fleet_size'])}</tr>")
+        parts.append("</table>")
+
+    if fleet["nvlink"]:
+        parts.append("<h2>NVLink bandwidth (GB/s)</h2>")
+        for (model, mode), reference in sorted(fleet["nvlink_fleet"].items(), key=lambda item: [str(k) for k in item[0]]):
+            hosts = sum(1 for _, m, md in fleet["nvlink"] if (m, md) == (model, mode))
+            parts.append(f"<h3>{html.escape(str(model))}, {html.escape(str(mode))}: median of {hosts} hosts</h3>")
+            parts.append(heatmap_table({pair: (value, None) for pair, value in reference.items()}, reference))
+        for host, model, mode in fleet["nvlink_degraded"]:
+            parts.append(f"<h3>{html.escape(host)} ({html.escape(str(model))}, {html.escape(str(mode))})</h3>")
+            parts.append(heatmap_table(fleet["nvlink"][(host, model, mode)], fleet["nvlink_fleet"][(model, mode)]))
+    parts.append("</body></html>")
+    return "\n".join(parts)
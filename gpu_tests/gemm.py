@@ -0,0 +1,126 @@
+import torch
+
+from gpu_tests import devices
+from gpu_tests.timing import KernelTimer, summarize
+
+# name -> (torch dtype, allow TF32 tensor cores for float32 matmul)
+DTYPES = {
+    "fp64": (torch.float64, False),
+    "fp32": (torch.float32, False),
+    "tf32": (torch.float32, True),
+    "bf16": (torch.bfloat16, False),
+    "fp16": (torch.float16, False),
+}
+
+SHAPES = ["square", "tall-skinny", "batched"]
+
+# Dense (non-sparse) peak TFLOPS by compute capability, from the NVIDIA datasheets for the SXM parts.
+# PCIe cards run at lower clocks, so efficiencies against these numbers are conservative for them.
+REFERENCE_PEAKS = {
+    (6, 0): {"fp64": 5.3, "fp32": 10.6, "fp16": 21.2},  # P100
+    (7, 0): {"fp64": 7.8, "fp32": 15.7, "fp16": 125.0},  # V100
+    (8, 0): {"fp64": 19.5, "fp32": 19.5, "tf32": 156.0, "bf16": 312.0, "fp16": 312.0},  # A100
+    (9, 0): {"fp64": 67.0, "fp32": 67.0, "tf32": 494.7, "bf16": 989.4, "fp16": 989.4},  # H100
+}
+
+# Sweep rows below this fraction of the reference peak are flagged
+MIN_EFFICIENCY = 0.5
+
+
+def gemm_dims(shape, size):
+    # (batch, M, N, K) for a shape of base size `size`
+    if shape == "square":
+        return 1, size, size, size
+    if shape == "tall-skinny":
+        return 1, size * 8, max(size // 8, 1), size
+    if shape == "batched":
+        return 16, max(size // 4, 1), max(size // 4, 1), max(size // 4, 1)
+    raise ValueError(f"Unknown GEMM shape: {shape}")
+
+
+def gemm_flops(batch, m, n, k):
+    # One multiply and one add per inner-product term
+    return 2 * batch * m * n * k
+
+
+def reference_peak(device, dtype_name):
+    # Peak TFLOPS for this device and dtype, or None when unknown (including fake CPU devices)
+    if device.type != "cuda":
+        return None
+    return REFERENCE_PEAKS.get(torch.cuda.get_device_capability(device), {}).get(dtype_name)
+
+
+def time_gemm(device, dtype_name, shape, size, iterations=20, warmup_iterations=3):
+    dtype, allow_tf32 = DTYPES[dtype_name]
+    batch, m, n, k = gemm_dims(shape, size)
+
+    if shape == "batched":
+        a = torch.randn(batch, m, k, dtype=dtype, device=device)
+        b = torch.randn(batch, k, n, dtype=dtype, device=device)
+        op = torch.bmm
+    else:
+        a = torch.randn(m, k, dtype=dtype, device=device)
+        b = torch.randn(k, n, dtype=dtype, device=device)
+        op = torch.matmul
+    out = op(a, b)
+
+    previous_tf32 = torch.backends.cuda.matmul.allow_tf32
+    torch.backends.cuda.matmul.allow_tf32 = allow_tf32
+    try:
+        for _ in range(warmup_iterations):
+            op(a, b, out=out)
+        devices.synchronize(device)
+
+        timer = KernelTimer(device)
+        times = []
+        for _ in range(iterations):
+            timer.start()
+            op(a, b, out=out)
+            timer.mark("gemm")
+            times.append(timer.elapsed()["gemm"])
+    finally:
+        torch.backends.cuda.matmul.allow_tf32 = previous_tf32
+
+    flops = gemm_flops(batch, m, n, k)
+    return (batch, m, n, k), flops / summarize(times)["median"]
+
+
+def gemm_sweep(device, dtypes=None, shapes=None, size=8192, iterations=20, warmup_iterations=3):
+    # Returns one row per (dtype, shape); unsupported combinations carry an error instead of a throughput
+    rows = []
+    for dtype_name in dtypes or DTYPES:
+        for shape in shapes or SHAPES:
+            row = {"dtype": dtype_name, "shape": shape, "dims": gemm_dims(shape, size),
+                   "tflops": None, "peak_tflops": reference_peak(device, dtype_name), "efficiency": None,
+                   "error": None}
+            try:
+                row["dims"], flops_per_second = time_gemm(device, dtype_name, shape, size, iterations,
+                                                          warmup_iterations)
+                row["tflops"] = flops_per_second / 1e12
+                if row["peak_tflops"]:
+                    row["efficiency"] = row["tflops"] / row["peak_tflops"]
+            except RuntimeError as e:
+                # e.g. float16 matmul is not implemented on CPU in older PyTorch releases
+                row["error"] = str(e).splitlines()[0]
+            rows.append(row)
+    return rows
+
+
+def format_sweep_table(rows, min_efficiency=MIN_EFFICIENCY):
+    header = f"{'dtype':<6} {'shape':<12} {'dims (BxMxNxK)':<26} {'TFLOPS':>10} {'peak':>8} {'eff':>6}  verdict"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        dims = "x".join(str(d) for d in row["dims"])
+        if row["error"]:
+            lines.append(f"{row['dtype']:<6} {row['shape']:<12} {dims:<26} {'-':>10} {'-':>8} {'-':>6}  "
+                         f"unsupported: {row['error']}")
+            continue
+        peak = f"{row['peak_tflops']:.1f}" if row["peak_tflops"] else "-"
+        if row["efficiency"] is None:
+            efficiency, verdict = "-", "no reference"
+        else:
+            efficiency = f"{row['efficiency'] * 100:.0f}%"
+            verdict = "OK" if row["efficiency"] >= min_efficiency else "LOW"
+        lines.append(f"{row['dtype']:<6} {row['shape']:<12} {dims:<26} {row['tflops']:>10.2f} {peak:>8} "
+                     f"{efficiency:>6}  {verdict}")
+    return lines
@@ -0,0 +1,155 @@
+import contextlib
+import re
+import subprocess
+
+import torch
+
+from gpu_tests import devices
+from gpu_tests.timing import KernelTimer, summarize
+
+# pageable:       ordinary host memory, copies are staged by the driver
+# pinned:         page-locked host memory, copies go straight over DMA
+# pinned-streams: pinned memory split across several CUDA streams, overlapping H2D copy, compute and D2H copy
+MODES = ["pageable", "pinned", "pinned-streams"]
+DIRECTIONS = {"pageable": ["h2d", "d2h"], "pinned": ["h2d", "d2h"], "pinned-streams": ["overlap"]}
+
+MIN_SIZE = 4 * 1024
+
+
+def sweep_sizes(max_size, min_size=MIN_SIZE, factor=4):
+    sizes = []
+    size = min_size
+    while size <= max_size:
+        sizes.append(size)
+        size *= factor
+    return sizes
+
+
+def iterations_for(size):
+    # Many repeats for small messages where launch latency dominates, a few for multi-GB ones
+    return max(5, min(200, (256 * 1024 * 1024) // size))
+
+
+def numa_nodes(address):
+    # {NUMA node: pages} backing the host mapping that contains `address`, from /proc/self/numa_maps
+    try:
+        with open("/proc/self/maps") as f:
+            for line in f:
+                start, end = (int(value, 16) for value in line.split()[0].split("-"))
+                if start <= address < end:
+                    break
+            else:
+                return {}
+        with open("/proc/self/numa_maps") as f:
+            for line in f:
+                if int(line.split(" ", 1)[0], 16) == start:
+                    return {int(node): int(pages) for node, pages in re.findall(r"\bN(\d+)=(\d+)", line)}
+    except OSError:
+        pass
+    return {}
+
+
+def device_numa_node(gpu_index):
+    # NUMA node the PCIe root of CUDA device `gpu_index` is attached to, or None if it cannot be determined
+    try:
+        result = subprocess.run(["nvidia-smi", "--query-gpu=pci.bus_id", "--format=csv,noheader",
+                                 "-i", devices.nvidia_smi_uuid(gpu_index)], capture_output=True, text=True)
+        bus_id = result.stdout.strip()[-12:].lower()  # "00000000:07:00.0" -> "0000:07:00.0"
+        with open(f"/sys/bus/pci/devices/{bus_id}/numa_node") as f:
+            node = int(f.read())
+        return node if node >= 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+class HostTransferBenchmark:
+    # Host and device buffers are allocated once at the largest size and sliced for each message size.
+    # On a fake CPU device the "device" buffer is host memory and streams are no-ops, so only the pipeline
+    # logic and the accounting are exercised.
+
+    def __init__(self, device, max_size, num_streams=4):
+        self.device = device
+        self.is_cuda = device.type == "cuda"
+        self.num_streams = num_streams
+        # Touch the pageable buffer so its pages are faulted in (and placed on a NUMA node) before timing
+        self.pageable = torch.empty(max_size, dtype=torch.uint8).fill_(1)
+        self.pinned = torch.empty(max_size, dtype=torch.uint8, pin_memory=self.is_cuda).fill_(1)
+        self.device_buffer = torch.empty(max_size, dtype=torch.uint8, device=device)
+        self.streams = [torch.cuda.Stream(device) for _ in range(num_streams)] if self.is_cuda else [None] * num_streams
+        self.timer = KernelTimer(device)
+
+    def host_numa_nodes(self, mode):
+        host = self.pageable if mode == "pageable" else self.pinned
+        return numa_nodes(host.data_ptr())
+
+    def _stream(self, stream):
+        return torch.cuda.stream(stream) if stream is not None else contextlib.nullcontext()
+
+    def _copy(self, mode, direction, size):
+        host = (self.pageable if mode == "pageable" else self.pinned)[:size]
+        device_buffer = self.device_buffer[:size]
+        non_blocking = mode != "pageable"
+        if direction == "h2d":
+            device_buffer.copy_(host, non_blocking=non_blocking)
+        else:
+            host.copy_(device_buffer, non_blocking=non_blocking)
+
+    def _overlap(self, size):
+        # Chunk i goes H2D, is incremented on the device, and goes back D2H, all on stream i % num_streams,
+        # so copies in one direction overlap with compute and copies in the other on different chunks
+        chunk = -(-size // self.num_streams)
+        current = torch.cuda.current_stream(self.device) if self.is_cuda else None
+        for i, start in enumerate(range(0, size, chunk)):
+            stream = self.streams[i % self.num_streams]
+            if stream is not None:
+                stream.wait_stream(current)
+            host = self.pinned[start:min(start + chunk, size)]
+            device_buffer = self.device_buffer[start:min(start + chunk, size)]
+            with self._stream(stream):
+                device_buffer.copy_(host, non_blocking=True)
+                device_buffer.add_(1)
+                host.copy_(device_buffer, non_blocking=True)
+        if current is not None:
+            for stream in self.streams:
+                current.wait_stream(stream)
+
+    def measure(self, mode, direction, size, iterations):
+        # Returns GB/s per iteration; the overlapped pipeline moves `size` bytes in each direction
+        bytes_moved = 2 * size if direction == "overlap" else size
+        bandwidths = []
+        for _ in range(iterations + 1):
+            self.timer.start()
+            if direction == "overlap":
+                self._overlap(size)
+            else:
+                self._copy(mode, direction, size)
+            self.timer.mark("transfer")
+            bandwidths.append(bytes_moved / self.timer.elapsed()["transfer"] / 1e9)
+        # The first iteration is a warmup
+        return bandwidths[1:]
+
+    def sweep(self, sizes, modes=None):
+        rows = []
+        for mode in modes or MODES:
+            for direction in DIRECTIONS[mode]:
+                for size in sizes:
+                    stats = summarize(self.measure(mode, direction, size, iterations_for(size)))
+                    rows.append({"mode": mode, "direction": direction, "size": size,
+                                 "median_gbps": stats["median"], "p5_gbps": stats["p5"], "p95_gbps": stats["p95"]})
+        return rows
+
+
+def format_size(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:g}{unit}"
+        size /= 1024
+
+
+def format_transfer_table(rows):
+    header = f"{'mode':<15} {'direction':<9} {'size':>8} {'median GB/s':>12} {'p5':>8} {'p95':>8}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{row['mode']:<15} {row['direction']:<9} {format_size(row['size']):>8} "
+                     f"{row['median_gbps']:>12.2f} {row['p5_gbps']:>8.2f} {row['p95_gbps']:>8.2f}")
+    return lines
@@ -0,0 +1,91 @@
+import torch
+
+from gpu_tests import profiling
+from gpu_tests.correctness import seeded_generator
+from gpu_tests.timing import KernelTimer, summarize
+
+# inplace: sin_/exp_ over the whole tensor, two kernel launches per pass
+# chunked: the same ops over large auto-sized views of the tensor
+# graph:   the chunked pass captured once as a CUDA graph and replayed, removing per-launch host overhead
+ENGINES = ["inplace", "chunked", "graph"]
+
+TARGET_CHUNKS = 64
+MIN_CHUNK_ELEMENTS = 16 * 1024 * 1024
+
+
+def create_large_tensor(size_gb, device, seed=None):
+    # float32 tensor of `size_gb` GB of uniform random values, reproducible when a seed is given
+    num_elements = int(size_gb * 1024 * 1024 * 1024 / 4)
+    generator = seeded_generator(device, seed) if seed is not None else None
+    return torch.rand(num_elements, device=device, generator=generator)
+
+
+def auto_chunk_elements(numel):
+    # Large enough that launch overhead is negligible, small enough to keep some chunk structure
+    return max(MIN_CHUNK_ELEMENTS, -(-numel // TARGET_CHUNKS))
+
+
+class ComputeEngine:
+    # Runs passes of sin followed by exp, in place over a flat tensor, and measures achieved memory bandwidth
+
+    # Each of sin_ and exp_ reads and writes every element once
+    ACCESSES_PER_ELEMENT = 4
+
+    def __init__(self, tensor, mode="inplace", chunk_elements=None):
+        if mode not in ENGINES:
+            raise ValueError(f"Unknown compute engine: {mode}")
+        if mode == "graph" and tensor.device.type != "cuda":
+            raise ValueError("The graph engine needs a CUDA device")
+        self.tensor = tensor
+        self.mode = mode
+        self.chunk_elements = chunk_elements or auto_chunk_elements(tensor.numel())
+        self.chunks = [tensor[i:i + self.chunk_elements] for i in range(0, tensor.numel(), self.chunk_elements)]
+        self.bytes_per_pass = self.ACCESSES_PER_ELEMENT * tensor.numel() * tensor.element_size()
+        self.timer = KernelTimer(tensor.device)
+        self.graph = None
+        if mode == "graph":
+            self._capture()
+
+    def _chunked_pass(self):
+        for chunk in self.chunks:
+            chunk.sin_()
+            chunk.exp_()
+
+    def _capture(self):
+        # Warm up on a side stream before capture, as required by torch.cuda.graph
+        stream = torch.cuda.Stream(self.tensor.device)
+        stream.wait_stream(torch.cuda.current_stream(self.tensor.device))
+        with torch.cuda.stream(stream):
+            self._chunked_pass()
+        torch.cuda.current_stream(self.tensor.device).wait_stream(stream)
+
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self.graph):
+            self._chunked_pass()
+
+    def run_pass(self):
+        if self.mode == "inplace":
+            self.tensor.sin_()
+            self.tensor.exp_()
+        elif self.mode == "chunked":
+            self._chunked_pass()
+        else:
+            self.graph.replay()
+
+    def run(self, iterations):
+        # Returns the achieved bandwidth of each pass in GB/s
+        bandwidths = []
+        for _ in range(iterations):
+            self.timer.start()
+            with profiling.region("hbm pass"):
+                self.run_pass()
+                self.timer.mark("pass")
+            with profiling.region("hbm sync"):
+                elapsed = self.timer.elapsed()["pass"]
+            bandwidths.append(self.bytes_per_pass / elapsed / 1e9)
+        return bandwidths
+
+
+def format_bandwidth(bandwidths):
+    stats = summarize(bandwidths)
+    return f"median {stats['median']:.1f} GB/s (p5 {stats['p5']:.1f}, p95 {stats['p95']:.1f})"
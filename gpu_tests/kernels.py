@@ -0,0 +1,87 @@
+import torch
+
+from gpu_tests import devices
+from gpu_tests.correctness import seeded_generator
+from gpu_tests.sizing import DEFAULT_FILL, allocate_with_backoff, square_size
+
+
+class StressKernel:
+    # The matmul -> sin + cos -> sum workload shared by the stress scripts.
+    # By default every stage allocates its output, as the original loop did. In place mode writes into
+    # buffers allocated once up front, so the memory footprint is fixed from the first iteration.
+
+    # Peak number of live N x N buffers. Allocating: a and b, plus the previous c and d kept alive while
+    # the next c, sin(c), cos(c) and d are computed. In place: a, b, c and d only.
+    BUFFERS = {False: 7, True: 4}
+
+    def __init__(self, a, b, in_place=False):
+        self.a = a
+        self.b = b
+        self.in_place = in_place
+        self.c = None
+        self.d = None
+        self.result = None
+        if in_place:
+            self.c = torch.empty(a.shape[0], b.shape[1], dtype=a.dtype, device=a.device)
+            self.d = torch.empty_like(self.c)
+            self.result = torch.empty((), dtype=a.dtype, device=a.device)
+
+    def gemm(self):
+        if self.in_place:
+            torch.matmul(self.a, self.b, out=self.c)
+        else:
+            self.c = torch.matmul(self.a, self.b)
+
+    def elementwise(self):
+        if self.in_place:
+            # c is overwritten by the next gemm, so cos can be taken in place
+            torch.sin(self.c, out=self.d)
+            self.d.add_(self.c.cos_())
+        else:
+            self.d = torch.sin(self.c) + torch.cos(self.c)
+
+    def reduction(self):
+        if self.in_place:
+            torch.sum(self.d.view(-1), 0, out=self.result)
+        else:
+            self.result = torch.sum(self.d)
+
+    def __call__(self):
+        self.gemm()
+        self.elementwise()
+        self.reduction()
+        return self.result
+
+
+def allocation_count(device):
+    # Cumulative number of caching-allocator allocations on the device, or None where it is not tracked
+    if device.type != "cuda":
+        return None
+    return torch.cuda.memory_stats(device).get("allocation.all.allocated", 0)
+
+
+def allocate_stress_kernel(device, dtype=torch.float64, size=None, fill=DEFAULT_FILL, in_place=False, seed=None):
+    # Returns (size, StressKernel), sized from free memory unless `size` is given.
+    # One probe iteration runs inside the backoff so an OOM from the temporaries also shrinks the size.
+    # With a `seed` the inputs are the same on every run, so that a data error can be reproduced.
+    def allocate(size):
+        print(f"Creating tensors of size {size}x{size}")
+        generator = seeded_generator(device, seed) if seed is not None else None
+        a = torch.randn(size, size, dtype=dtype, device=device, generator=generator)
+        b = torch.randn(size, size, dtype=dtype, device=device, generator=generator)
+        kernel = StressKernel(a, b, in_place)
+        kernel()
+        devices.synchronize(device)
+        return kernel
+
+    if size is None:
+        size = square_size(device, dtype, StressKernel.BUFFERS[in_place], fill)
+    return allocate_with_backoff(allocate, size, device)
+
+
+def allocations_per_iteration(device, start_count, iterations):
+    # Mean allocations per iteration since `start_count` was taken with allocation_count()
+    end_count = allocation_count(device)
+    if start_count is None or end_count is None or not iterations:
+        return None
+    return (end_count - start_count) / iterations
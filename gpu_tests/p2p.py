@@ -0,0 +1,215 @@
+import csv
+import itertools
+import json
+import time
+
+import torch
+
+from gpu_tests import profiling
+from gpu_tests.h2d import format_size, sweep_sizes
+from gpu_tests.timing import summarize
+
+# unidirectional: one ordered pair at a time
+# bidirectional:  both directions of one GPU pair at the same time, on separate streams
+# concurrent:     every ordered pair at the same time (all-to-all)
+# planned:        every ordered pair, in rounds of copies that share no GPU or PCIe/host path (Topology.plan_rounds)
+MODES = ["unidirectional", "bidirectional", "concurrent", "planned"]
+
+# A link is flagged when its median bandwidth is below this fraction of the topology expectation
+MIN_EXPECTED_FRACTION = 0.5
+
+
+def test_nvlink_transfer(src_gpu, dst_gpu, tensor_size_gb=1):
+    # Single timed copy of a fresh tensor, as the original NVLink scripts measured it; returns Gb/s
+    tensor_size = int(tensor_size_gb * 1024 * 1024 * 1024 / 4)  # size in number of float32 elements
+    with profiling.region("nvlink allocate"):
+        src_tensor = torch.rand(tensor_size, dtype=torch.float32, device=f'cuda:{src_gpu}')
+        torch.cuda.synchronize(src_gpu)
+
+    start_time = time.time()
+    with profiling.region("nvlink copy"):
+        dst_tensor = src_tensor.to(f'cuda:{dst_gpu}')
+    with profiling.region("nvlink sync"):
+        torch.cuda.synchronize(dst_gpu)
+    end_time = time.time()
+
+    transfer_time = end_time - start_time
+    return (tensor_size_gb * 8) / transfer_time  # Convert GB/s to Gb/s
+
+
+class P2PBandwidthMatrix:
+    # Device-to-device copy bandwidth between every pair of GPUs.
+    # Buffers and streams are allocated once: one source buffer per GPU and one destination buffer per
+    # ordered pair, so concurrent copies never share a destination.
+
+    def __init__(self, gpus, size_bytes, topology=None):
+        self.gpus = list(gpus)
+        self.topology = topology
+        self.size_bytes = size_bytes
+        self.pairs = [(src, dst) for src in self.gpus for dst in self.gpus if src != dst]
+        self.sources = {gpu: torch.rand(size_bytes // 4, device=f'cuda:{gpu}') for gpu in self.gpus}
+        self.destinations = {(src, dst): torch.empty(size_bytes // 4, device=f'cuda:{dst}') for src, dst in self.pairs}
+        # copy_ between devices runs on the source's current stream and synchronises with the destination's
+        # current stream, so each ordered pair gets its own stream on both ends to avoid serialising copies
+        self.streams = {(src, dst): (torch.cuda.Stream(device=src), torch.cuda.Stream(device=dst))
+                        for src, dst in self.pairs}
+        self.events = {pair: (torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True))
+                       for pair in self.pairs}
+
+    def _issue(self, pair):
+        src, dst = pair
+        src_stream, dst_stream = self.streams[pair]
+        start, end = self.events[pair]
+        with torch.cuda.stream(src_stream), torch.cuda.stream(dst_stream):
+            start.record(src_stream)
+            self.destinations[pair].copy_(self.sources[src], non_blocking=True)
+            end.record(src_stream)
+
+    def _run_round(self, pairs):
+        # Issue all copies of the round together and return {pair: GB/s}
+        with profiling.region("p2p idle"):
+            for gpu in self.gpus:
+                torch.cuda.synchronize(gpu)
+        with profiling.region("p2p issue"):
+            for pair in pairs:
+                self._issue(pair)
+        results = {}
+        with profiling.region("p2p sync"):
+            for pair in pairs:
+                start, end = self.events[pair]
+                end.synchronize()
+                results[pair] = self.size_bytes / (start.elapsed_time(end) / 1e3) / 1e9
+        return results
+
+    def rounds(self, mode):
+        if mode == "unidirectional":
+            return [[pair] for pair in self.pairs]
+        if mode == "bidirectional":
+            return [[(a, b), (b, a)] for a, b in itertools.combinations(self.gpus, 2)]
+        if mode == "concurrent":
+            return [self.pairs]
+        if mode == "planned":
+            if self.topology is None:
+                raise ValueError("The planned mode needs the node topology")
+            return self.topology.plan_rounds(self.pairs)
+        raise ValueError(f"Unknown P2P mode: {mode}")
+
+    def measure(self, mode, trials=5, warmup_trials=1):
+        # Returns {pair: summary of GB/s over the trials}
+        samples = {pair: [] for pair in self.pairs}
+        for trial in range(warmup_trials + trials):
+            for pairs in self.rounds(mode):
+                for pair, bandwidth in self._run_round(pairs).items():
+                    if trial >= warmup_trials:
+                        samples[pair].append(bandwidth)
+        return {pair: summarize(values) for pair, values in samples.items()}
+
+
+def peer_access(src, dst):
+    # Without peer access, copies between the two GPUs are staged through host memory
+    return torch.cuda.can_device_access_peer(src, dst)
+
+
+def message_sizes(max_bytes):
+    # 4 B up to `max_bytes` in steps of 4x
+    return sweep_sizes(max_bytes, min_size=4)
+
+
+def sweep_iterations(size):
+    # Copies per timed batch: many for small messages where launch latency dominates
+    return max(10, min(1000, (256 * 1024 * 1024) // size))
+
+
+class P2PSweep:
+    # Latency and bandwidth of src -> dst copies from a few bytes to GBs, reusing one pair of buffers.
+    # Each timed batch issues many back-to-back copies between two events, so per-copy latency is not
+    # swamped by event resolution.
+
+    def __init__(self, src, dst, max_bytes):
+        self.src = src
+        self.dst = dst
+        self.peer_access = peer_access(src, dst)
+        self.source = torch.ones(max_bytes, dtype=torch.uint8, device=f'cuda:{src}')
+        self.destination = torch.empty(max_bytes, dtype=torch.uint8, device=f'cuda:{dst}')
+        self.streams = (torch.cuda.Stream(device=src), torch.cuda.Stream(device=dst))
+        self.start = torch.cuda.Event(enable_timing=True)
+        self.end = torch.cuda.Event(enable_timing=True)
+
+    def measure(self, size, iterations, repeats=5):
+        # Seconds per copy for each of `repeats` batches, after one untimed batch
+        source = self.source[:size]
+        destination = self.destination[:size]
+        src_stream, dst_stream = self.streams
+        times = []
+        with torch.cuda.stream(src_stream), torch.cuda.stream(dst_stream):
+            for _ in range(repeats + 1):
+                self.start.record(src_stream)
+                for _ in range(iterations):
+                    destination.copy_(source, non_blocking=True)
+                self.end.record(src_stream)
+                self.end.synchronize()
+                times.append(self.start.elapsed_time(self.end) / 1e3 / iterations)
+        return times[1:]
+
+    def sweep(self, sizes):
+        rows = []
+        for size in sizes:
+            stats = summarize(self.measure(size, sweep_iterations(size)))
+            rows.append({"size": size, "latency_us": stats["median"] * 1e6,
+                         "bandwidth_gbps": size / stats["median"] / 1e9})
+        return rows
+
+
+def format_sweep_table(rows):
+    header = f"{'size':>8} {'latency (us)':>13} {'GB/s':>9}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{format_size(row['size']):>8} {row['latency_us']:>13.2f} {row['bandwidth_gbps']:>9.2f}")
+    return lines
+
+
+def flag_links(results, links, expectations, min_fraction=MIN_EXPECTED_FRACTION):
+    # [(pair, link type, median GB/s, expected GB/s)] for links below `min_fraction` of their expectation
+    flagged = []
+    for pair, stats in sorted(results.items()):
+        link = links.get(pair)
+        expected = expectations.get(pair)
+        if expected and stats["median"] < min_fraction * expected:
+            flagged.append((pair, link, stats["median"], expected))
+    return flagged
+
+
+def matrix_rows(results, gpus):
+    # N x N median GB/s, None on the diagonal
+    return [[results[(src, dst)]["median"] if src != dst else None for dst in gpus] for src in gpus]
+
+
+def format_matrix(results, gpus):
+    lines = ["src\\dst " + "".join(f"{f'GPU{dst}':>9}" for dst in gpus)]
+    for src, row in zip(gpus, matrix_rows(results, gpus)):
+        lines.append(f"{f'GPU{src}':<8}" + "".join(f"{'-':>9}" if v is None else f"{v:>9.1f}" for v in row))
+    return lines
+
+
+def write_csv(path, results, gpus):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["src\\dst"] + [f"GPU{dst}" for dst in gpus])
+        for src, row in zip(gpus, matrix_rows(results, gpus)):
+            writer.writerow([f"GPU{src}"] + ["" if v is None else f"{v:.3f}" for v in row])
+
+
+def write_json(path, results, gpus, mode, size_bytes, links=None, flagged=()):
+    document = {
+        "mode": mode,
+        "size_bytes": size_bytes,
+        "gpus": list(gpus),
+        "unit": "GB/s",
+        "matrix": matrix_rows(results, gpus),
+        "pairs": [{"src": src, "dst": dst, "link": (links or {}).get((src, dst)), **stats}
+                  for (src, dst), stats in sorted(results.items())],
+        "flagged": [{"src": src, "dst": dst, "link": link, "median": median, "expected": expected}
+                    for (src, dst), link, median, expected in flagged],
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
@@ -0,0 +1,72 @@
+import multiprocessing
+import queue
+import threading
+import traceback
+
+from gpu_tests import profiling
+
+BARRIER_TIMEOUT = 600  # seconds to wait for the slowest worker to finish its setup
+
+
+def _worker_main(worker, gpu_index, barrier, results, args):
+    reached = []
+
+    def ready():
+        # Called by the worker once its tensors are allocated, so every device starts loading together.
+        # A broken barrier (a peer failed during setup) must not stop the remaining devices.
+        reached.append(True)
+        try:
+            barrier.wait(BARRIER_TIMEOUT)
+        except threading.BrokenBarrierError:
+            print(f"Worker {gpu_index}: start barrier broken, continuing without synchronisation")
+
+    profiling.start_worker()
+    try:
+        result = worker(gpu_index, ready, *args)
+        results.put((gpu_index, result, None))
+    except BaseException as e:
+        traceback.print_exc()
+        results.put((gpu_index, None, f"{type(e).__name__}: {e}"))
+    finally:
+        # A worker that failed or returned early (e.g. out of memory) before ready() releases its peers, which
+        # would otherwise wait BARRIER_TIMEOUT for it
+        if not reached:
+            barrier.abort()
+        # With --profile the worker inherited GPU_TESTS_PROFILE and profiled itself; it writes its own trace
+        profiling.save_worker(f"gpu{gpu_index}")
+
+
+def run_parallel(worker, gpus, args=()):
+    # Run `worker(gpu_index, ready, *args)` in one process per device.
+    # Returns {gpu_index: (result, error)}; a failing or crashing worker only affects its own entry.
+    gpus = list(gpus)
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(len(gpus))
+    results = context.Queue()
+
+    processes = {}
+    for gpu_index in gpus:
+        p = context.Process(target=_worker_main, args=(worker, gpu_index, barrier, results, args),
+                            name=f"gpu{gpu_index}")
+        p.start()
+        processes[gpu_index] = p
+
+    outcomes = {}
+    while len(outcomes) < len(gpus):
+        try:
+            gpu_index, result, error = results.get(timeout=5)
+            outcomes[gpu_index] = (result, error)
+        except queue.Empty:
+            # Workers that died without reporting (segfault, OOM kill) are recorded as failures
+            for gpu_index, p in processes.items():
+                if gpu_index not in outcomes and not p.is_alive() and p.exitcode != 0:
+                    barrier.abort()
+                    outcomes[gpu_index] = (None, f"Worker process exited with code {p.exitcode}")
+            if all(not p.is_alive() for p in processes.values()) and results.empty():
+                for gpu_index in gpus:
+                    outcomes.setdefault(gpu_index, (None, "Worker process exited without reporting a result"))
+
+    for p in processes.values():
+        p.join()
+
+    return outcomes
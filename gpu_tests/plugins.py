@@ -0,0 +1,301 @@
+import socket
+import time
+
+from gpu_tests.registry import TestPlugin, load_script, register
+
+# Choices are spelled out here rather than imported so that torch is not loaded to build the parser;
+# they match gpu_tests.p2p.MODES, gpu_tests.hbm.ENGINES, gpu_tests.h2d.MODES, gpu_tests.staging.READERS and
+# gpu_tests.collectives.COLLECTIVES
+P2P_MODES = ["unidirectional", "bidirectional", "concurrent", "planned"]
+COMPUTE_ENGINES = ["inplace", "chunked", "graph"]
+TRANSFER_MODES = ["pageable", "pinned", "pinned-streams"]
+STAGING_READERS = ["pread", "mmap"]
+COLLECTIVES = ["all_reduce", "all_gather", "reduce_scatter", "broadcast", "all_to_all"]
+
+
+@register
+class StressTest(TestPlugin):
+    name = "stress"
+    help = "Full memory stress test with a PASS/FAIL report per GPU (torch-stress-test/report_full_memory_torch_stress_test.py)"
+    default_duration = 180
+
+    def add_arguments(self, parser):
+        parser.add_argument("--parallel", action="store_true", help="Test all selected GPUs at the same time, one process per GPU")
+        parser.add_argument("--in-place", action="store_true", help="Reuse preallocated output buffers instead of allocating every iteration")
+        parser.add_argument("--verify", action="store_true", help="Check the results for silent data corruption: GEMM checksums every iteration, a CPU cross-check every minute and a repeatable reduction")
+        parser.add_argument("--reference-gpu", type=int, help="Cross-check on this GPU instead of the CPU")
+        add_result_arguments(parser)
+
+    def run(self, args):
+        gpus = self.gpus(args)
+        if gpus:
+            load_script("report_full_memory_torch_stress_test").main(gpus, args.device, args.parallel, args.in_place,
+                                                                     self.duration(args), args.results, args.baseline_db,
+                                                                     args.verify, args.reference_gpu)
+
+
+@register
+class PerformanceTest(TestPlugin):
+    name = "perf"
+    help = "FLOPS benchmark or GEMM dtype/shape sweep per GPU (torch-stress-test/gpu_performance_benchmark.py)"
+    default_duration = 600
+
+    def add_arguments(self, parser):
+        parser.add_argument("--parallel", action="store_true", help="Benchmark all selected GPUs at the same time, one process per GPU")
+        parser.add_argument("--warmup", type=int, default=3, help="Untimed warmup iterations before measuring (default: 3)")
+        parser.add_argument("--sweep", action="store_true", help="Run a GEMM throughput sweep over dtypes and shapes instead of the timed benchmark")
+        parser.add_argument("--sweep-dtypes", nargs='*', help="Data types to sweep: fp64 fp32 tf32 bf16 fp16 (default: all)")
+        parser.add_argument("--sweep-size", type=int, help="Base matrix size for the sweep (default: 8192, 256 on --device cpu)")
+        parser.add_argument("--in-place", action="store_true", help="Reuse preallocated output buffers instead of allocating every iteration")
+        parser.add_argument("--timeseries", help="Directory for the per-iteration time series, one subdirectory per GPU (default: hostname_timeseries)")
+        add_steady_warmup_argument(parser, "the kernel")
+        parser.add_argument("--threads", action="store_true", help="Benchmark all selected GPUs at the same time on threads of one process, which share its start-up and CUDA contexts")
+        # gpu_tests.adaptive.DEFAULT_REL_WIDTH and MAX_SECONDS
+        parser.add_argument("--adaptive", type=float, nargs='?', const=0.01, metavar="REL_WIDTH", help="Stop measuring each GPU once the 95%% confidence interval of its throughput is within ±REL_WIDTH of the mean; GPUs that do not settle, fail or run hot are benchmarked again for --duration (default: off, 0.01 if given without a value)")
+        parser.add_argument("--adaptive-max", type=float, default=60, help="Longest adaptive measurement in seconds (default: 60)")
+        add_result_arguments(parser)
+
+    def run(self, args):
+        if args.sweep and args.parallel:
+            raise SystemExit("perf: --sweep runs one GPU at a time and cannot be combined with --parallel")
+        if args.threads and args.parallel:
+            raise SystemExit("perf: --threads and --parallel are two ways of benchmarking the GPUs at the same time; give one")
+        gpus = self.gpus(args)
+        if gpus:
+            load_script("gpu_performance_benchmark").main(gpus, args.device, args.parallel, args.warmup, args.sweep,
+                                                          args.sweep_dtypes, args.sweep_size, args.in_place,
+                                                          self.duration(args), args.results, args.baseline_db,
+                                                          args.timeseries, args.steady_warmup, args.adaptive,
+                                                          args.adaptive_max, args.threads)
+
+
+@register
+class QuickCheck(TestPlugin):
+    name = "quick"
+    help = "Healthy node check in about two minutes: adaptive perf on all GPUs at once, then a short P2P check, in one process"
+    default_duration = 600  # the full length benchmark suspicious GPUs are escalated to
+    in_default_suite = False  # perf at full length covers it
+
+    def add_arguments(self, parser):
+        # gpu_tests.adaptive.DEFAULT_REL_WIDTH and MAX_SECONDS
+        parser.add_argument("--rel-width", type=float, default=0.01, help="Stop measuring a GPU once the 95%% confidence interval of its throughput is within this fraction of the mean (default: 0.01)")
+        parser.add_argument("--max-seconds", type=float, default=60, help="Longest adaptive measurement; GPUs that have not settled by then are escalated (default: 60)")
+        parser.add_argument("--p2p-size-gb", type=float, default=0.25, help="Transfer size of the P2P check in GB; 0 to skip it (default: 0.25)")
+        add_result_arguments(parser)
+
+    def run(self, args):
+        from gpu_tests import devices
+
+        gpus = self.gpus(args)
+        if not gpus:
+            return
+        start_time = time.time()
+        # Every test below runs in this process and reuses these contexts
+        contexts = devices.init_contexts(args.device, gpus)
+        print(f"Device contexts of GPUs {', '.join(str(g) for g in gpus)} created in {sum(contexts.values()):.1f}s")
+        load_script("gpu_performance_benchmark").main(gpus, args.device, duration=self.duration(args),
+                                                      results_path=args.results, baseline_db=args.baseline_db,
+                                                      adaptive=args.rel_width, adaptive_max=args.max_seconds,
+                                                      threads=True)
+        if args.device == "cuda" and len(gpus) > 1 and args.p2p_size_gb:
+            load_script("nvlink_test").main("unidirectional", 2, args.p2p_size_gb, "quick_nvlink_bandwidth", gpus=gpus,
+                                            results_path=args.results, baseline_db=args.baseline_db)
+        print(f"Quick check finished in {time.time() - start_time:.0f}s")
+
+
+@register
+class BurnInTest(TestPlugin):
+    name = "burnin"
+    help = "GEMM, HBM and P2P workloads running together with a duty cycle mix (torch-stress-test/burn_in_test.py)"
+    default_duration = 600
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mix", default="gemm,hbm,p2p", help="Workloads and the fraction of each period they are busy, e.g. gemm=1,hbm=0.5,p2p=0.25 (default: all, always busy)")
+        parser.add_argument("--period", type=float, default=2, help="Duty cycle period in seconds (default: 2)")
+        parser.add_argument("--solo", type=float, default=10, help="Seconds each kind of workload first runs alone as its reference; 0 to skip (default: 10)")
+        parser.add_argument("--timeseries", help="Directory for the per-burst throughput of every workload (default: hostname_burn_in)")
+        add_result_arguments(parser)
+
+    def run(self, args):
+        gpus = self.gpus(args)
+        if gpus:
+            load_script("burn_in_test").main(gpus, args.device, args.mix, self.duration(args), args.solo, args.period,
+                                             args.timeseries, args.results, args.baseline_db)
+
+
+@register
+class NVLinkTest(TestPlugin):
+    name = "nvlink"
+    help = "Peer-to-peer bandwidth matrix or message size sweep between GPUs (torch-largetensor-matrix/nvlink_test.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=P2P_MODES, default="unidirectional", help="Transfer pattern (default: unidirectional)")
+        parser.add_argument("--trials", type=int, default=5, help="Timed trials per pair (default: 5)")
+        parser.add_argument("--size-gb", type=float, default=1, help="Transfer size per copy in GB, or the largest size with --sweep (default: 1)")
+        parser.add_argument("--sweep", action="store_true", help="Sweep message sizes from 4 bytes up to --size-gb")
+        parser.add_argument("--output", default="nvlink_bandwidth", help="Prefix for the CSV/JSON files (default: nvlink_bandwidth)")
+        parser.add_argument("--topology", help="Recorded nvidia-smi topo -m output to use instead of running nvidia-smi")
+        add_steady_warmup_argument(parser, "device to device copies")
+        add_result_arguments(parser)
+
+    def run(self, args):
+        if args.device != "cuda":
+            print("The nvlink test needs CUDA devices.")
+            return
+        load_script("nvlink_test").main(args.mode, args.trials, args.size_gb, args.output, args.sweep, args.gpu,
+                                        args.results, args.baseline_db, args.topology, args.steady_warmup)
+
+
+@register
+class LargeTensorTest(TestPlugin):
+    name = "largetensor"
+    help = "Large tensor HBM passes with periodic disk I/O, one process per GPU (torch-largetensor-matrix/multiple-gpu.py)"
+    default_duration = 300
+
+    def add_arguments(self, parser):
+        parser.add_argument("--memory-gb", type=float, default=72, help="Size of the tensor on each GPU in GB (default: 72)")
+        parser.add_argument("--engine", choices=COMPUTE_ENGINES, default="inplace", help="Compute engine for the tensor passes (default: inplace)")
+        parser.add_argument("--io-file-size-gb", type=float, default=10, help="Size of each process's I/O test file in GB (default: 10)")
+        parser.add_argument("--io-operations", type=int, default=50, help="Write/read passes per I/O cycle (default: 50)")
+        add_io_engine_arguments(parser, "io-")
+        parser.add_argument("--verify", action="store_true", help="Write an address pattern over each tensor before every I/O cycle and verify it afterwards")
+
+    def run(self, args):
+        if args.device != "cuda":
+            print("The largetensor test needs CUDA devices.")
+            return
+        gpus = self.gpus(args)
+        if gpus:
+            load_script("multiple-gpu").main(args.engine, io_engine_options(args), gpus, self.duration(args) / 60,
+                                             args.memory_gb, args.io_file_size_gb, args.io_operations, args.verify)
+
+
+@register
+class DiskIOTest(TestPlugin):
+    name = "io"
+    help = "Disk write/read throughput and latency of the scratch file system (gpu_tests/diskio.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="Test file (default: test_file_<hostname>.bin in the current directory)")
+        parser.add_argument("--file-size-gb", type=float, default=10, help="Size of the test file in GB (default: 10)")
+        parser.add_argument("--operations", type=int, default=5, help="Write/read passes, or the minimum with --duration (default: 5)")
+        add_io_engine_arguments(parser, "")
+        add_result_arguments(parser)
+
+    def run(self, args):
+        from gpu_tests.diskio import DiskIOEngine, format_io_summary
+        from gpu_tests.results import ResultWriter, default_jsonl_path
+        from gpu_tests.timing import summarize
+
+        path = args.path or f"test_file_{socket.gethostname()}.bin"
+        engine = DiskIOEngine(path, int(args.file_size_gb * 1024**3), **io_engine_options(args))
+        duration = self.duration(args)
+        results = []
+        start_time = time.time()
+        try:
+            while len(results) < 2 * args.operations or (duration is not None and time.time() - start_time < duration):
+                results += engine.run(1)
+        finally:
+            engine.close()
+        print("\n".join(format_io_summary(results, f"I/O ({path})")))
+
+        # A host-level result, so it is not tied to a GPU
+        metrics = {}
+        for op in ["write", "read"]:
+            passes = [r for r in results if r["op"] == op]
+            if not passes:
+                # --operations 0 with no duration
+                continue
+            metrics[f"{op}_gbps_median"] = summarize([r["gbps"] for r in passes])["median"]
+            metrics[f"{op}_latency_p95_s"] = summarize([r["latency"]["p95"] for r in passes])["median"]
+        parameters = {"file_size_gb": args.file_size_gb, **io_engine_options(args)}
+        result_writer = ResultWriter("io", args.device, args.results or default_jsonl_path(), args.baseline_db)
+        result_writer.add(None, None, parameters, metrics, None, iterations=results)
+        result_writer.close()
+
+
+@register
+class HostTransferTest(TestPlugin):
+    name = "h2d"
+    help = "Host to device / device to host transfer bandwidth (torch-largetensor-matrix/host_transfer_test.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-size-gb", type=float, help="Largest message size in GB (default: 4, 0.0625 on --device cpu)")
+        parser.add_argument("--streams", type=int, default=4, help="CUDA streams used by the pinned-streams mode (default: 4)")
+        parser.add_argument("--mode", nargs='*', choices=TRANSFER_MODES, help="Transfer modes to test (default: all)")
+
+    def run(self, args):
+        gpus = self.gpus(args)
+        if gpus:
+            max_size_gb = args.max_size_gb or (4 if args.device == "cuda" else 0.0625)
+            load_script("host_transfer_test").main(gpus, args.device, int(max_size_gb * 1024**3), args.streams, args.mode)
+
+
+@register
+class StagingTest(TestPlugin):
+    name = "staging"
+    help = "Storage to GPU ingest pipeline overlapped with compute (torch-largetensor-matrix/staging_test.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file-size-gb", type=float, help="Size of the file streamed to each GPU in GB (default: 10, 0.25 on --device cpu)")
+        parser.add_argument("--tensor-size-gb", type=float, help="Size of the tensor computed on during ingest in GB (default: 16, 0.0625 on --device cpu)")
+        parser.add_argument("--chunk-mb", type=int, default=64, help="Chunk size in MB (default: 64)")
+        parser.add_argument("--buffers", type=int, default=3, help="Staging buffers; 2 = double, 3 = triple buffering (default: 3)")
+        parser.add_argument("--reader", choices=STAGING_READERS, default="pread", help="How chunks are read from the file (default: pread)")
+        parser.add_argument("--engine", choices=COMPUTE_ENGINES, default="inplace", help="Compute engine overlapped with ingest (default: inplace)")
+
+    def run(self, args):
+        gpus = self.gpus(args)
+        if gpus:
+            cuda = args.device == "cuda"
+            load_script("staging_test").main(gpus, args.device, args.file_size_gb or (10 if cuda else 0.25),
+                                             args.tensor_size_gb or (16 if cuda else 0.0625), args.chunk_mb * 1024**2,
+                                             args.buffers, args.reader, args.engine)
+
+
+@register
+class CollectivesTest(TestPlugin):
+    name = "collectives"
+    help = "All-reduce, all-gather, reduce-scatter, broadcast and all-to-all bus bandwidth (torch-largetensor-matrix/collective_test.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--collective", nargs='*', choices=COLLECTIVES, help="Collectives to test (default: all)")
+        parser.add_argument("--max-size-gb", type=float, help="Largest message size in GB (default: 1, 0.0625 on --device cpu)")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed operations before timing each size (default: 5)")
+        add_result_arguments(parser)
+
+    def run(self, args):
+        from gpu_tests import devices
+
+        if not devices.is_available(args.device):
+            print("No CUDA-capable GPUs found.")
+            return
+        max_size_gb = args.max_size_gb or (1 if args.device == "cuda" else 0.0625)
+        load_script("collective_test").main(args.device, args.collective, int(max_size_gb * 1024**3), args.warmup,
+                                            args.gpu, args.results, args.baseline_db)
+
+
+def add_result_arguments(parser):
+    parser.add_argument("--results", help="JSONL file the structured results are appended to (default: hostname_results.jsonl)")
+    parser.add_argument("--baseline-db", help="Also add the results to this SQLite baseline store; perf and nvlink are judged against it")
+
+
+def add_steady_warmup_argument(parser, load):
+    # Timeout of gpu_tests.warmup.WarmupController, spelled out here for the same reason as the choices above
+    parser.add_argument("--steady-warmup", type=float, nargs='?', const=300, metavar="TIMEOUT",
+                        help=f"Before measuring, run {load} until clocks, power and temperature reach steady state, "
+                             "for at most TIMEOUT seconds (default: off, 300 if given without a value)")
+
+
+def add_io_engine_arguments(parser, prefix):
+    parser.add_argument(f"--{prefix}block-mb", type=int, default=8, help="Block size of each disk read/write in MB (default: 8)")
+    parser.add_argument(f"--{prefix}queue-depth", type=int, default=4, help="Disk operations kept in flight (default: 4)")
+    parser.add_argument(f"--{prefix}direct", action="store_true", help="Open the test file with O_DIRECT, bypassing the page cache")
+    parser.add_argument(f"--{prefix}no-fsync", action="store_true", help="Do not fsync after each write pass")
+
+
+def io_engine_options(args):
+    # DiskIOEngine keyword arguments from either the --io-* or the unprefixed options
+    prefix = "io_" if hasattr(args, "io_block_mb") else ""
+    return {"block_size": getattr(args, f"{prefix}block_mb") * 1024**2, "queue_depth": getattr(args, f"{prefix}queue_depth"),
+            "direct": getattr(args, f"{prefix}direct"), "fsync": not getattr(args, f"{prefix}no_fsync")}
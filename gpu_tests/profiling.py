@@ -0,0 +1,194 @@
+import contextlib
+import json
+import os
+import socket
+import threading
+import time
+
+# Directory the profiles are written to; set by --profile and inherited by worker processes, which then profile
+# themselves and write their own files
+PROFILE_ENV = "GPU_TESTS_PROFILE"
+TORCH_PROFILER_ENV = "GPU_TESTS_TORCH_PROFILER"
+
+# Events kept for the trace; the per-region totals keep counting after that
+MAX_EVENTS = 500000
+
+NULL_REGION = contextlib.nullcontext()
+
+
+class Region:
+    # Context manager timing one named section with perf_counter_ns, and marking it for torch.profiler if it runs.
+    # On CUDA the time is that of the host: kernel launches are short and the wait shows up where the host syncs.
+
+    __slots__ = ("profiler", "name", "start", "record")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.record = None
+
+    def __enter__(self):
+        if self.profiler.torch_profiler is not None:
+            import torch
+
+            self.record = torch.profiler.record_function(self.name)
+            self.record.__enter__()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        if self.record is not None:
+            self.record.__exit__(*exc)
+        self.profiler.add(self.name, self.start, end)
+
+
+class Profiler:
+    # Named region timers for the benchmark loops. Disabled (no directory), region() returns a shared null
+    # context, so the hooks cost one function call. Enabled, every region adds to a per-name count, total, min and
+    # max, and the first MAX_EVENTS regions are kept for a Chrome trace (chrome://tracing or ui.perfetto.dev).
+
+    def __init__(self, directory=None, use_torch_profiler=False):
+        self.directory = directory
+        self.enabled = directory is not None
+        self.use_torch_profiler = use_torch_profiler
+        self.torch_profiler = None
+        self.stats = {}  # {name: [count, total ns, min ns, max ns]}
+        self.events = []  # (name, thread id, start ns, duration ns)
+        self.threads = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter_ns()
+
+    def region(self, name):
+        if not self.enabled:
+            return NULL_REGION
+        return Region(self, name)
+
+    def add(self, name, start, end):
+        duration = end - start
+        thread = threading.get_ident()
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                self.stats[name] = [1, duration, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = min(stats[2], duration)
+                stats[3] = max(stats[3], duration)
+            if len(self.events) < MAX_EVENTS:
+                self.events.append((name, thread, start, duration))
+                if thread not in self.threads:
+                    self.threads[thread] = threading.current_thread().name
+            else:
+                self.dropped += 1
+
+    def start(self):
+        # torch.profiler records every operator and kernel as well, which is useful for short runs only
+        if self.enabled and self.use_torch_profiler:
+            import torch
+
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.torch_profiler = torch.profiler.profile(activities=activities)
+            self.torch_profiler.start()
+
+    def stop(self):
+        if self.torch_profiler is not None:
+            self.torch_profiler.stop()
+
+    def summary(self):
+        # One row per region, by total time: {"region", "count", "total_s", "mean_ms", "min_ms", "max_ms",
+        # "share": fraction of the wall time since the profiler started}
+        wall = max(time.perf_counter_ns() - self.origin, 1)
+        rows = []
+        for name, (count, total, minimum, maximum) in self.stats.items():
+            rows.append({"region": name, "count": count, "total_s": total / 1e9, "mean_ms": total / count / 1e6,
+                         "min_ms": minimum / 1e6, "max_ms": maximum / 1e6, "share": total / wall})
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def chrome_trace(self, label):
+        # Trace Event Format: one complete ("X") event per region, timestamps in microseconds of the monotonic
+        # clock, which all processes share, so the traces of the workers line up when opened together
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"{label} ({pid})"}}]
+        events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread, "args": {"name": name}}
+                   for thread, name in self.threads.items()]
+        events += [{"name": name, "ph": "X", "pid": pid, "tid": thread, "ts": start / 1e3,
+                    "dur": duration / 1e3} for name, thread, start, duration in self.events]
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"host": socket.gethostname(), "label": label, "dropped_events": self.dropped}}
+
+    def save(self, label):
+        # Writes <host>_<label>_<pid>.trace.json (plus .torch.json with torch.profiler) and _profile.txt;
+        # returns the summary lines
+        prefix = os.path.join(self.directory, f"{socket.gethostname()}_{label}_{os.getpid()}")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{prefix}.trace.json", 'w') as f:
+            json.dump(self.chrome_trace(label), f)
+        if self.torch_profiler is not None:
+            self.torch_profiler.export_chrome_trace(f"{prefix}.torch.json")
+        lines = [f"Profile of {label} (pid {os.getpid()}):"] + format_profile(self.summary())
+        if self.dropped:
+            lines.append(f"{self.dropped} regions after the first {MAX_EVENTS} are in the totals but not in the trace")
+        lines.append(f"Trace saved to {prefix}.trace.json")
+        with open(f"{prefix}_profile.txt", 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        return lines
+
+
+current = Profiler(os.environ.get(PROFILE_ENV), os.environ.get(TORCH_PROFILER_ENV) == "1")
+
+
+def region(name):
+    # `with profiling.region("gemm"):` around a hot section
+    return current.region(name)
+
+
+@contextlib.contextmanager
+def session(directory, label, use_torch_profiler=False):
+    # Profiles everything run inside, in this process and in worker processes started from it, and writes the
+    # trace and summary of this process at the end; nothing happens without a directory
+    global current
+    if directory is None:
+        yield None
+        return
+    os.environ[PROFILE_ENV] = directory
+    if use_torch_profiler:
+        os.environ[TORCH_PROFILER_ENV] = "1"
+    current = Profiler(directory, use_torch_profiler)
+    current.start()
+    try:
+        yield current
+    finally:
+        current.stop()
+        print("\n".join(current.save(label)))
+        current = Profiler()
+        os.environ.pop(PROFILE_ENV, None)
+        os.environ.pop(TORCH_PROFILER_ENV, None)
+
+
+def start_worker():
+    # Called by worker processes when they start: a fresh profiler set up from the environment, so that a forked
+    # worker does not carry its parent's regions, with torch.profiler started in the worker if asked for
+    global current
+    current = Profiler(os.environ.get(PROFILE_ENV), os.environ.get(TORCH_PROFILER_ENV) == "1")
+    current.start()
+
+
+def save_worker(label):
+    # Called by worker processes when they finish; the files are written only if profiling is on
+    if current.enabled:
+        current.stop()
+        print("\n".join(current.save(label)))
+
+
+def format_profile(rows):
+    header = f"{'region':<24} {'count':>9} {'total(s)':>10} {'mean(ms)':>10} {'min(ms)':>10} {'max(ms)':>10} {'share':>7}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{row['region']:<24} {row['count']:>9} {row['total_s']:>10.3f} {row['mean_ms']:>10.3f} "
+                     f"{row['min_ms']:>10.3f} {row['max_ms']:>10.3f} {row['share']:>7.1%}")
+    return lines
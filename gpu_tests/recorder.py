@@ -0,0 +1,147 @@
+import array
+import json
+import math
+import os
+import sys
+import time
+
+BUFFER_ROWS = 1024
+OVERVIEW_BUCKETS = 512  # even, so buckets can be merged pairwise
+
+META_FILE = "meta.json"
+
+
+class Decimator:
+    # Min/max/mean of consecutive rows in at most `capacity` buckets, for any run length.
+    # When every bucket is used, neighbouring buckets are merged pairwise and each bucket covers twice as many rows.
+    # Missing values (NaN) are left out of a bucket's statistics.
+
+    def __init__(self, columns, capacity=OVERVIEW_BUCKETS):
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.rows_per_bucket = 1
+        self.buckets = 0
+        self.rows = array.array("q", [0]) * capacity
+        self.counts = {c: array.array("q", [0]) * capacity for c in self.columns}
+        self.minimum = {c: array.array("d", [0.0]) * capacity for c in self.columns}
+        self.maximum = {c: array.array("d", [0.0]) * capacity for c in self.columns}
+        self.total = {c: array.array("d", [0.0]) * capacity for c in self.columns}
+
+    def _reset(self, i):
+        self.rows[i] = 0
+        for c in self.columns:
+            self.counts[c][i] = 0
+            self.minimum[c][i] = math.inf
+            self.maximum[c][i] = -math.inf
+            self.total[c][i] = 0.0
+
+    def _merge_pairs(self):
+        for i in range(self.capacity // 2):
+            a, b = 2 * i, 2 * i + 1
+            self.rows[i] = self.rows[a] + self.rows[b]
+            for c in self.columns:
+                self.counts[c][i] = self.counts[c][a] + self.counts[c][b]
+                self.minimum[c][i] = min(self.minimum[c][a], self.minimum[c][b])
+                self.maximum[c][i] = max(self.maximum[c][a], self.maximum[c][b])
+                self.total[c][i] = self.total[c][a] + self.total[c][b]
+        self.buckets = self.capacity // 2
+        self.rows_per_bucket *= 2
+
+    def add(self, row):
+        if self.buckets == 0 or self.rows[self.buckets - 1] >= self.rows_per_bucket:
+            if self.buckets == self.capacity:
+                self._merge_pairs()
+            self._reset(self.buckets)
+            self.buckets += 1
+        i = self.buckets - 1
+        self.rows[i] += 1
+        for c in self.columns:
+            value = row[c]
+            if not math.isnan(value):
+                self.counts[c][i] += 1
+                self.minimum[c][i] = min(self.minimum[c][i], value)
+                self.maximum[c][i] = max(self.maximum[c][i], value)
+                self.total[c][i] += value
+
+    def series(self, column, stat="mean"):
+        # One value per bucket; NaN for buckets without values
+        values = []
+        for i in range(self.buckets):
+            count = self.counts[column][i]
+            if not count:
+                values.append(math.nan)
+            elif stat == "mean":
+                values.append(self.total[column][i] / count)
+            else:
+                values.append((self.minimum if stat == "min" else self.maximum)[column][i])
+        return values
+
+
+class TimeSeriesRecorder:
+    # Per-iteration metrics with a monotonic timestamp, kept in memory in fixed-size array columns and appended
+    # to one raw float64 file per column under `path` every `buffer_rows` rows, so memory use does not grow with
+    # the run length. A decimated min/max/mean overview of the whole run stays in memory for reports.
+
+    def __init__(self, path, columns, buffer_rows=BUFFER_ROWS, overview_buckets=OVERVIEW_BUCKETS):
+        self.path = path
+        self.columns = ["timestamp"] + list(columns)
+        self.buffer_rows = buffer_rows
+        self.buffer = {c: array.array("d", [0.0]) * buffer_rows for c in self.columns}
+        self.buffered = 0
+        self.rows = 0
+        self.overview = Decimator(self.columns, overview_buckets)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, META_FILE), 'w') as f:
+            json.dump({"columns": self.columns, "dtype": "float64", "byteorder": sys.byteorder,
+                       "timestamp": "time.monotonic() seconds"}, f, indent=2)
+        self.files = {c: open(os.path.join(path, f"{c}.f64"), 'wb') for c in self.columns}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, **values):
+        # Unknown columns are an error; missing ones are stored as NaN
+        row = {"timestamp": time.monotonic()}
+        for c in self.columns[1:]:
+            value = values.pop(c, None)
+            row[c] = math.nan if value is None else float(value)
+        if values:
+            raise KeyError(f"Unknown columns: {', '.join(values)}")
+        for c in self.columns:
+            self.buffer[c][self.buffered] = row[c]
+        self.buffered += 1
+        self.rows += 1
+        self.overview.add(row)
+        if self.buffered == self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        for c in self.columns:
+            self.files[c].write(memoryview(self.buffer[c])[:self.buffered])
+            self.files[c].flush()
+        self.buffered = 0
+
+    def close(self):
+        if self.files:
+            self.flush()
+            for f in self.files.values():
+                f.close()
+            self.files = {}
+
+
+def read_columns(path, columns=None):
+    # {column: array of float64} as written by TimeSeriesRecorder; numpy.fromfile(f"{path}/{column}.f64") also works
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    result = {}
+    for c in columns or meta["columns"]:
+        values = array.array("d")
+        with open(os.path.join(path, f"{c}.f64"), 'rb') as f:
+            values.frombytes(f.read())
+        if meta["byteorder"] != sys.byteorder:
+            values.byteswap()
+        result[c] = values
+    return result
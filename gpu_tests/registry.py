@@ -0,0 +1,60 @@
+import importlib
+import os
+
+# Modules imported on top of the built-in tests, comma separated; each registers its tests when imported
+PLUGIN_ENV = "GPU_TESTS_PLUGINS"
+BUILTIN_PLUGINS = ["gpu_tests.plugins"]
+
+TESTS = {}
+
+
+class TestPlugin:
+    # A test that runs as `python -m gpu_tests <name>`.
+    # Subclasses add their own options in add_arguments and do the work in run. Anything that imports torch
+    # belongs inside run, so listing the tests and --help do not pay for it.
+
+    name = None
+    help = None
+    default_duration = None  # seconds, or None if the test does not run for a fixed time
+    in_default_suite = True  # run by `suite` and `slurm` when no tests are named
+
+    def add_arguments(self, parser):
+        pass
+
+    def run(self, args):
+        raise NotImplementedError
+
+    def duration(self, args):
+        return args.duration if args.duration is not None else self.default_duration
+
+    def gpus(self, args):
+        # Selected GPU indices, or all devices of the backend; [] if the backend is not available
+        from gpu_tests import devices
+
+        if not devices.is_available(args.device):
+            print("No CUDA-capable GPUs found.")
+            return []
+        return args.gpu if args.gpu is not None else list(range(devices.device_count(args.device)))
+
+
+def register(plugin_class):
+    # Class decorator adding a TestPlugin subclass to TESTS under its name
+    if plugin_class.name in TESTS:
+        raise ValueError(f"A test named {plugin_class.name} is already registered")
+    TESTS[plugin_class.name] = plugin_class()
+    return plugin_class
+
+
+def load_plugins():
+    for module in BUILTIN_PLUGINS + [m.strip() for m in os.environ.get(PLUGIN_ENV, "").split(",") if m.strip()]:
+        importlib.import_module(module)
+    return TESTS
+
+
+def default_suite(tests):
+    return [name for name, test in tests.items() if test.in_default_suite]
+
+
+def load_script(name):
+    # A test script module, by file name without .py (see gpu_tests/scripts)
+    return importlib.import_module(f"gpu_tests.scripts.{name}")
@@ -0,0 +1,28 @@
+# Helpers for the per-GPU text reports of the stress and perf scripts
+
+
+def format_memory(total_memory):
+    return f"{total_memory} MB" if total_memory is not None else "unknown"
+
+
+def format_utilization(memory_utilization):
+    return f"{memory_utilization:.2f}%" if memory_utilization is not None else "unknown (no telemetry)"
+
+
+def append_error(report, gpu_index, gpu_name, error):
+    report.append(f"GPU {gpu_index}: {gpu_name}")
+    report.append(f"Status: FAIL")
+    report.append(f"Error: Unexpected error - {error}")
+    report.append("")
+
+
+def format_temperature(temperature):
+    return f"{temperature}°C" if temperature is not None else "unknown (no telemetry)"
+
+
+def missing_telemetry(total_memory, peak_memory_usage, peak_temperature):
+    # Why the memory and temperature checks cannot be made, or None. Without these readings (nvidia-smi failed or
+    # never produced a sample) a GPU fails: the checks were not made, so they cannot pass.
+    missing = [name for name, value in [("total memory", total_memory), ("peak memory", peak_memory_usage),
+                                        ("peak temperature", peak_temperature)] if value is None]
+    return f"no telemetry for {', '.join(missing)}" if missing else None
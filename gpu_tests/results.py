@@ -0,0 +1,289 @@
+import csv
+import datetime
+import json
+import socket
+import sqlite3
+import statistics
+import subprocess
+import uuid
+
+from gpu_tests.slurm import node_name
+
+# One record per (test, GPU) result. Bump when fields change meaning so old baselines can be told apart.
+SCHEMA_VERSION = 1
+
+INVENTORY_FIELDS = [
+    ("index", "index"),
+    ("name", "name"),
+    ("uuid", "uuid"),
+    ("driver", "driver_version"),
+    ("bus_id", "pci.bus_id"),
+]
+
+DEFAULT_BASELINE_DB = "gpu_tests_baseline.sqlite"
+
+# Scale from the median absolute deviation to a standard deviation for normally distributed values
+MAD_TO_SIGMA = 1.4826
+
+
+def gpu_inventory(backend="cuda"):
+    # {CUDA index: {"name", "uuid", "driver", "bus_id"}} from nvidia-smi; empty for fake devices. nvidia-smi lists
+    # every GPU by its own index, so the entries are matched to the visible CUDA devices by UUID.
+    inventory = {}
+    if backend == "cpu":
+        return inventory
+    from gpu_tests import devices
+    try:
+        result = subprocess.run(["nvidia-smi", "--query-gpu=" + ",".join(query for _, query in INVENTORY_FIELDS),
+                                 "--format=csv,noheader"], capture_output=True, text=True)
+    except OSError:
+        return inventory
+    by_uuid = {}
+    for line in result.stdout.splitlines():
+        values = [value.strip() for value in line.split(",")]
+        if len(values) == len(INVENTORY_FIELDS) and values[0].isdigit():
+            entry = dict(zip((name for name, _ in INVENTORY_FIELDS), values))
+            entry.pop("index")
+            by_uuid[entry["uuid"]] = entry
+    for gpu_index in range(devices.device_count(backend)):
+        entry = by_uuid.get(devices.nvidia_smi_uuid(gpu_index))
+        if entry is not None:
+            inventory[gpu_index] = entry
+    return inventory
+
+
+def fake_inventory_entry(gpu_index):
+    # Stable per host, so fake devices can be tracked across runs like real GPUs
+    return {"name": None, "uuid": f"FAKE-{node_name()}-{gpu_index}", "driver": None, "bus_id": None}
+
+
+def make_result(test, gpu_index, gpu_model, parameters, metrics, verdict, iterations=None, error=None,
+                inventory_entry=None, run_id=None, host=None):
+    inventory_entry = inventory_entry or {}
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "run_id": run_id or uuid.uuid4().hex,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "host": host or node_name(),
+        "gpu": {"index": gpu_index, "model": gpu_model or inventory_entry.get("name"),
+                "uuid": inventory_entry.get("uuid"), "bus_id": inventory_entry.get("bus_id")},
+        "driver": inventory_entry.get("driver"),
+        "test": test,
+        "parameters": parameters,
+        "metrics": metrics,
+        "iterations": iterations,
+        "verdict": verdict,
+        "error": error,
+    }
+
+
+def append_jsonl(path, records):
+    with open(path, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_csv(path, records):
+    # One row per record with a column per metric; per-iteration values are left to the JSONL
+    metric_names = sorted({name for record in records for name in record["metrics"]})
+    columns = ["run_id", "timestamp", "host", "gpu_index", "gpu_model", "gpu_uuid", "driver", "test", "parameters",
+               "verdict", "error"] + metric_names
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for record in records:
+            gpu = record["gpu"]
+            writer.writerow([record["run_id"], record["timestamp"], record["host"], gpu["index"], gpu["model"],
+                             gpu["uuid"], record["driver"], record["test"], parameters_key(record["parameters"]),
+                             record["verdict"], record["error"]]
+                            + [record["metrics"].get(name) for name in metric_names])
+
+
+def parameters_key(parameters):
+    # Canonical text of the parameters; only results with equal keys are compared with each other
+    return json.dumps(parameters, sort_keys=True)
+
+
+class ResultWriter:
+    # Collects the records of one run of a test and appends them to a JSONL file and, optionally, the baseline store
+
+    def __init__(self, test, backend, jsonl_path, db_path=None):
+        self.test = test
+        self.jsonl_path = jsonl_path
+        self.db_path = db_path
+        self.run_id = uuid.uuid4().hex
+        self.backend = backend
+        self.inventory = gpu_inventory(backend)
+        self.records = []
+
+    def add(self, gpu_index, gpu_model, parameters, metrics, verdict, iterations=None, error=None, test=None):
+        self.records.append(make_result(test or self.test, gpu_index, gpu_model, parameters, metrics, verdict,
+                                        iterations, error, self._inventory_entry(gpu_index), self.run_id))
+
+    def _inventory_entry(self, gpu_index):
+        if self.backend == "cpu":
+            return fake_inventory_entry(gpu_index)
+        return self.inventory.get(gpu_index)
+
+    def close(self):
+        if not self.records:
+            return
+        append_jsonl(self.jsonl_path, self.records)
+        print(f"Results appended to {self.jsonl_path}")
+        if self.db_path:
+            with BaselineStore(self.db_path) as store:
+                store.add(self.records)
+            print(f"Results added to baseline store {self.db_path}")
+
+
+class BaselineStore:
+    # Append-only SQLite store of result records. Metrics are kept one row per value and indexed by
+    # (test, metric, model) so fleet comparisons do not scan whole records; updates and deletes are refused.
+    # A record is stored once: adding it again (e.g. importing a JSONL file twice) is skipped.
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            host TEXT NOT NULL,
+            gpu_index INTEGER,
+            gpu_model TEXT,
+            gpu_uuid TEXT,
+            driver TEXT,
+            test TEXT NOT NULL,
+            parameters TEXT NOT NULL,
+            verdict TEXT,
+            record TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS metrics (
+            result_id INTEGER NOT NULL REFERENCES results(id),
+            test TEXT NOT NULL,
+            gpu_model TEXT,
+            parameters TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value REAL
+        );
+        CREATE INDEX IF NOT EXISTS metrics_lookup ON metrics (test, name, gpu_model, parameters);
+        CREATE INDEX IF NOT EXISTS results_gpu ON results (host, gpu_uuid, test);
+        CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+        CREATE TRIGGER IF NOT EXISTS results_append_only_update BEFORE UPDATE ON results
+            BEGIN SELECT RAISE(ABORT, 'the baseline store is append-only'); END;
+        CREATE TRIGGER IF NOT EXISTS results_append_only_delete BEFORE DELETE ON results
+            BEGIN SELECT RAISE(ABORT, 'the baseline store is append-only'); END;
+        CREATE TRIGGER IF NOT EXISTS metrics_append_only_update BEFORE UPDATE ON metrics
+            BEGIN SELECT RAISE(ABORT, 'the baseline store is append-only'); END;
+        CREATE TRIGGER IF NOT EXISTS metrics_append_only_delete BEFORE DELETE ON metrics
+            BEGIN SELECT RAISE(ABORT, 'the baseline store is append-only'); END;
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(self.SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, records):
+        # Returns the number of records added, leaving out those already stored
+        added = 0
+        with self.connection:
+            for record in records:
+                text = json.dumps(record)
+                if self.connection.execute("SELECT 1 FROM results WHERE run_id = ? AND record = ?",
+                                           (record["run_id"], text)).fetchone():
+                    continue
+                gpu = record["gpu"]
+                parameters = parameters_key(record["parameters"])
+                cursor = self.connection.execute(
+                    "INSERT INTO results (run_id, timestamp, host, gpu_index, gpu_model, gpu_uuid, driver, test, "
+                    "parameters, verdict, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record["run_id"], record["timestamp"], record["host"], gpu["index"], gpu["model"], gpu["uuid"],
+                     record["driver"], record["test"], parameters, record["verdict"], text))
+                self.connection.executemany(
+                    "INSERT INTO metrics (result_id, test, gpu_model, parameters, name, value) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, record["test"], gpu["model"], parameters, name, value)
+                     for name, value in record["metrics"].items() if isinstance(value, (int, float))])
+                added += 1
+        return added
+
+    def latest(self, test, metric, model=None):
+        # Most recent value of `metric` per (host, GPU, model, parameters):
+        # [{"host", "gpu_index", "gpu_uuid", "gpu_model", "parameters", "timestamp", "value"}]
+        query = """
+            SELECT r.host, r.gpu_index, r.gpu_uuid, m.gpu_model, m.parameters, r.timestamp, m.value
+            FROM metrics m JOIN results r ON r.id = m.result_id
+            WHERE m.test = ? AND m.name = ? AND m.value IS NOT NULL {model}
+            ORDER BY r.timestamp, r.id
+        """.format(model="AND m.gpu_model = ?" if model else "")
+        latest = {}
+        for row in self.connection.execute(query, (test, metric, model) if model else (test, metric)):
+            entry = dict(zip(["host", "gpu_index", "gpu_uuid", "gpu_model", "parameters", "timestamp", "value"], row))
+            latest[(entry["host"], entry["gpu_uuid"] or entry["gpu_index"], entry["gpu_model"], entry["parameters"])] = entry
+        return list(latest.values())
+
+    def records(self, test=None):
+        query = "SELECT record FROM results" + (" WHERE test = ?" if test else "") + " ORDER BY id"
+        return [json.loads(row[0]) for row in self.connection.execute(query, (test,) if test else ())]
+
+
+def robust_sigma(values, center):
+    return MAD_TO_SIGMA * statistics.median(abs(value - center) for value in values)
+
+
+def outliers(entries, sigmas=3.0, min_group=3):
+    # Entries more than `sigmas` robust standard deviations from the median of their (model, parameters) group.
+    # The spread is estimated from the median absolute deviation so the outliers themselves do not inflate it.
+    groups = {}
+    for entry in entries:
+        groups.setdefault((entry["gpu_model"], entry["parameters"]), []).append(entry)
+    flagged = []
+    for (model, parameters), group in sorted(groups.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+        if len(group) < min_group:
+            continue
+        values = [entry["value"] for entry in group]
+        median = statistics.median(values)
+        sigma = robust_sigma(values, median)
+        for entry in group:
+            deviation = (entry["value"] - median) / sigma if sigma else 0.0
+            if abs(deviation) > sigmas:
+                flagged.append(dict(entry, fleet_median=median, fleet_size=len(group), sigmas=deviation))
+    return sorted(flagged, key=lambda entry: entry["sigmas"])
+
+
+def format_outliers(flagged, metric):
+    header = f"{'host':<20} {'gpu':>4} {'model':<28} {metric:>14} {'fleet median':>14} {'sigmas':>7} {'n':>4}"
+    lines = [header, "-" * len(header)]
+    for entry in flagged:
+        gpu_index = entry["gpu_index"] if entry["gpu_index"] is not None else "-"
+        lines.append(f"{entry['host']:<20} {gpu_index:>4} {str(entry['gpu_model']):<28} {entry['value']:>14.4g} "
+                     f"{entry['fleet_median']:>14.4g} {entry['sigmas']:>7.1f} {entry['fleet_size']:>4}")
+    return lines
+
+
+def default_jsonl_path():
+    return f"{socket.gethostname()}_results.jsonl"
+
+
+def import_jsonl(db_path, paths):
+    # Adds JSONL result files (e.g. collected from many nodes) to the baseline store; returns the number of records
+    # read and of those added, which leaves out records already in the store
+    read, added = 0, 0
+    with BaselineStore(db_path) as store:
+        for path in paths:
+            records = read_jsonl(path)
+            added += store.add(records)
+            read += len(records)
+    return read, added
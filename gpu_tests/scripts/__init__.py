@@ -0,0 +1,9 @@
+import os
+
+# The test scripts live in their own directories so they can still be run directly. This package makes them
+# importable as gpu_tests.scripts.<script name> (e.g. importlib.import_module("gpu_tests.scripts.multiple-gpu")),
+# which the command line interface uses and which lets spawned worker processes unpickle their entry points.
+SCRIPT_DIRS = ["torch-stress-test", "torch-largetensor-matrix"]
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+__path__ = [os.path.join(_ROOT, directory) for directory in SCRIPT_DIRS]
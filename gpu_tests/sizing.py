@@ -0,0 +1,49 @@
+import torch
+
+from gpu_tests import devices
+
+DEFAULT_FILL = 0.9  # fraction of total device memory the test should occupy
+ALIGN = 64  # keep matrix sizes a multiple of the GEMM tile size
+
+
+def element_size(dtype):
+    return torch.empty((), dtype=dtype).element_size()
+
+
+def memory_info(device):
+    # (free, total) bytes; the fake CPU device reports its nominal size as entirely free
+    if device.type == "cuda":
+        return torch.cuda.mem_get_info(device)
+    return devices.FAKE_DEVICE_MEMORY, devices.FAKE_DEVICE_MEMORY
+
+
+def align_down(size, align=ALIGN):
+    return max(align, size // align * align)
+
+
+def square_size(device, dtype, buffers, fill=DEFAULT_FILL):
+    # Largest N such that `buffers` live N x N tensors of `dtype` bring the device to `fill` of its total memory.
+    # Memory already in use (CUDA context, other processes) is taken out of the budget via the free figure.
+    free, total = memory_info(device)
+    budget = free - total * (1 - fill)
+    if budget <= 0:
+        raise ValueError(f"Only {free / 1e9:.2f} GB free of {total / 1e9:.2f} GB, cannot reach {fill:.0%} fill")
+    return align_down(int((budget / (buffers * element_size(dtype))) ** 0.5))
+
+
+def allocate_with_backoff(allocate, size, device, shrink=0.9, attempts=5):
+    # Call `allocate(size)`, shrinking the size after each out-of-memory error.
+    # Returns (size, allocation); re-raises the last error once the attempts are used up.
+    for attempt in range(attempts):
+        try:
+            return size, allocate(size)
+        except torch.cuda.OutOfMemoryError:
+            if attempt == attempts - 1:
+                raise
+        # Outside the except block, so the traceback no longer keeps the failed attempt's tensors alive
+        if device.type == "cuda":
+            torch.cuda.empty_cache()
+        smaller = align_down(int(size * shrink))
+        print(f"Out of memory at size {size}, retrying with {smaller}")
+        size = smaller
+
@@ -0,0 +1,113 @@
+import datetime
+import json
+import os
+import re
+import shlex
+import socket
+import subprocess
+import sys
+
+MODES = ["srun", "array"]
+STATUS_FILE = "status.json"
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def node_gpu_count(environ=None):
+    # GPUs allocated to this job on this node: SLURM_GPUS_ON_NODE, else the length of CUDA_VISIBLE_DEVICES;
+    # None outside a job or a restricted environment, in which case every device the driver shows is used
+    environ = os.environ if environ is None else environ
+    if environ.get("SLURM_GPUS_ON_NODE", "").isdigit():
+        return int(environ["SLURM_GPUS_ON_NODE"])
+    visible = environ.get("CUDA_VISIBLE_DEVICES")
+    if visible is None:
+        return None
+    if visible.strip() in ("", "NoDevFiles"):
+        return 0
+    return len([device for device in visible.split(",") if device.strip()])
+
+
+def node_name(environ=None):
+    environ = os.environ if environ is None else environ
+    return environ.get("SLURMD_NODENAME") or socket.gethostname()
+
+
+def gpu_count(gpus_per_node):
+    # 4 from "A100:4" or "4"
+    match = re.fullmatch(r"(?:[\w.-]+:)?(\d+)", gpus_per_node)
+    if match is None:
+        raise ValueError(f"Cannot read a GPU count from --gpus-per-node {gpus_per_node}")
+    return int(match.group(1))
+
+
+def batch_script(tests, results_dir, nodes, mode="srun", account=None, partition=None, gpus_per_node=None,
+                 time_limit="01:00:00", nodelist=None, modules=(), python="python", device="cuda", duration=None):
+    # An sbatch script that runs `python -m gpu_tests slurm node` once on each of `nodes` nodes, either as one srun
+    # task per node of a single allocation or as one job array task per node; every node writes to its own
+    # subdirectory of `results_dir`. Array tasks are not pinned to distinct nodes, so two may run on one node.
+    directives = [("job-name", "gpu-tests"), ("account", account), ("partition", partition), ("time", time_limit),
+                  ("gpus-per-node", gpus_per_node), ("exclusive", ""), ("mem", "0")]
+    if mode == "array":
+        directives += [("nodes", "1"), ("array", f"0-{nodes - 1}"),
+                       ("output", os.path.join(results_dir, "slog", "%A_%a.out"))]
+    else:
+        directives += [("nodes", str(nodes)), ("ntasks-per-node", "1"), ("nodelist", nodelist),
+                       ("output", os.path.join(results_dir, "slog", "%j.out"))]
+    lines = ["#!/bin/bash -e", ""]
+    lines += [f"#SBATCH --{name:<15} {value}".rstrip() for name, value in directives if value is not None]
+    lines.append("")
+    if modules:
+        lines.append("module purge")
+        lines += [f"module load {module}" for module in modules]
+        lines.append("")
+    command = [python, "-m", "gpu_tests", "slurm", "node", "--results-dir", results_dir, "--device", device]
+    if duration is not None:
+        command += ["--duration", f"{duration:g}"]
+    command += ["--"] + list(tests)
+    lines.append(f"cd {shlex.quote(REPO_DIR)}")
+    if mode == "srun":
+        command = ["srun", "--ntasks-per-node=1"] + command
+    lines.append(shlex.join(command))
+    return "\n".join(lines) + "\n"
+
+
+def submit(script_path, sbatch="sbatch", wait=False):
+    # (job ID from the "Submitted batch job N" line of sbatch, exit code). With --wait, sbatch exits with the job's
+    # status once the job was submitted, so a non-zero code then means a failed job rather than a failed submission.
+    command = shlex.split(sbatch) + (["--wait"] if wait else []) + [script_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    sys.stdout.write(result.stdout)
+    sys.stderr.write(result.stderr)
+    match = re.search(r"Submitted batch job (\d+)", result.stdout)
+    if result.returncode != 0 and not (wait and match):
+        raise RuntimeError(f"{' '.join(command)} failed with exit code {result.returncode}")
+    return (match.group(1) if match else None), result.returncode
+
+
+def write_status(directory, tests, returncode, start_time, environ=None):
+    # What ran on this node, for checking that every node of a partition reported back
+    environ = os.environ if environ is None else environ
+    status = {
+        "node": node_name(environ),
+        "job_id": environ.get("SLURM_ARRAY_JOB_ID") or environ.get("SLURM_JOB_ID"),
+        "array_task_id": environ.get("SLURM_ARRAY_TASK_ID"),
+        "gpus": node_gpu_count(environ),
+        "tests": tests,
+        "returncode": returncode,
+        "start": start_time.isoformat(timespec="seconds"),
+        "end": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(directory, STATUS_FILE), 'w') as f:
+        json.dump(status, f, indent=2)
+    return status
+
+
+def read_statuses(results_dir):
+    # {node: status} of the nodes that finished
+    statuses = {}
+    for name in sorted(os.listdir(results_dir)):
+        path = os.path.join(results_dir, name, STATUS_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                statuses[name] = json.load(f)
+    return statuses
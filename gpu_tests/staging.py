@@ -0,0 +1,162 @@
+import contextlib
+import mmap
+import os
+import queue
+import threading
+import time
+
+import torch
+
+# pread: chunks are read from the file straight into pinned host buffers
+# mmap:  the file is memory mapped and each chunk is copied from the mapping into a pinned host buffer
+READERS = ["pread", "mmap"]
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+DEFAULT_NUM_BUFFERS = 3
+
+
+class StagingPipeline:
+    # Streams a file into device memory: read -> pinned host buffer -> async H2D copy on a side stream.
+    # `num_buffers` host/device buffer pairs are cycled (2 = double, 3 = triple buffering) so reading chunk i+1
+    # overlaps the copy of chunk i, and both overlap whatever the caller runs on the default stream.
+    # On a fake CPU device the buffers are ordinary memory and the copies synchronous, so only the pipelining
+    # and the accounting are exercised.
+
+    def __init__(self, path, device, chunk_size=DEFAULT_CHUNK_SIZE, num_buffers=DEFAULT_NUM_BUFFERS, reader="pread"):
+        if reader not in READERS:
+            raise ValueError(f"Unknown reader: {reader}")
+        self.path = path
+        self.device = device
+        self.is_cuda = device.type == "cuda"
+        self.file_size = os.path.getsize(path)
+        if self.file_size == 0:
+            # Nothing to stage, and zero-sized chunks would never advance through the file
+            raise ValueError(f"Cannot stage an empty file: {path}")
+        self.chunk_size = min(chunk_size, self.file_size)
+        self.reader = reader
+        self.host = [torch.empty(self.chunk_size, dtype=torch.uint8, pin_memory=self.is_cuda) for _ in range(num_buffers)]
+        self.device_buffers = [torch.empty(self.chunk_size, dtype=torch.uint8, device=device) for _ in range(num_buffers)]
+        self.stream = torch.cuda.Stream(device) if self.is_cuda else None
+        self.events = [(torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True))
+                       for _ in range(num_buffers)] if self.is_cuda else None
+
+    def _read_stage(self, free, filled, busy):
+        fd = os.open(self.path, os.O_RDONLY)
+        mapping = mmap.mmap(fd, 0, access=mmap.ACCESS_COPY) if self.reader == "mmap" else None
+        try:
+            # Start from a cold page cache so reads come from storage
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            for offset in range(0, self.file_size, self.chunk_size):
+                size = min(self.chunk_size, self.file_size - offset)
+                slot = free.get()
+                if slot is None:
+                    # The copy stage failed
+                    break
+                start = time.perf_counter_ns()
+                if mapping is not None:
+                    self.host[slot][:size].copy_(torch.frombuffer(mapping, dtype=torch.uint8, count=size, offset=offset))
+                else:
+                    os.preadv(fd, [self.host[slot][:size].numpy()], offset)
+                busy["read"] += (time.perf_counter_ns() - start) / 1e9
+                filled.put((slot, size))
+        finally:
+            filled.put(None)
+            if mapping is not None:
+                mapping.close()
+            os.close(fd)
+
+    def _copy_stage(self, free, filled, busy):
+        stream = torch.cuda.stream(self.stream) if self.is_cuda else contextlib.nullcontext()
+        while (item := filled.get()) is not None:
+            slot, size = item
+            if self.is_cuda:
+                start, end = self.events[slot]
+                with stream:
+                    start.record(self.stream)
+                    self.device_buffers[slot][:size].copy_(self.host[slot][:size], non_blocking=True)
+                    end.record(self.stream)
+                # The host buffer can only be refilled once its copy has finished
+                end.synchronize()
+                busy["h2d"] += start.elapsed_time(end) / 1e3
+            else:
+                start = time.perf_counter_ns()
+                self.device_buffers[slot][:size].copy_(self.host[slot][:size])
+                busy["h2d"] += (time.perf_counter_ns() - start) / 1e9
+            busy["bytes"] += size
+            busy["chunks"] += 1
+            free.put(slot)
+
+    def _stage(self, target, errors, free, filled, busy):
+        # Runs one stage on its thread. If it fails, the error is kept for run() to raise and the other stage,
+        # which may be waiting for a free or a filled buffer, is stopped with a None.
+        try:
+            target(free, filled, busy)
+        except BaseException as e:
+            errors.append(e)
+            free.put(None)
+            filled.put(None)
+
+    def run(self, compute=None):
+        # Ingest the whole file while calling `compute()` repeatedly on this thread until ingest finishes.
+        # Returns throughput and, per stage, busy time and utilisation (busy / wall time).
+        free = queue.Queue()
+        filled = queue.Queue()
+        for slot in range(len(self.host)):
+            free.put(slot)
+        busy = {"read": 0.0, "h2d": 0.0, "compute": 0.0, "bytes": 0, "chunks": 0}
+        errors = []
+        threads = [threading.Thread(target=self._stage, args=(stage, errors, free, filled, busy))
+                   for stage in [self._read_stage, self._copy_stage]]
+
+        start = time.perf_counter_ns()
+        for thread in threads:
+            thread.start()
+        while compute is not None and threads[1].is_alive():
+            compute_start = time.perf_counter_ns()
+            compute()
+            # Only the stream compute runs on: a device-wide sync would also wait for the copies on the side
+            # stream and count them as compute time
+            if self.is_cuda:
+                torch.cuda.current_stream(self.device).synchronize()
+            busy["compute"] += (time.perf_counter_ns() - compute_start) / 1e9
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        ingest_time = (time.perf_counter_ns() - start) / 1e9
+        return summarize_pipeline(busy, ingest_time)
+
+
+def overlap_efficiency(stage_times, wall_time):
+    # 1.0 when the wall time equals the slowest stage (perfect overlap), 0.0 when it equals the sum of all
+    # stages (fully serial)
+    serial = sum(stage_times)
+    ideal = max(stage_times)
+    if serial <= ideal:
+        return 1.0
+    return min(1.0, max(0.0, (serial - wall_time) / (serial - ideal)))
+
+
+def summarize_pipeline(busy, wall_time):
+    stages = {stage: busy[stage] for stage in ["read", "h2d", "compute"] if busy[stage] > 0}
+    return {
+        "bytes": busy["bytes"],
+        "chunks": busy["chunks"],
+        "wall_seconds": wall_time,
+        "ingest_gbps": busy["bytes"] / wall_time / 1e9,
+        "stages": {stage: {"busy_seconds": seconds, "utilisation": seconds / wall_time,
+                           "gbps": busy["bytes"] / seconds / 1e9 if stage != "compute" else None}
+                   for stage, seconds in stages.items()},
+        "overlap_efficiency": overlap_efficiency(list(stages.values()), wall_time),
+    }
+
+
+def format_pipeline(result):
+    lines = [f"Ingested {result['bytes'] / 1e9:.2f} GB in {result['chunks']} chunks, "
+             f"{result['wall_seconds']:.2f}s: {result['ingest_gbps']:.2f} GB/s end to end",
+             f"{'stage':<8} {'busy (s)':>9} {'utilisation':>12} {'GB/s':>8}"]
+    for stage, stats in result["stages"].items():
+        gbps = f"{stats['gbps']:>8.2f}" if stats["gbps"] is not None else f"{'-':>8}"
+        lines.append(f"{stage:<8} {stats['busy_seconds']:>9.2f} {stats['utilisation']:>11.0%} {gbps}")
+    lines.append(f"Overlap efficiency: {result['overlap_efficiency']:.0%}")
+    return lines
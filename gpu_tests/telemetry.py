@@ -0,0 +1,195 @@
+import collections
+import subprocess
+import threading
+import time
+
+from gpu_tests import profiling
+
+# Fields queried from nvidia-smi, in the order they appear on each output line
+QUERY_FIELDS = [
+    ("gpu_index", "index"),
+    ("memory_total", "memory.total"),
+    ("memory_used", "memory.used"),
+    ("temperature", "temperature.gpu"),
+    ("power", "power.draw"),
+    ("sm_clock", "clocks.sm"),
+    ("mem_clock", "clocks.mem"),
+]
+
+Sample = collections.namedtuple("Sample", ["timestamp"] + [name for name, _ in QUERY_FIELDS])
+
+
+def parse_value(text):
+    text = text.strip()
+    try:
+        value = float(text)
+    except ValueError:
+        # "[N/A]", "[Not Supported]", etc.
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def parse_line(line, timestamp):
+    values = line.split(',')
+    if len(values) != len(QUERY_FIELDS):
+        return None
+    sample = Sample(timestamp, *(parse_value(v) for v in values))
+    if sample.gpu_index is None:
+        return None
+    return sample
+
+
+class NvidiaSmiBackend:
+    # One long-lived `nvidia-smi --loop-ms` process streaming a line per GPU per interval. `gpus` maps CUDA indices
+    # to nvidia-smi UUIDs (see devices.nvidia_smi_uuid) and samples are keyed by the CUDA index; without it all GPUs
+    # are sampled and keyed by the nvidia-smi index.
+
+    def __init__(self, interval_ms=500, gpus=None):
+        self.interval_ms = interval_ms
+        self.gpus = gpus
+        self.process = None
+
+    def command(self):
+        fields = ",".join(["uuid"] + [query for _, query in QUERY_FIELDS])
+        command = ["nvidia-smi", f"--query-gpu={fields}", "--format=csv,noheader,nounits", f"--loop-ms={self.interval_ms}"]
+        if self.gpus is not None:
+            command.append("--id=" + ",".join(self.gpus.values()))
+        return command
+
+    def samples(self):
+        cuda_indices = {uuid: gpu_index for gpu_index, uuid in (self.gpus or {}).items()}
+        self.process = subprocess.Popen(self.command(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, bufsize=1)
+        for line in self.process.stdout:
+            uuid, _, fields = line.partition(",")
+            sample = parse_line(fields, time.monotonic())
+            if sample is None:
+                continue
+            if self.gpus is not None:
+                if uuid.strip() not in cuda_indices:
+                    continue
+                sample = sample._replace(gpu_index=cuda_indices[uuid.strip()])
+            yield sample
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class FakeBackend:
+    # Synthetic telemetry for machines without GPUs; `generator(gpu_index, tick)` returns a dict of fields
+
+    def __init__(self, gpus=(0,), interval_ms=100, generator=None):
+        self.gpus = list(gpus)
+        self.interval_ms = interval_ms
+        self.generator = generator or self.default_generator
+        self.stopped = threading.Event()
+
+    @staticmethod
+    def default_generator(gpu_index, tick):
+        return dict(memory_total=256, memory_used=min(256, 16 * (tick + 1)), temperature=30 + min(tick, 50),
+                    power=60.0 + min(tick, 50), sm_clock=1410, mem_clock=1593)
+
+    def samples(self):
+        tick = 0
+        while not self.stopped.is_set():
+            now = time.monotonic()
+            for gpu_index in self.gpus:
+                yield Sample(timestamp=now, gpu_index=gpu_index, **self.generator(gpu_index, tick))
+            tick += 1
+            self.stopped.wait(self.interval_ms / 1000)
+
+    def close(self):
+        self.stopped.set()
+
+
+class TelemetrySampler:
+    # Collects samples from a backend on a background thread into a per-GPU ring buffer
+
+    def __init__(self, backend=None, capacity=4096):
+        self.backend = backend or NvidiaSmiBackend()
+        self.capacity = capacity
+        self.buffers = collections.defaultdict(lambda: collections.deque(maxlen=self.capacity))
+        self.lock = threading.Lock()
+        self.updated = threading.Condition(self.lock)
+        self.finished = False
+        self.thread = None
+        self.error = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.backend.close()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        try:
+            for sample in self.backend.samples():
+                # Under --profile, shows on the sampler's own thread how long samples wait for the lock
+                with profiling.region("telemetry sample"), self.updated:
+                    self.buffers[sample.gpu_index].append(sample)
+                    self.updated.notify_all()
+        except Exception as e:
+            self.error = e
+            print(f"Telemetry sampler stopped: {e}")
+        finally:
+            with self.updated:
+                self.finished = True
+                self.updated.notify_all()
+
+    def wait_ready(self, gpu_index=None, timeout=10):
+        # Block until the first sample (for `gpu_index`, or any GPU) has arrived
+        def ready():
+            if gpu_index is None:
+                return bool(self.buffers) or self.finished
+            return bool(self.buffers.get(gpu_index)) or self.finished
+        with self.updated:
+            return self.updated.wait_for(ready, timeout)
+
+    def window(self, gpu_index, since=None):
+        with self.lock:
+            samples = list(self.buffers.get(gpu_index, ()))
+        if since is not None:
+            samples = [s for s in samples if s.timestamp >= since]
+        return samples
+
+    def values(self, gpu_index, field, since=None):
+        return [getattr(s, field) for s in self.window(gpu_index, since) if getattr(s, field) is not None]
+
+    def latest(self, gpu_index):
+        with self.lock:
+            buffer = self.buffers.get(gpu_index)
+            return buffer[-1] if buffer else None
+
+    def memory_total(self, gpu_index):
+        # Total memory in MiB from the latest sample; None if no sample has arrived (e.g. nvidia-smi failed)
+        sample = self.latest(gpu_index)
+        return sample.memory_total if sample is not None else None
+
+    def peak(self, gpu_index, field, since=None):
+        values = self.values(gpu_index, field, since)
+        return max(values) if values else None
+
+    def mean(self, gpu_index, field, since=None):
+        values = self.values(gpu_index, field, since)
+        return sum(values) / len(values) if values else None
+
+    def summary(self, gpu_index, since=None):
+        fields = [name for name, _ in QUERY_FIELDS if name not in ("gpu_index", "memory_total")]
+        return {field: {"peak": self.peak(gpu_index, field, since), "mean": self.mean(gpu_index, field, since)}
+                for field in fields}
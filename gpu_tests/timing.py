@@ -0,0 +1,74 @@
+import time
+
+import torch
+
+
+class KernelTimer:
+    # Times consecutive named sections of one iteration.
+    # On CUDA devices the sections are bracketed by events on the current stream, so the times are device-side
+    # and exclude launch gaps caused by host work; elsewhere perf_counter_ns is used.
+
+    def __init__(self, device):
+        self.device = device
+        self.use_events = device.type == "cuda"
+        self.events = {}
+        self.names = []
+        self.marks = []
+
+    def _event(self, name):
+        # Events are reused across iterations so the timer itself allocates nothing in steady state
+        if name not in self.events:
+            self.events[name] = torch.cuda.Event(enable_timing=True)
+        return self.events[name]
+
+    def _record(self, name):
+        if self.use_events:
+            event = self._event(name)
+            event.record(torch.cuda.current_stream(self.device))
+            self.marks.append(event)
+        else:
+            self.marks.append(time.perf_counter_ns())
+
+    def start(self):
+        self.names = []
+        self.marks = []
+        self._record(None)
+
+    def mark(self, name):
+        # Ends the section that started at the previous mark
+        self.names.append(name)
+        self._record(name)
+
+    def elapsed(self):
+        # Returns {section name: seconds}; waits for the device to reach the last mark
+        if self.use_events:
+            self.marks[-1].synchronize()
+            times = [start.elapsed_time(end) / 1e3 for start, end in zip(self.marks, self.marks[1:])]
+        else:
+            times = [(end - start) / 1e9 for start, end in zip(self.marks, self.marks[1:])]
+        return dict(zip(self.names, times))
+
+
+def percentile(values, q):
+    # Linear interpolation between closest ranks, q in [0, 100]
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "min": min(values),
+        "p5": percentile(values, 5),
+        "median": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values),
+    }
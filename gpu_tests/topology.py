@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+import time
+
+from gpu_tests import profiling
+from gpu_tests.slurm import node_name
+
+# Approximate achievable unidirectional GB/s for a GPU pair by `nvidia-smi topo -m` link type.
+# NV# links scale with the number of bonded NVLinks.
+NVLINK_GBPS_PER_LINK = 25.0
+LINK_BANDWIDTH_GBPS = {
+    "PIX": 25.0,
+    "PXB": 25.0,
+    "PHB": 20.0,
+    "NODE": 20.0,
+    "SYS": 12.0,
+}
+
+# Link types from closest to farthest; NV# sorts first whatever its count
+LINK_ORDER = ["NV", "PIX", "PXB", "PHB", "NODE", "SYS"]
+# Link types whose traffic passes through a CPU's host bridge, and the one that crosses between sockets
+HOST_BRIDGE_LINKS = {"PHB", "NODE", "SYS"}
+
+# Columns that follow the device columns in the header of `nvidia-smi topo -m`, depending on the driver version
+AFFINITY_COLUMNS = ["CPU Affinity", "NUMA Affinity", "GPU NUMA ID"]
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+DEVICE = re.compile(r"(GPU|NIC)(\d+)|mlx\d+_\d+")
+
+CACHE_ENV = "GPU_TESTS_CACHE"
+BOOT_ID = "/proc/sys/kernel/random/boot_id"
+
+
+def run_topology():
+    with profiling.region("nvidia-smi topo"):
+        result = subprocess.run(['nvidia-smi', 'topo', '-m'], capture_output=True, text=True)
+    return result.stdout
+
+
+def run_nvidia_smi_topo(log_file, interval=60, stop_event=None):
+    # Appends a timestamped `nvidia-smi topo -m` snapshot to `log_file` every `interval` seconds until stopped,
+    # and warns when a GPU link changes type during the run (e.g. an NVLink dropping out of a bonded set)
+    previous = None
+    while not stop_event.is_set():
+        try:
+            with profiling.region("nvidia-smi topo"):
+                result = subprocess.run(['nvidia-smi', 'topo', '-m'], capture_output=True, text=True)
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            with open(log_file, 'a') as f:
+                f.write(f"\n\n--- Topology at {timestamp} ---\n")
+                f.write(result.stdout)
+            links = parse_link_matrix(result.stdout)
+            if previous is not None:
+                for (src, dst), link in sorted(links.items()):
+                    if previous.get((src, dst)) != link:
+                        print(f"Warning: link GPU {src} -> GPU {dst} changed from {previous.get((src, dst))} to {link} at {timestamp}")
+            previous = links
+            stop_event.wait(interval)
+        except Exception as e:
+            print(f"Error running nvidia-smi: {e}")
+            break
+
+
+def expected_bandwidth(link):
+    # Expected GB/s for a link type, or None if unknown
+    match = re.fullmatch(r"NV(\d+)", link)
+    if match:
+        return NVLINK_GBPS_PER_LINK * int(match.group(1))
+    return LINK_BANDWIDTH_GBPS.get(link)
+
+
+def link_rank(link):
+    # Position in LINK_ORDER, so that smaller is closer; unknown link types sort last
+    kind = "NV" if re.fullmatch(r"NV\d+", link or "") else link
+    return LINK_ORDER.index(kind) if kind in LINK_ORDER else len(LINK_ORDER)
+
+
+def parse_cpu_list(text):
+    # "0-3,8-11" -> [0, 1, 2, 3, 8, 9, 10, 11]; [] for N/A
+    cpus = []
+    for part in (text or "").split(","):
+        match = re.fullmatch(r"(\d+)(?:-(\d+))?", part.strip())
+        if match:
+            cpus += range(int(match.group(1)), int(match.group(2) or match.group(1)) + 1)
+    return cpus
+
+
+class Topology:
+    # The GPUs and NICs of a node as a graph: the link type between every two devices, plus the CPU and NUMA
+    # affinity of each GPU. Devices are named as in `nvidia-smi topo -m` ("GPU0", "NIC1"); the GPU methods take
+    # GPU indices.
+
+    def __init__(self, devices, links, affinity=None, nic_names=None):
+        self.devices = list(devices)
+        self.links = dict(links)  # {(device, device): link type}, both directions
+        self.affinity = affinity or {}  # {device: {"CPU Affinity": ..., "NUMA Affinity": ..., "GPU NUMA ID": ...}}
+        self.nic_names = nic_names or {}  # {"NIC0": "mlx5_0"}
+
+    @property
+    def gpus(self):
+        return [int(device[3:]) for device in self.devices if device.startswith("GPU")]
+
+    @property
+    def nics(self):
+        return [device for device in self.devices if not device.startswith("GPU")]
+
+    def link(self, src, dst):
+        return self.links.get((f"GPU{src}", f"GPU{dst}"))
+
+    def gpu_links(self):
+        # {(src_gpu, dst_gpu): link type}, the form returned by parse_link_matrix
+        return {(src, dst): self.link(src, dst) for src in self.gpus for dst in self.gpus
+                if src != dst and self.link(src, dst) is not None}
+
+    def nvlink_count(self, src, dst):
+        match = re.fullmatch(r"NV(\d+)", self.link(src, dst) or "")
+        return int(match.group(1)) if match else 0
+
+    def cpu_affinity(self, gpu):
+        return parse_cpu_list(self.affinity.get(f"GPU{gpu}", {}).get("CPU Affinity"))
+
+    def numa_node(self, gpu):
+        value = self.affinity.get(f"GPU{gpu}", {}).get("NUMA Affinity", "")
+        return int(value) if value.isdigit() else None
+
+    def nearest_nics(self, gpu):
+        # NICs (by interface name where known) on the closest path to the GPU, e.g. for GPUDirect RDMA
+        links = {nic: self.links.get((f"GPU{gpu}", nic)) for nic in self.nics}
+        links = {nic: link for nic, link in links.items() if link}
+        if not links:
+            return []
+        best = min(link_rank(link) for link in links.values())
+        return [self.nic_names.get(nic, nic) for nic, link in links.items() if link_rank(link) == best]
+
+    def expected_bandwidth(self, src, dst):
+        link = self.link(src, dst)
+        return expected_bandwidth(link) if link else None
+
+    def expectations(self, gpus=None):
+        # {(src, dst): expected GB/s} for the pairs whose link type has an expectation
+        gpus = self.gpus if gpus is None else gpus
+        expectations = {(src, dst): self.expected_bandwidth(src, dst) for src in gpus for dst in gpus if src != dst}
+        return {pair: value for pair, value in expectations.items() if value is not None}
+
+    def transfer_resources(self, src, dst):
+        # What a src -> dst copy occupies: its two endpoints, and for copies not over NVLink the PCIe link of each
+        # GPU, the host bridge of each socket involved and, between sockets, the inter-socket link
+        link = self.link(src, dst)
+        resources = {("send", src), ("receive", dst)}
+        if link is None or not link.startswith("NV"):
+            resources |= {("pcie-out", src), ("pcie-in", dst)}
+            if link is None or link in HOST_BRIDGE_LINKS:
+                resources |= {("host-out", self.numa_node(src)), ("host-in", self.numa_node(dst))}
+            if link is None or link == "SYS":
+                resources.add(("inter-socket", self.numa_node(src), self.numa_node(dst)))
+        return resources
+
+    def plan_rounds(self, pairs):
+        # Groups the src -> dst pairs into rounds whose copies share no resource (see transfer_resources), so each
+        # round can run concurrently without the copies slowing each other down. Pairs are placed greedily in
+        # order of their offset dst - src, which gives the n - 1 permutation rounds on a fully connected NVLink node.
+        gpus = sorted({gpu for pair in pairs for gpu in pair})
+        position = {gpu: i for i, gpu in enumerate(gpus)}
+        ordered = sorted(pairs, key=lambda pair: ((position[pair[1]] - position[pair[0]]) % len(gpus), pair))
+        rounds = []
+        for pair in ordered:
+            resources = self.transfer_resources(*pair)
+            for planned in rounds:
+                if not planned["resources"] & resources:
+                    planned["pairs"].append(pair)
+                    planned["resources"] |= resources
+                    break
+            else:
+                rounds.append({"pairs": [pair], "resources": set(resources)})
+        return [planned["pairs"] for planned in rounds]
+
+    def to_dict(self):
+        return {"devices": self.devices, "links": [[a, b, link] for (a, b), link in sorted(self.links.items())],
+                "affinity": self.affinity, "nic_names": self.nic_names}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["devices"], {(a, b): link for a, b, link in data["links"]}, data["affinity"],
+                   data["nic_names"])
+
+
+def parse_topology(text):
+    # Topology from the text of `nvidia-smi topo -m`, tab or space separated; None if there is no matrix in it
+    devices = None
+    affinity_columns = []
+    links = {}
+    affinity = {}
+    nic_names = {}
+    for line in text.splitlines():
+        line = ANSI_ESCAPE.sub("", line).rstrip()
+        if devices is None:
+            # The header row is indented and starts with the GPU0 column
+            if line[:1].isspace() and line.split()[:1] == ["GPU0"]:
+                devices = [token for token in line.split() if DEVICE.fullmatch(token)]
+                affinity_columns = [name for name in AFFINITY_COLUMNS if name in line]
+            continue
+        legend = re.match(r"\s+(NIC\d+):\s+(\S+)$", line)
+        if legend:
+            nic_names[legend.group(1)] = legend.group(2)
+            continue
+        tokens = line.split()
+        if not tokens or tokens[0] not in devices:
+            continue
+        src = tokens[0]
+        for dst, cell in zip(devices, tokens[1:1 + len(devices)]):
+            if dst != src and cell != "X":
+                links[(src, dst)] = cell
+        if src.startswith("GPU"):
+            affinity[src] = dict(zip(affinity_columns, tokens[1 + len(devices):]))
+    if devices is None:
+        return None
+    return Topology(devices, links, affinity, nic_names)
+
+
+def parse_link_matrix(text):
+    # {(src_gpu, dst_gpu): link type} from the GPU rows of `nvidia-smi topo -m`
+    topology = parse_topology(text)
+    return topology.gpu_links() if topology is not None else {}
+
+
+def boot_id():
+    try:
+        with open(BOOT_ID) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cache_path(cache_dir=None, environ=None):
+    # One cache file per host and set of visible devices: jobs sharing a node may each see other GPUs, and the
+    # driver then shows each of them only its own
+    environ = os.environ if environ is None else environ
+    cache_dir = cache_dir or environ.get(CACHE_ENV) or os.path.join(os.path.expanduser("~"), ".cache", "gpu_tests")
+    visible = environ.get("CUDA_VISIBLE_DEVICES")
+    suffix = f"_{hashlib.sha1(visible.encode()).hexdigest()[:12]}" if visible is not None else ""
+    return os.path.join(cache_dir, f"topology_{node_name(environ)}{suffix}.json")
+
+
+def load_topology(path=None, cache_dir=None, refresh=False):
+    # Topology of this node. `path` is a recorded `nvidia-smi topo -m` output to use instead of running it.
+    # Otherwise the graph is cached per host and set of visible devices and reused until the next reboot, so the
+    # tests that need it do not each wait for nvidia-smi; None if nvidia-smi is not available.
+    if path is not None:
+        with open(path) as f:
+            return parse_topology(f.read())
+    cache_file = cache_path(cache_dir)
+    if not refresh and os.path.exists(cache_file):
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if cached["boot_id"] == boot_id():
+                return Topology.from_dict(cached["topology"])
+        except (OSError, ValueError, KeyError):
+            pass
+    try:
+        topology = parse_topology(run_topology())
+    except OSError:
+        return None
+    if topology is not None:
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, 'w') as f:
+                json.dump({"boot_id": boot_id(), "topology": topology.to_dict()}, f, indent=2)
+        except OSError:
+            pass
+    return topology
+
+
+def format_topology(topology):
+    # One line per GPU: NVLink peers, NUMA node, CPUs and nearest NICs
+    lines = []
+    for gpu in topology.gpus:
+        peers = ", ".join(f"GPU{dst} {topology.link(gpu, dst)}" for dst in topology.gpus if dst != gpu)
+        cpus = topology.affinity.get(f"GPU{gpu}", {}).get("CPU Affinity", "unknown")
+        nics = ", ".join(topology.nearest_nics(gpu)) or "none"
+        lines.append(f"GPU{gpu}: NUMA node {topology.numa_node(gpu)}, CPUs {cpus}, nearest NICs {nics}; {peers}")
+    return lines
@@ -0,0 +1,118 @@
+import math
+import statistics
+
+from gpu_tests.results import MAD_TO_SIGMA, parameters_key, robust_sigma
+
+# A result is slow when it is more than DEFAULT_SIGMAS robust standard deviations below the baseline median
+# *and* at least MIN_DROP below it, so that tight fleets do not flag differences nobody would notice
+DEFAULT_SIGMAS = 3.0
+MIN_DROP = 0.05
+# Fewest GPUs of a model a baseline is computed from
+MIN_BASELINE = 3
+
+# A shift in the iteration series counts as throttling when its score (a two-sample t statistic against the
+# series' own noise) exceeds CHANGE_POINT_THRESHOLD and throughput drops by at least MIN_DROP
+CHANGE_POINT_THRESHOLD = 5.0
+MIN_SEGMENT = 5
+# Floor of that noise as a fraction of the median, so a noiseless series (e.g. a clock-limited fake device) still
+# ranks its shifts by size rather than scoring every one of them infinite
+MIN_REL_NOISE = 1e-6
+
+
+def median_mad(values):
+    median = statistics.median(values)
+    return median, statistics.median(abs(value - median) for value in values)
+
+
+def noise_sigma(values):
+    # Iteration-to-iteration noise from the MAD of first differences, which a level shift barely affects
+    differences = [b - a for a, b in zip(values, values[1:])]
+    if not differences:
+        return 0.0
+    _, mad = median_mad(differences)
+    return MAD_TO_SIGMA * mad / math.sqrt(2)
+
+
+def change_point(values, min_segment=MIN_SEGMENT):
+    # Most significant single shift in the mean of `values`:
+    # {"index": first iteration after the shift, "score", "before": median, "after": median}, or None
+    n = len(values)
+    if n < 2 * min_segment:
+        return None
+    noise = max(noise_sigma(values), MIN_REL_NOISE * abs(statistics.median(values)))
+    prefix = [0.0]
+    for value in values:
+        prefix.append(prefix[-1] + value)
+    best_score, best_index = -1.0, None
+    for k in range(min_segment, n - min_segment + 1):
+        shift = abs((prefix[n] - prefix[k]) / (n - k) - prefix[k] / k)
+        if noise:
+            score = shift / (noise * math.sqrt(1 / k + 1 / (n - k)))
+        else:
+            score = math.inf if shift else 0.0
+        if score > best_score:
+            best_score, best_index = score, k
+    return {"index": best_index, "score": best_score, "before": statistics.median(values[:best_index]),
+            "after": statistics.median(values[best_index:])}
+
+
+def throttling(values, times=None, threshold=CHANGE_POINT_THRESHOLD, min_drop=MIN_DROP):
+    # {"onset_iteration", "onset_s", "severity": median fractional loss after the shift, "worst": largest loss over
+    # MIN_SEGMENT iterations, "score"} if the series steps down, else None
+    shift = change_point(values)
+    if shift is None or shift["score"] < threshold or shift["before"] <= 0:
+        return None
+    severity = 1 - shift["after"] / shift["before"]
+    if severity < min_drop:
+        return None
+    # The split point of a gradual ramp lies in its middle; the onset is the first iteration from which the series
+    # stays below the earlier level by more than its noise (or half the minimum drop)
+    level = shift["before"] - max(shift["before"] * min_drop / 2, 3 * noise_sigma(values))
+    onset = next((i for i in range(shift["index"] + 1)
+                  if values[i] < level and statistics.median(values[i:i + MIN_SEGMENT]) < level), shift["index"])
+    worst = min(statistics.median(values[i:i + MIN_SEGMENT]) for i in range(onset, len(values) - MIN_SEGMENT + 1))
+    return {"onset_iteration": onset, "onset_s": times[onset] if times else None,
+            "severity": severity, "worst": 1 - worst / shift["before"], "score": shift["score"]}
+
+
+def baseline(store, test, metric, model, parameters, exclude_host=None, min_count=MIN_BASELINE):
+    # {"median", "sigma", "count"} of the latest `metric` of every other GPU of `model` run with the same parameters
+    key = parameters_key(parameters)
+    values = [entry["value"] for entry in store.latest(test, metric, model)
+              if entry["parameters"] == key and entry["host"] != exclude_host]
+    if len(values) < min_count:
+        return None
+    median = statistics.median(values)
+    return {"median": median, "sigma": robust_sigma(values, median), "count": len(values)}
+
+
+def compare_to_baseline(value, reference, sigmas=DEFAULT_SIGMAS, min_drop=MIN_DROP):
+    # (deviation in robust sigmas, fractional drop, is it slow); only results below the baseline count against a GPU
+    drop = 1 - value / reference["median"] if reference["median"] else 0.0
+    if reference["sigma"]:
+        deviation = (value - reference["median"]) / reference["sigma"]
+    else:
+        deviation = -math.inf if value < reference["median"] else 0.0
+    return deviation, drop, deviation < -sigmas and drop >= min_drop
+
+
+def performance_verdict(values, times=None, reference=None, unit="FLOPS", sigmas=DEFAULT_SIGMAS, min_drop=MIN_DROP):
+    # PASS/FAIL for a per-iteration throughput series, with the reasons for a FAIL.
+    # Checked against the per-model baseline when there is one, and always against its own start for throttling.
+    verdict = {"verdict": "PASS", "reasons": [], "median": statistics.median(values), "baseline": reference,
+               "deviation_sigmas": None, "throttling": throttling(values, times, min_drop=min_drop)}
+    if reference is not None:
+        deviation, drop, slow = compare_to_baseline(verdict["median"], reference, sigmas, min_drop)
+        verdict["deviation_sigmas"] = deviation
+        if slow:
+            verdict["reasons"].append(f"median {verdict['median']:.3g} {unit} is {drop:.0%} below the baseline "
+                                      f"{reference['median']:.3g} {unit} of {reference['count']} GPUs "
+                                      f"({deviation:.1f} sigma)")
+    if verdict["throttling"] is not None:
+        onset = verdict["throttling"]
+        when = f"{onset['onset_s']:.0f}s" if onset["onset_s"] is not None else f"iteration {onset['onset_iteration']}"
+        verdict["reasons"].append(f"throughput dropped {onset['severity']:.0%} (worst {onset['worst']:.0%}) "
+                                  f"from {when} on (throttling)")
+    if verdict["reasons"]:
+        verdict["verdict"] = "FAIL"
+    return verdict
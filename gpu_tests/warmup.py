@@ -0,0 +1,162 @@
+import time
+
+from gpu_tests.telemetry import TelemetrySampler
+
+# A GPU counts as warmed up once none of these telemetry fields drifts faster than the given fraction of its
+# mean per minute, fitted over the last `window` seconds. Fields a GPU does not report are ignored.
+STEADY_TOLERANCES = {"sm_clock": 0.01, "power": 0.02, "temperature": 0.02}
+DEFAULT_WINDOW = 30  # seconds
+DEFAULT_TIMEOUT = 300  # seconds
+MIN_WINDOW_SAMPLES = 5
+
+LOADS = ["gemm", "copy"]
+
+
+def slope(times, values):
+    # Least squares slope of values over times, per second; None if the times do not spread
+    n = len(times)
+    if n < 2:
+        return None
+    mean_t = sum(times) / n
+    mean_v = sum(values) / n
+    variance = sum((t - mean_t) ** 2 for t in times)
+    if variance == 0:
+        return None
+    return sum((t - mean_t) * (v - mean_v) for t, v in zip(times, values)) / variance
+
+
+def drift(samples, field):
+    # Slope of `field` as a fraction of its mean per minute, or None if there are too few readings of it
+    points = [(s.timestamp, getattr(s, field)) for s in samples if getattr(s, field) is not None]
+    if len(points) < MIN_WINDOW_SAMPLES:
+        return None
+    per_second = slope([t for t, _ in points], [v for _, v in points])
+    if per_second is None:
+        return None
+    mean = sum(v for _, v in points) / len(points)
+    if mean == 0:
+        return 0.0 if per_second == 0 else float("inf")
+    return per_second * 60 / abs(mean)
+
+
+class WarmupController:
+    # Drives a load until clocks, power and temperature of every GPU have reached steady state, or until `timeout`.
+    # Benchmarks call it before measuring so that their numbers are sustained rather than boost clock performance.
+    # The sampler must already be streaming telemetry for `gpus`.
+
+    def __init__(self, sampler, gpus, tolerances=None, window=DEFAULT_WINDOW, timeout=DEFAULT_TIMEOUT,
+                 check_interval=1.0):
+        self.sampler = sampler
+        self.gpus = list(gpus)
+        self.tolerances = tolerances or STEADY_TOLERANCES
+        self.window = window
+        self.timeout = timeout
+        self.check_interval = check_interval
+
+    def drifts(self, gpu_index, since):
+        # {field: drift per minute} over the last window of load, or None until a full window has run
+        now = time.monotonic()
+        if now - since < self.window:
+            return None
+        samples = self.sampler.window(gpu_index, since=now - self.window)
+        return {field: drift(samples, field) for field in self.tolerances}
+
+    def status(self, since):
+        # ("steady" | "drifting" | "no telemetry" | None while the first window runs, {gpu: {field: drift}})
+        drifts = {gpu_index: self.drifts(gpu_index, since) for gpu_index in self.gpus}
+        if any(values is None for values in drifts.values()):
+            return None, drifts
+        measured = [(field, value) for values in drifts.values() for field, value in values.items() if value is not None]
+        if not measured:
+            return "no telemetry", drifts
+        if all(abs(value) <= self.tolerances[field] for field, value in measured):
+            return "steady", drifts
+        return "drifting", drifts
+
+    def run(self, step):
+        # Calls `step()` (one round of load on every GPU, synchronised) until steady state or timeout.
+        # Returns {"state", "seconds", "steps", "drift": {gpu: {field: drift}}, "telemetry": {gpu: {field: latest}}}.
+        start_time = time.monotonic()
+        last_check = start_time
+        state, drifts, steps = None, {}, 0
+        while True:
+            step()
+            steps += 1
+            now = time.monotonic()
+            if now - last_check < self.check_interval:
+                continue
+            last_check = now
+            state, drifts = self.status(start_time)
+            # Without telemetry the load has still run for one window, which is the best that can be done
+            if state in ("steady", "no telemetry"):
+                break
+            if now - start_time >= self.timeout:
+                state = "timeout"
+                break
+        telemetry = {}
+        for gpu_index in self.gpus:
+            sample = self.sampler.latest(gpu_index)
+            telemetry[gpu_index] = {field: getattr(sample, field) if sample else None for field in self.tolerances}
+        return {"state": state, "seconds": time.monotonic() - start_time, "steps": steps, "drift": drifts,
+                "telemetry": telemetry}
+
+
+def make_load(name, device_list, size=None):
+    # A step() running one round of the named load on every device and waiting for it: "gemm" multiplies square
+    # matrices (compute, clocks and power), "copy" copies a large buffer on the device (memory and its temperature)
+    import torch
+
+    from gpu_tests import devices
+
+    cuda = device_list[0].type == "cuda"
+    if name == "gemm":
+        size = size or (8192 if cuda else 256)
+        dtype = torch.float16 if cuda else torch.float32
+        buffers = [(torch.randn(size, size, dtype=dtype, device=device), torch.randn(size, size, dtype=dtype, device=device),
+                    torch.empty(size, size, dtype=dtype, device=device)) for device in device_list]
+        def run(a, b, c):
+            torch.matmul(a, b, out=c)
+    elif name == "copy":
+        size = size or (1024**3 if cuda else 16 * 1024**2)
+        buffers = [(torch.empty(size, dtype=torch.uint8, device=device), torch.empty(size, dtype=torch.uint8, device=device))
+                   for device in device_list]
+        def run(src, dst):
+            dst.copy_(src)
+    else:
+        raise ValueError(f"Unknown warmup load: {name}")
+
+    def step():
+        for tensors in buffers:
+            run(*tensors)
+        for device in device_list:
+            devices.synchronize(device)
+    return step
+
+
+def warm_up(backend, gpus, load="gemm", sampler=None, step=None, **options):
+    # Warms up `gpus` with the named load (or a benchmark's own `step`), with its own telemetry stream unless
+    # a running sampler is passed; `options` go to WarmupController
+    from gpu_tests import devices
+
+    step = step or make_load(load, [devices.get_device(backend, gpu_index) for gpu_index in gpus])
+    if sampler is not None:
+        return WarmupController(sampler, gpus, **options).run(step)
+    with TelemetrySampler(devices.telemetry_backend(backend, gpus)) as sampler:
+        sampler.wait_ready()
+        return WarmupController(sampler, gpus, **options).run(step)
+
+
+def format_warmup(report):
+    lines = []
+    for gpu_index, drifts in report["drift"].items():
+        values = ", ".join(f"{field} {value:+.1%}/min" for field, value in (drifts or {}).items() if value is not None)
+        latest = ", ".join(f"{field} {value}" for field, value in report["telemetry"].get(gpu_index, {}).items()
+                           if value is not None)
+        if report["state"] == "steady":
+            outcome = f"steady after {report['seconds']:.0f}s"
+        elif report["state"] == "timeout":
+            outcome = f"still drifting after {report['seconds']:.0f}s"
+        else:
+            outcome = f"loaded for {report['seconds']:.0f}s without telemetry"
+        lines.append(f"Warmup GPU {gpu_index}: {outcome}" + (f" ({values}; now {latest})" if values else ""))
+    return lines
@@ -0,0 +1,24 @@
+import os
+
+from gpu_tests.registry import TestPlugin, register
+from gpu_tests.slurm import node_name
+
+# Loaded through GPU_TESTS_PLUGINS by the SLURM tests: a test without torch or GPUs that fails on the node named
+# in FAILING_NODE_ENV, so that a job through gpu_tests.fake_slurm has a failed node to report. On the node named in
+# CRASHING_NODE_ENV the process exits at once, before the node can write its status.
+FAILING_NODE_ENV = "GPU_TESTS_FAILING_NODE"
+CRASHING_NODE_ENV = "GPU_TESTS_CRASHING_NODE"
+
+
+@register
+class NodeCheck(TestPlugin):
+    name = "nodecheck"
+    help = "Fails on the node named in GPU_TESTS_FAILING_NODE, crashes on GPU_TESTS_CRASHING_NODE (tests only)"
+    in_default_suite = False
+
+    def run(self, args):
+        print(f"nodecheck on {node_name()}")
+        if node_name() == os.environ.get(CRASHING_NODE_ENV):
+            os._exit(1)
+        if node_name() == os.environ.get(FAILING_NODE_ENV):
+            raise RuntimeError(f"{node_name()} failed on purpose")
@@ -0,0 +1,64 @@
+import os
+import time
+
+from gpu_tests import parallel
+from gpu_tests.parallel import run_parallel
+
+# Workers run in spawned processes, which import them from this module; GPU 1 misbehaves in each of them.
+# Long before BARRIER_TIMEOUT, so a worker left waiting at the start barrier fails the test.
+MAX_SECONDS = 60
+
+
+def ready_worker(gpu_index, ready):
+    ready()
+    return gpu_index * 10
+
+
+def raising_worker(gpu_index, ready):
+    if gpu_index == 1:
+        raise RuntimeError("out of memory during setup")
+    ready()
+    return gpu_index * 10
+
+
+def early_return_worker(gpu_index, ready):
+    if gpu_index == 1:
+        return "skipped"
+    ready()
+    return gpu_index * 10
+
+
+def crashing_worker(gpu_index, ready):
+    if gpu_index == 1:
+        os._exit(3)
+    ready()
+    return gpu_index * 10
+
+
+def run_timed(worker, gpus=(0, 1, 2)):
+    start_time = time.monotonic()
+    outcomes = run_parallel(worker, gpus)
+    assert time.monotonic() - start_time < min(MAX_SECONDS, parallel.BARRIER_TIMEOUT)
+    return outcomes
+
+
+def test_every_worker_returns():
+    assert run_timed(ready_worker) == {0: (0, None), 1: (10, None), 2: (20, None)}
+
+
+def test_raising_worker_does_not_block_peers():
+    outcomes = run_timed(raising_worker)
+    assert outcomes[0] == (0, None) and outcomes[2] == (20, None)
+    result, error = outcomes[1]
+    assert result is None
+    assert error == "RuntimeError: out of memory during setup"
+
+
+def test_early_return_does_not_block_peers():
+    assert run_timed(early_return_worker) == {0: (0, None), 1: ("skipped", None), 2: (20, None)}
+
+
+def test_crashing_worker_does_not_block_peers():
+    outcomes = run_timed(crashing_worker)
+    assert outcomes[0] == (0, None) and outcomes[2] == (20, None)
+    assert outcomes[1] == (None, "Worker process exited with code 3")
@@ -0,0 +1,53 @@
+from gpu_tests import results
+from gpu_tests.results import BaselineStore, ResultWriter, append_jsonl, import_jsonl, make_result
+
+
+def io_record(host, value, run_id="run1"):
+    # Like the io and collectives tests: a result for the whole node, without a GPU
+    return make_result("io", None, None, {"size_gb": 10}, {"write_gbps": value}, "PASS", run_id=run_id, host=host)
+
+
+def test_import_skips_stored_records(tmp_path):
+    jsonl = str(tmp_path / "results.jsonl")
+    db = str(tmp_path / "baseline.sqlite")
+    records = [io_record(f"node{i}", 2.0 + i) for i in range(3)]
+    append_jsonl(jsonl, records)
+    assert import_jsonl(db, [jsonl]) == (3, 3)
+    assert import_jsonl(db, [jsonl]) == (3, 0)
+    # The same file twice in one import, and a file with one new record
+    other = str(tmp_path / "other.jsonl")
+    append_jsonl(other, [io_record("node3", 9.0)])
+    assert import_jsonl(db, [jsonl, other, jsonl]) == (7, 1)
+    with BaselineStore(db) as store:
+        assert len(store.records("io")) == 4
+
+
+def test_records_of_one_run_are_all_stored(tmp_path):
+    # A sweep adds several records for one GPU in one run, differing only in parameters and metrics
+    db = str(tmp_path / "baseline.sqlite")
+    records = [make_result("perf", 0, "A100", {"dtype": dtype}, {"flops_median": 1e12}, "PASS", run_id="run1",
+                           host="node0") for dtype in ["float32", "bfloat16"]]
+    with BaselineStore(db) as store:
+        assert store.add(records) == 2
+        assert store.add(records) == 0
+
+
+def test_writer_results_are_not_imported_again(tmp_path):
+    jsonl = str(tmp_path / "results.jsonl")
+    db = str(tmp_path / "baseline.sqlite")
+    writer = ResultWriter("io", "cpu", jsonl, db)
+    writer.add(None, None, {"size_gb": 10}, {"write_gbps": 2.0}, "PASS")
+    writer.close()
+    assert import_jsonl(db, [jsonl]) == (1, 0)
+
+
+def test_outliers_without_gpu_index(tmp_path):
+    db = str(tmp_path / "baseline.sqlite")
+    with BaselineStore(db) as store:
+        store.add([io_record(f"node{i}", value) for i, value in enumerate([2.0, 2.1, 1.9, 2.0, 0.5])])
+        entries = store.latest("io", "write_gbps")
+    assert len(entries) == 5
+    flagged = results.outliers(entries)
+    assert [entry["host"] for entry in flagged] == ["node4"]
+    lines = results.format_outliers(flagged, "write_gbps")
+    assert lines[2].split()[:2] == ["node4", "-"]
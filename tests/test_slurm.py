@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+from gpu_tests import cli, slurm
+from gpu_tests.registry import PLUGIN_ENV
+
+from node_check_plugin import CRASHING_NODE_ENV, FAILING_NODE_ENV
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(params=slurm.MODES)
+def mode(request):
+    return request.param
+
+
+@pytest.fixture
+def fake_cluster(monkeypatch, tmp_path):
+    # The batch script runs `python -m gpu_tests` from the repository, which must find the nodecheck plugin
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join([TESTS_DIR, os.environ.get("PYTHONPATH", "")]))
+    monkeypatch.setenv(PLUGIN_ENV, "node_check_plugin")
+    monkeypatch.delenv(FAILING_NODE_ENV, raising=False)
+    monkeypatch.delenv(CRASHING_NODE_ENV, raising=False)
+    return tmp_path / "results"
+
+
+def submit(results_dir, mode, nodes=2):
+    return cli.main(["slurm", "submit", "nodecheck", "--nodes", str(nodes), "--results-dir", str(results_dir),
+                     "--mode", mode, "--device", "cpu", "--python", sys.executable, "--sbatch",
+                     f"{sys.executable} -m gpu_tests.fake_slurm sbatch", "--wait"])
+
+
+def test_submit_wait_passes_when_every_node_passes(fake_cluster, mode):
+    assert submit(fake_cluster, mode) == 0
+    statuses = slurm.read_statuses(fake_cluster)
+    assert sorted(statuses) == ["fake-node0", "fake-node1"]
+    assert all(status["returncode"] == 0 and status["tests"] == ["nodecheck"] for status in statuses.values())
+    assert cli.main(["slurm", "status", "--results-dir", str(fake_cluster)]) == 0
+
+
+def test_failed_node_fails_submit_and_status(fake_cluster, mode, monkeypatch, capsys):
+    monkeypatch.setenv(FAILING_NODE_ENV, "fake-node1")
+    assert submit(fake_cluster, mode) == 1
+    statuses = slurm.read_statuses(fake_cluster)
+    assert statuses["fake-node0"]["returncode"] == 0
+    assert statuses["fake-node1"]["returncode"] == 1
+    assert cli.main(["slurm", "status", "--results-dir", str(fake_cluster)]) == 1
+    assert "2 nodes finished, 1 with failed tests" in capsys.readouterr().out
+
+
+def test_node_without_status_fails_submit(fake_cluster, mode, monkeypatch, capsys):
+    monkeypatch.setenv(CRASHING_NODE_ENV, "fake-node1")
+    assert submit(fake_cluster, mode) == 1
+    assert sorted(slurm.read_statuses(fake_cluster)) == ["fake-node0"]
+    assert "1 of 2 nodes reported a status" in capsys.readouterr().out
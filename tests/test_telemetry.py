@@ -0,0 +1,86 @@
+from gpu_tests.report import missing_telemetry
+from gpu_tests.telemetry import FakeBackend, TelemetrySampler
+
+
+def finite_backend(gpus, ticks, generator=None):
+    # A FakeBackend that stops itself after `ticks` rounds of samples, so every test sees a fixed series
+    generator = generator or FakeBackend.default_generator
+
+    def stopping(gpu_index, tick):
+        if tick == ticks - 1:
+            backend.close()
+        return generator(gpu_index, tick)
+
+    backend = FakeBackend(gpus, interval_ms=1, generator=stopping)
+    return backend
+
+
+def sample_all(backend, capacity=4096):
+    sampler = TelemetrySampler(backend, capacity).start()
+    sampler.thread.join(timeout=10)
+    assert sampler.finished
+    return sampler
+
+
+def ramp(gpu_index, tick):
+    # Temperature counts the ticks; power is only reported on even ones
+    return dict(memory_total=100, memory_used=10 * tick, temperature=40 + tick,
+                power=None if tick % 2 else 100.0 + tick, sm_clock=1410, mem_clock=1593)
+
+
+def test_ring_buffer_keeps_the_latest_samples():
+    sampler = sample_all(finite_backend([0, 1], 10, ramp), capacity=4)
+    for gpu_index in [0, 1]:
+        assert [sample.temperature for sample in sampler.window(gpu_index)] == [46, 47, 48, 49]
+        assert sampler.latest(gpu_index).temperature == 49
+    assert sampler.peak(0, "temperature") == 49
+    assert sampler.mean(0, "temperature") == 47.5
+
+
+def test_peak_and_mean():
+    sampler = sample_all(finite_backend([0], 5, ramp))
+    assert sampler.peak(0, "temperature") == 44
+    assert sampler.mean(0, "temperature") == 42
+    # Fields nvidia-smi did not report are left out rather than counted as 0
+    assert sampler.values(0, "power") == [100.0, 102.0, 104.0]
+    assert sampler.mean(0, "power") == 102.0
+    assert sampler.memory_total(0) == 100
+    since = sampler.window(0)[3].timestamp
+    assert sampler.values(0, "temperature", since=since) == [43, 44]
+    assert sampler.summary(0)["memory_used"] == {"peak": 40, "mean": 20}
+
+
+def test_no_samples():
+    sampler = TelemetrySampler(FakeBackend([0]))
+    assert sampler.latest(0) is None
+    assert sampler.memory_total(0) is None
+    assert sampler.peak(0, "temperature") is None
+    assert sampler.mean(0, "power") is None
+    assert sampler.window(0) == []
+
+    # A GPU the backend does not report
+    sampler = sample_all(finite_backend([0], 3))
+    assert sampler.wait_ready(1, timeout=1)
+    assert sampler.latest(1) is None
+    assert sampler.memory_total(1) is None
+    assert sampler.peak(1, "temperature") is None
+    assert sampler.summary(1)["temperature"] == {"peak": None, "mean": None}
+
+
+def test_failed_backend():
+    def failing(gpu_index, tick):
+        raise RuntimeError("nvidia-smi is gone")
+
+    sampler = sample_all(FakeBackend([0], interval_ms=1, generator=failing))
+    assert isinstance(sampler.error, RuntimeError)
+    # Returns at once instead of waiting out the timeout
+    assert sampler.wait_ready(0, timeout=10)
+    assert sampler.peak(0, "temperature") is None
+    assert sampler.memory_total(0) is None
+
+
+def test_missing_telemetry():
+    assert missing_telemetry(80, 70, 60) is None
+    assert missing_telemetry(80, 0, 30) is None
+    assert missing_telemetry(80, None, None) == "no telemetry for peak memory, peak temperature"
+    assert missing_telemetry(None, None, None) == "no telemetry for total memory, peak memory, peak temperature"
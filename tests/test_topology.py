@@ -0,0 +1,122 @@
+import itertools
+import os
+
+import pytest
+
+from gpu_tests import topology
+from gpu_tests.topology import Topology, cache_path, load_topology, parse_topology
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def fixture_text(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+@pytest.fixture
+def dgx():
+    # 8 GPUs all connected by NV12, two compute NICs per PCIe switch and two storage NICs; GPU NUMA ID column
+    return parse_topology(fixture_text("topo_dgx_a100.txt"))
+
+
+@pytest.fixture
+def pcie():
+    # 4 GPUs on two sockets, GPU0/1 and GPU2/3 behind one switch each, one NIC named mlx5_0 by an older driver
+    return parse_topology(fixture_text("topo_pcie.txt"))
+
+
+def test_dgx_links(dgx):
+    assert dgx.gpus == list(range(8))
+    assert dgx.nics == [f"NIC{i}" for i in range(10)]
+    assert set(dgx.gpu_links().values()) == {"NV12"}
+    assert len(dgx.gpu_links()) == 8 * 7
+    assert dgx.nvlink_count(0, 7) == 12
+    assert dgx.expectations()[(3, 5)] == 12 * topology.NVLINK_GBPS_PER_LINK
+
+
+def test_dgx_affinity(dgx):
+    assert dgx.cpu_affinity(0) == list(range(48, 64)) + list(range(176, 192))
+    assert [dgx.numa_node(gpu) for gpu in dgx.gpus] == [3, 3, 1, 1, 7, 7, 5, 5]
+    assert dgx.affinity["GPU0"]["GPU NUMA ID"] == "N/A"
+
+
+def test_dgx_nearest_nics(dgx):
+    # The two NICs on each GPU's PCIe switch, by interface name from the NIC legend
+    assert dgx.nic_names["NIC9"] == "mlx5_9"
+    assert [dgx.nearest_nics(gpu) for gpu in dgx.gpus] == [
+        ["mlx5_0", "mlx5_1"], ["mlx5_0", "mlx5_1"], ["mlx5_2", "mlx5_3"], ["mlx5_2", "mlx5_3"],
+        ["mlx5_6", "mlx5_7"], ["mlx5_6", "mlx5_7"], ["mlx5_8", "mlx5_9"], ["mlx5_8", "mlx5_9"]]
+
+
+def test_dgx_plan_rounds_are_permutations(dgx):
+    pairs = list(itertools.permutations(dgx.gpus, 2))
+    rounds = dgx.plan_rounds(pairs)
+    assert len(rounds) == 7
+    assert sorted(pair for planned in rounds for pair in planned) == sorted(pairs)
+    for planned in rounds:
+        assert sorted(src for src, _ in planned) == dgx.gpus
+        assert sorted(dst for _, dst in planned) == dgx.gpus
+
+
+def test_pcie_links_and_affinity(pcie):
+    assert pcie.gpus == [0, 1, 2, 3]
+    assert pcie.nics == ["mlx5_0"]
+    assert pcie.link(0, 1) == "PIX"
+    assert pcie.link(1, 2) == "SYS"
+    assert pcie.nvlink_count(0, 1) == 0
+    assert pcie.expected_bandwidth(0, 1) == topology.LINK_BANDWIDTH_GBPS["PIX"]
+    assert pcie.expected_bandwidth(0, 2) == topology.LINK_BANDWIDTH_GBPS["SYS"]
+    assert pcie.cpu_affinity(3) == list(range(16, 32)) + list(range(48, 64))
+    assert [pcie.numa_node(gpu) for gpu in pcie.gpus] == [0, 0, 1, 1]
+
+
+def test_pcie_nearest_nics(pcie):
+    # Without a NIC legend the column name is the interface name; the far socket still reaches the only NIC
+    assert pcie.nearest_nics(0) == ["mlx5_0"]
+    assert pcie.nearest_nics(3) == ["mlx5_0"]
+
+
+def test_pcie_plan_rounds_share_no_resource(pcie):
+    pairs = list(itertools.permutations(pcie.gpus, 2))
+    rounds = pcie.plan_rounds(pairs)
+    assert sorted(pair for planned in rounds for pair in planned) == sorted(pairs)
+    for planned in rounds:
+        for a, b in itertools.combinations(planned, 2):
+            assert not pcie.transfer_resources(*a) & pcie.transfer_resources(*b)
+    # Copies within each switch run together; copies between the sockets in one direction never do
+    assert any({(0, 1), (2, 3)} <= set(planned) for planned in rounds)
+    for planned in rounds:
+        assert sum(1 for src, dst in planned if pcie.link(src, dst) == "SYS" and src < dst) <= 1
+
+
+def test_round_trip(dgx):
+    copy = Topology.from_dict(dgx.to_dict())
+    assert copy.gpu_links() == dgx.gpu_links()
+    assert copy.nearest_nics(4) == dgx.nearest_nics(4)
+
+
+def test_cache_path_depends_on_visible_devices(tmp_path):
+    environ = {"SLURMD_NODENAME": "node1"}
+    all_devices = cache_path(str(tmp_path), environ)
+    first = cache_path(str(tmp_path), dict(environ, CUDA_VISIBLE_DEVICES="0,1"))
+    second = cache_path(str(tmp_path), dict(environ, CUDA_VISIBLE_DEVICES="2,3"))
+    assert os.path.basename(all_devices) == "topology_node1.json"
+    assert len({all_devices, first, second}) == 3
+    assert first == cache_path(str(tmp_path), dict(environ, CUDA_VISIBLE_DEVICES="0,1"))
+
+
+def test_load_topology_caches_per_visible_devices(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(topology, "run_topology", lambda: calls.append(1) or fixture_text("topo_pcie.txt"))
+    monkeypatch.setenv("CUDA_VISIBLE_DEVICES", "0,1")
+    assert load_topology(cache_dir=str(tmp_path)).gpus == [0, 1, 2, 3]
+    assert load_topology(cache_dir=str(tmp_path)).link(0, 2) == "SYS"
+    assert len(calls) == 1
+    monkeypatch.setenv("CUDA_VISIBLE_DEVICES", "2,3")
+    load_topology(cache_dir=str(tmp_path))
+    assert len(calls) == 2
+
+
+def test_load_recorded_file():
+    assert load_topology(os.path.join(FIXTURES, "topo_dgx_a100.txt")).nvlink_count(2, 6) == 12
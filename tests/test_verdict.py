@@ -0,0 +1,40 @@
+from gpu_tests.verdict import change_point, performance_verdict, throttling
+
+# A clock-limited fake device gives exactly the same throughput every iteration
+STEADY = [100.0] * 20
+THROTTLED = STEADY + [80.0] * 20
+
+
+def test_noiseless_step_is_found():
+    shift = change_point(THROTTLED)
+    assert shift["index"] == 20
+    assert (shift["before"], shift["after"]) == (100.0, 80.0)
+
+
+def test_noiseless_throttling_onset():
+    times = [float(i) for i in range(len(THROTTLED))]
+    throttle = throttling(THROTTLED, times)
+    assert throttle["onset_iteration"] == 20
+    assert throttle["onset_s"] == 20.0
+    assert abs(throttle["severity"] - 0.2) < 1e-9
+    assert abs(throttle["worst"] - 0.2) < 1e-9
+
+
+def test_noiseless_flat_series_passes():
+    assert change_point(STEADY + STEADY)["score"] == 0
+    assert throttling(STEADY + STEADY) is None
+    assert performance_verdict(STEADY + STEADY)["verdict"] == "PASS"
+
+
+def test_noiseless_small_step_is_not_throttling():
+    assert throttling(STEADY + [99.0] * 20) is None
+
+
+def test_step_up_is_not_throttling():
+    assert throttling([80.0] * 20 + STEADY) is None
+
+
+def test_throttling_fails_verdict():
+    verdict = performance_verdict(THROTTLED)
+    assert verdict["verdict"] == "FAIL"
+    assert verdict["reasons"] == ["throughput dropped 20% (worst 20%) from iteration 20 on (throttling)"]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import socket
+import sys
+
+import torch
+import torch.distributed as dist
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests import devices
+from gpu_tests.collectives import (COLLECTIVES, CollectiveBenchmark, distributed_environment, format_collective_table,
+                                   init_process_group, summarize_collectives)
+from gpu_tests.h2d import MIN_SIZE, sweep_sizes
+from gpu_tests.parallel import run_parallel
+from gpu_tests.results import ResultWriter, default_jsonl_path
+from gpu_tests.slurm import node_name
+
+def run_rank(rank, world_size, local_rank, backend, collectives, max_size, warmup_iterations):
+    # Runs on every rank; returns {"report", "rows", "world_size", "nodes", "correct"} on rank 0 and None elsewhere
+    if backend == "cuda":
+        device = torch.device(f"cuda:{local_rank % torch.cuda.device_count()}")
+        torch.cuda.set_device(device)
+    else:
+        device = torch.device("cpu")
+    init_process_group(backend, rank, world_size)
+    try:
+        hosts = [None] * world_size
+        dist.all_gather_object(hosts, node_name())
+        benchmark = CollectiveBenchmark(device, max_size)
+        correct = benchmark.check_all_reduce()
+        rows = benchmark.sweep(collectives, sweep_sizes(max_size, MIN_SIZE), warmup_iterations)
+    finally:
+        dist.destroy_process_group()
+    if rank != 0:
+        return None
+    nodes = sorted(set(hosts))
+    report = [f"Collectives over {world_size} ranks on {len(nodes)} nodes ({dist_backend(backend)}): {', '.join(nodes)}",
+              f"all_reduce check: {'PASS' if correct else 'FAIL (wrong sum)'}"]
+    report.extend(format_collective_table(rows))
+    report.append("")
+    return {"report": report, "rows": rows, "world_size": world_size, "nodes": len(nodes), "correct": correct}
+
+def dist_backend(backend):
+    return "nccl" if backend == "cuda" else "gloo"
+
+def collective_worker(gpu_index, ready, gpus, backend, collectives, max_size, warmup_iterations, port):
+    # One rank per GPU of this node, when the test is not started by torchrun or srun
+    os.environ.update(MASTER_ADDR="127.0.0.1", MASTER_PORT=str(port))
+    ready()
+    return run_rank(gpus.index(gpu_index), len(gpus), gpu_index, backend, collectives, max_size, warmup_iterations)
+
+def collective_parameters(collective, world_size, nodes, backend, max_size):
+    return {"collective": collective, "world_size": world_size, "nodes": nodes, "backend": dist_backend(backend),
+            "max_size": max_size}
+
+def record_failure(backend, collectives, world_size, max_size, error, results_path=None, baseline_db=None):
+    # Local ranks only, so one node
+    result_writer = ResultWriter("collectives", backend, results_path or default_jsonl_path(), baseline_db)
+    for collective in collectives:
+        result_writer.add(None, None, collective_parameters(collective, world_size, 1, backend, max_size), {}, "FAIL",
+                          None, error)
+    result_writer.close()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def main(backend, collectives=None, max_size=1024**3, warmup_iterations=5, gpus=None, results_path=None,
+         baseline_db=None):
+    collectives = collectives or COLLECTIVES
+    environment = distributed_environment()
+    if environment is not None:
+        outcome = run_rank(*environment, backend, collectives, max_size, warmup_iterations)
+    else:
+        gpus = list(gpus) if gpus is not None else list(range(devices.device_count(backend)))
+        if len(gpus) < 2:
+            print("At least two GPUs are needed to test collectives on one node.")
+            return
+        print(f"Starting {len(gpus)} local ranks on GPUs {', '.join(str(g) for g in gpus)}")
+        outcomes = run_parallel(collective_worker, gpus,
+                                args=(gpus, backend, collectives, max_size, warmup_iterations, free_port()))
+        errors = {gpu_index: error for gpu_index, (_, error) in outcomes.items() if error}
+        for gpu_index, error in errors.items():
+            print(f"Rank on GPU {gpu_index} failed: {error}")
+        outcome, _ = outcomes.get(gpus[0], (None, None))
+        if errors or outcome is None:
+            # The job failed as a whole: every requested collective gets a FAIL record with the rank errors
+            error = "; ".join(f"rank on GPU {g}: {e}" for g, e in errors.items()) or "rank 0 returned no result"
+            record_failure(backend, collectives, len(gpus), max_size, error, results_path, baseline_db)
+            raise RuntimeError(f"Collectives failed: {error}")
+    if outcome is None:
+        # Not rank 0 of a torchrun or srun job
+        return
+
+    report, rows = outcome["report"], outcome["rows"]
+    print("\n".join(report))
+    report_file = f"{socket.gethostname()}_collectives.txt"
+    with open(report_file, 'w') as f:
+        f.write("\n".join(report))
+    print(f"Report saved to {report_file}")
+
+    # One record per collective for the whole job, so it is not tied to a GPU
+    result_writer = ResultWriter("collectives", backend, results_path or default_jsonl_path(), baseline_db)
+    summary = summarize_collectives(rows)
+    for collective in collectives:
+        parameters = collective_parameters(collective, outcome["world_size"], outcome["nodes"], backend, max_size)
+        collective_rows = [row for row in rows if row["collective"] == collective]
+        error = next((row["error"] for row in collective_rows if row["error"]), None)
+        if collective == "all_reduce" and not outcome["correct"]:
+            error = "all_reduce returned a wrong sum"
+        result_writer.add(None, None, parameters, summary.get(collective, {}),
+                          "FAIL" if error and "not supported" not in error else "PASS", collective_rows, error)
+    result_writer.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collective communication bandwidth test (all-reduce, all-gather, ...)")
+    parser.add_argument("--gpu", type=int, nargs='*', help="GPU indices to use when run without torchrun or srun (default: all GPUs)")
+    parser.add_argument("--device", choices=devices.BACKENDS, default="cuda", help="Device backend; 'cpu' uses gloo on CPU tensors for testing (default: cuda)")
+    parser.add_argument("--collective", nargs='*', choices=COLLECTIVES, help="Collectives to test (default: all)")
+    parser.add_argument("--max-size-gb", type=float, help="Largest message size in GB (default: 1, 0.0625 on --device cpu)")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed operations before timing each size (default: 5)")
+    parser.add_argument("--results", help="JSONL file the structured results are appended to (default: hostname_results.jsonl)")
+    parser.add_argument("--baseline-db", help="Also add the results to this SQLite baseline store")
+    args = parser.parse_args()
+
+    if devices.is_available(args.device):
+        max_size_gb = args.max_size_gb or (1 if args.device == "cuda" else 0.0625)
+        main(args.device, args.collective, int(max_size_gb * 1024**3), args.warmup, args.gpu, args.results,
+             args.baseline_db)
+    else:
+        print("No CUDA-capable GPUs found.")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests import devices
+from gpu_tests.h2d import (MODES, HostTransferBenchmark, device_numa_node, format_transfer_table,
+                           sweep_sizes)
+
+def test_host_transfers(gpu_index, backend, max_size, num_streams, modes):
+    device = devices.get_device(backend, gpu_index)
+    benchmark = HostTransferBenchmark(device, max_size, num_streams)
+
+    report = [f"GPU {gpu_index}: {devices.device_name(backend, gpu_index)}"]
+    if backend == "cuda":
+        report.append(f"GPU NUMA node: {device_numa_node(gpu_index)}")
+    for mode in ["pageable", "pinned"]:
+        nodes = benchmark.host_numa_nodes(mode)
+        placement = ", ".join(f"node {node}: {pages} pages" for node, pages in sorted(nodes.items())) or "unknown"
+        report.append(f"Host buffer NUMA placement ({mode}): {placement}")
+
+    rows = benchmark.sweep(sweep_sizes(max_size), modes)
+    report.extend(format_transfer_table(rows))
+    report.append("")
+    return report
+
+def main(gpus, backend, max_size, num_streams, modes):
+    hostname = socket.gethostname()
+    report_file = f"{hostname}_host_transfer.txt"
+    report = []
+
+    for gpu_index in gpus:
+        print(f"Testing host transfers for GPU {gpu_index}...")
+        gpu_report = test_host_transfers(gpu_index, backend, max_size, num_streams, modes)
+        print("\n".join(gpu_report))
+        report.extend(gpu_report)
+
+    with open(report_file, 'w') as f:
+        f.write("\n".join(report))
+
+    print(f"Report saved to {report_file}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host to device / device to host transfer bandwidth test")
+    parser.add_argument("--gpu", type=int, nargs='*', help="GPU indices to test (default: all GPUs)")
+    parser.add_argument("--device", choices=devices.BACKENDS, default="cuda", help="Device backend; 'cpu' runs on fake devices for testing (default: cuda)")
+    parser.add_argument("--max-size-gb", type=float, help="Largest message size in GB (default: 4, 0.0625 on --device cpu)")
+    parser.add_argument("--streams", type=int, default=4, help="CUDA streams used by the pinned-streams mode (default: 4)")
+    parser.add_argument("--mode", nargs='*', choices=MODES, help="Transfer modes to test (default: all)")
+    args = parser.parse_args()
+
+    if devices.is_available(args.device):
+        gpus = args.gpu if args.gpu is not None else range(devices.device_count(args.device))
+        max_size_gb = args.max_size_gb or (4 if args.device == "cuda" else 0.0625)
+        main(gpus, args.device, int(max_size_gb * 1024**3), args.streams, args.mode)
+    else:
+        print("No CUDA-capable GPUs found.")
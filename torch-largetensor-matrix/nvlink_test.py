@@ -1,61 +1,159 @@
 import torch
-import time
+import os
+import sys
+import argparse
+import json
 
-def test_nvlink_transfer(src_gpu, dst_gpu, tensor_size_gb=1):
-    # Create a large tensor on the source GPU
-    tensor_size = int(tensor_size_gb * 1024 * 1024 * 1024 / 4)  # size in number of float32 elements
-    src_tensor = torch.rand(tensor_size, dtype=torch.float32, device=f'cuda:{src_gpu}')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests.p2p import (MODES, P2PBandwidthMatrix, P2PSweep, flag_links, format_matrix, format_sweep_table,
+                           message_sizes, write_csv, write_json)
+from gpu_tests.results import BaselineStore, ResultWriter, default_jsonl_path
+from gpu_tests.slurm import node_name
+from gpu_tests.topology import format_topology, load_topology
+from gpu_tests.verdict import baseline, compare_to_baseline
+from gpu_tests.warmup import DEFAULT_TIMEOUT, format_warmup, warm_up
 
-    # Ensure the tensor is on the GPU
-    torch.cuda.synchronize(src_gpu)
+def test_all_gpu_pairs(gpus, tensor_size_gb=1, mode="unidirectional", trials=5, topology=None):
+    # Buffers are allocated once and reused for every pair and trial (see gpu_tests/p2p.py)
+    matrix = P2PBandwidthMatrix(gpus, int(tensor_size_gb * 1024 * 1024 * 1024), topology)
+    print(f"Measuring {mode} bandwidth between all GPU pairs ({trials} trials)...")
+    if mode == "planned":
+        for i, pairs in enumerate(matrix.rounds(mode)):
+            print(f"Round {i + 1}: " + ", ".join(f"{src}->{dst}" for src, dst in pairs))
+    return matrix.measure(mode, trials)
 
-    # Perform the transfer and measure time
-    start_time = time.time()
-    dst_tensor = src_tensor.to(f'cuda:{dst_gpu}')
-    torch.cuda.synchronize(dst_gpu)
-    end_time = time.time()
+def sweep_all_gpu_pairs(gpus, max_size_gb=1, output_prefix="nvlink_bandwidth"):
+    # Latency and bandwidth against message size for every ordered pair, plus a P2P access check
+    max_bytes = int(max_size_gb * 1024 * 1024 * 1024)
+    results = []
+    no_peer_access = []
+    for src_gpu in gpus:
+        for dst_gpu in gpus:
+            if src_gpu == dst_gpu:
+                continue
+            sweep = P2PSweep(src_gpu, dst_gpu, max_bytes)
+            access = "enabled" if sweep.peer_access else "NOT available, staged through host"
+            print(f"\nGPU {src_gpu} to GPU {dst_gpu} (P2P access {access}):")
+            rows = sweep.sweep(message_sizes(max_bytes))
+            print("\n".join(format_sweep_table(rows)))
+            results.append({"src": src_gpu, "dst": dst_gpu, "peer_access": sweep.peer_access, "sizes": rows})
+            if not sweep.peer_access:
+                no_peer_access.append((src_gpu, dst_gpu))
+            del sweep
 
-    # Calculate transfer speed
-    transfer_time = end_time - start_time
-    transfer_speed_gbps = (tensor_size_gb * 8) / transfer_time  # Convert GB/s to Gb/s
-
-    return transfer_speed_gbps
-
-def test_all_gpu_pairs(num_gpus, tensor_size_gb=1):
-    results = {}
-
-    for src_gpu in range(num_gpus):
-        for dst_gpu in range(num_gpus):
-            if src_gpu != dst_gpu:
-                print(f"Testing transfer from GPU {src_gpu} to GPU {dst_gpu}...")
-                speed = test_nvlink_transfer(src_gpu, dst_gpu, tensor_size_gb)
-                results[(src_gpu, dst_gpu)] = speed
-                print(f"Transfer speed: {speed:.2f} Gb/s")
+    for src, dst in no_peer_access:
+        print(f"\nWarning: GPU {src} cannot access GPU {dst} directly; transfers fall back to staging through host memory.")
+        print("This might indicate a problem with the NVLink connection or configuration.")
 
+    with open(f"{output_prefix}_sweep.json", 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSweep results saved to {output_prefix}_sweep.json")
     return results
 
-def main():
+def main(mode="unidirectional", trials=5, tensor_size_gb=1, output_prefix="nvlink_bandwidth", sweep=False, gpus=None,
+         results_path=None, baseline_db=None, topology_file=None, steady_warmup=None):
     # Check the number of available GPUs
     num_gpus = torch.cuda.device_count()
     print(f"Number of GPUs detected: {num_gpus}")
+    gpus = [g for g in gpus if g < num_gpus] if gpus is not None else list(range(num_gpus))
 
-    if num_gpus < 2:
+    if len(gpus) < 2:
         print("At least 2 GPUs are required to test NVLink connections.")
         return
 
+    # Device to device copies on every GPU until their clocks, power and temperature settle (see gpu_tests/warmup.py)
+    if steady_warmup is not None:
+        print("\n".join(format_warmup(warm_up("cuda", gpus, load="copy", timeout=steady_warmup))))
+
+    if sweep:
+        result_writer = ResultWriter("nvlink_sweep", "cuda", results_path or default_jsonl_path(), baseline_db)
+        for pair in sweep_all_gpu_pairs(gpus, tensor_size_gb, output_prefix):
+            sizes = pair["sizes"]
+            metrics = {"latency_us_min_size": sizes[0]["latency_us"], "bandwidth_gbps_max_size": sizes[-1]["bandwidth_gbps"],
+                       "peer_access": int(pair["peer_access"])}
+            result_writer.add(pair["src"], torch.cuda.get_device_name(pair["src"]),
+                              {"dst": pair["dst"], "max_size_gb": tensor_size_gb}, metrics,
+                              "PASS" if pair["peer_access"] else "FAIL", iterations={"sizes": sizes})
+        result_writer.close()
+        return
+
+    # Link types, NVLink counts and affinities of this node, cached per host (see gpu_tests/topology.py)
+    topology = load_topology(topology_file)
+    if topology is not None:
+        print("\n".join(format_topology(topology)))
+    elif mode == "planned":
+        print("The planned mode needs nvidia-smi topo -m output.")
+        return
+
     # Test NVLink connections
-    results = test_all_gpu_pairs(num_gpus)
+    results = test_all_gpu_pairs(gpus, tensor_size_gb, mode, trials, topology)
 
     # Print summary
-    print("\nNVLink Test Results Summary:")
-    for (src, dst), speed in results.items():
-        print(f"GPU {src} to GPU {dst}: {speed:.2f} Gb/s")
-
-    # Check for potential issues
-    for (src, dst), speed in results.items():
-        if speed < 20:  # This threshold might need adjustment based on your specific hardware
-            print(f"\nWarning: Low transfer speed detected between GPU {src} and GPU {dst}.")
+    print(f"\nNVLink Test Results Summary ({mode}, median GB/s):")
+    print("\n".join(format_matrix(results, gpus)))
+
+    # Check for potential issues against the expected bandwidth of each link type
+    links = topology.gpu_links() if topology is not None else {}
+    if links:
+        flagged = flag_links(results, links, topology.expectations(gpus))
+        for (src, dst), link, median, expected in flagged:
+            print(f"\nWarning: Low transfer speed detected between GPU {src} and GPU {dst}: "
+                  f"{median:.1f} GB/s over {link}, expected about {expected:.0f} GB/s.")
+            print("This might indicate a problem with the NVLink connection or configuration.")
+    else:
+        # No topology available: fall back to the conservative 20 Gb/s (2.5 GB/s) threshold
+        flagged = [(pair, None, stats["median"], None) for pair, stats in sorted(results.items()) if stats["median"] < 2.5]
+        for (src, dst), _, median, _ in flagged:
+            print(f"\nWarning: Low transfer speed detected between GPU {src} and GPU {dst}: {median:.1f} GB/s.")
             print("This might indicate a problem with the NVLink connection or configuration.")
 
+    def pair_parameters(src, dst):
+        return {"dst": dst, "mode": mode, "size_gb": tensor_size_gb, "trials": trials, "link": links.get((src, dst))}
+
+    # Pairs far below the same pair on other nodes with the same GPU model (see gpu_tests/verdict.py)
+    if baseline_db and os.path.exists(baseline_db):
+        flagged_pairs = {pair for pair, _, _, _ in flagged}
+        with BaselineStore(baseline_db) as store:
+            for (src, dst), stats in sorted(results.items()):
+                reference = baseline(store, "nvlink", "bandwidth_gbps_median", torch.cuda.get_device_name(src),
+                                     pair_parameters(src, dst), exclude_host=node_name())
+                if reference is None or (src, dst) in flagged_pairs:
+                    continue
+                deviation, drop, slow = compare_to_baseline(stats["median"], reference)
+                if slow:
+                    flagged.append(((src, dst), links.get((src, dst)), stats["median"], reference["median"]))
+                    print(f"\nWarning: Low transfer speed detected between GPU {src} and GPU {dst}: "
+                          f"{stats['median']:.1f} GB/s, {drop:.0%} below the baseline of {reference['count']} "
+                          f"nodes ({reference['median']:.1f} GB/s, {deviation:.1f} sigma).")
+                    print("This might indicate a problem with the NVLink connection or configuration.")
+
+    write_csv(f"{output_prefix}_{mode}.csv", results, gpus)
+    write_json(f"{output_prefix}_{mode}.json", results, gpus, mode, int(tensor_size_gb * 1024 * 1024 * 1024), links, flagged)
+    print(f"\nBandwidth matrix saved to {output_prefix}_{mode}.csv and {output_prefix}_{mode}.json")
+
+    # One structured record per ordered pair, keyed on the source GPU
+    result_writer = ResultWriter("nvlink", "cuda", results_path or default_jsonl_path(), baseline_db)
+    flagged_pairs = {pair for pair, _, _, _ in flagged}
+    for (src, dst), stats in sorted(results.items()):
+        parameters = pair_parameters(src, dst)
+        metrics = {f"bandwidth_gbps_{stat}": stats[stat] for stat in ["median", "mean", "min", "p5", "p95", "max"]}
+        result_writer.add(src, torch.cuda.get_device_name(src), parameters, metrics,
+                          "FAIL" if (src, dst) in flagged_pairs else "PASS")
+    result_writer.close()
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="NVLink peer-to-peer bandwidth test")
+    parser.add_argument("--gpu", type=int, nargs='*', help="GPU indices to test (default: all GPUs)")
+    parser.add_argument("--mode", choices=MODES, default="unidirectional", help="Transfer pattern (default: unidirectional)")
+    parser.add_argument("--trials", type=int, default=5, help="Timed trials per pair (default: 5)")
+    parser.add_argument("--size-gb", type=float, default=1, help="Transfer size per copy in GB, or the largest size with --sweep (default: 1)")
+    parser.add_argument("--sweep", action="store_true", help="Sweep message sizes from 4 bytes up to --size-gb and report latency and bandwidth per pair")
+    parser.add_argument("--output", default="nvlink_bandwidth", help="Prefix for the CSV/JSON matrix files (default: nvlink_bandwidth)")
+    parser.add_argument("--results", help="JSONL file the structured results are appended to (default: hostname_results.jsonl)")
+    parser.add_argument("--baseline-db", help="Also add the results to this SQLite baseline store, and compare each pair against it")
+    parser.add_argument("--topology", help="Recorded nvidia-smi topo -m output to use instead of running nvidia-smi")
+    parser.add_argument("--steady-warmup", type=float, nargs='?', const=DEFAULT_TIMEOUT, metavar="TIMEOUT", help=f"Before measuring, run device to device copies until clocks, power and temperature reach steady state, for at most TIMEOUT seconds (default: off, {DEFAULT_TIMEOUT} if given without a value)")
+    args = parser.parse_args()
+
+    main(args.mode, args.trials, args.size_gb, args.output, args.sweep, args.gpu, args.results, args.baseline_db,
+         args.topology, args.steady_warmup)
@@ -1,33 +1,11 @@
 import torch
-import time
-import subprocess
 import threading
 import os
+import sys
 
-def run_nvidia_smi_topo(log_file, interval=60, stop_event=None):
-    while not stop_event.is_set():
-        try:
-            result = subprocess.run(['nvidia-smi', 'topo', '-m'], capture_output=True, text=True)
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            with open(log_file, 'a') as f:
-                f.write(f"\n\n--- Topology at {timestamp} ---\n")
-                f.write(result.stdout)
-            time.sleep(interval)
-        except Exception as e:
-            print(f"Error running nvidia-smi: {e}")
-            break
-
-def test_nvlink_transfer(src_gpu, dst_gpu, tensor_size_gb=1):
-    tensor_size = int(tensor_size_gb * 1024 * 1024 * 1024 / 4)
-    src_tensor = torch.rand(tensor_size, dtype=torch.float32, device=f'cuda:{src_gpu}')
-    torch.cuda.synchronize(src_gpu)
-    start_time = time.time()
-    dst_tensor = src_tensor.to(f'cuda:{dst_gpu}')
-    torch.cuda.synchronize(dst_gpu)
-    end_time = time.time()
-    transfer_time = end_time - start_time
-    transfer_speed_gbps = (tensor_size_gb * 8) / transfer_time
-    return transfer_speed_gbps
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests.p2p import MIN_EXPECTED_FRACTION, test_nvlink_transfer
+from gpu_tests.topology import load_topology, run_nvidia_smi_topo
 
 def test_all_gpu_pairs(num_gpus, tensor_size_gb=1):
     results = {}
@@ -63,10 +41,16 @@ def main():
         for (src, dst), speed in results.items():
             print(f"GPU {src} to GPU {dst}: {speed:.2f} Gb/s")
 
-        # Check for potential issues
+        # Check for potential issues against the expected bandwidth of each pair's link type (GB/s, hence x 8),
+        # or the old 20 Gb/s threshold where the topology is not known
+        topology = load_topology()
         for (src, dst), speed in results.items():
-            if speed < 20:
-                print(f"\nWarning: Low transfer speed detected between GPU {src} and GPU {dst}.")
+            expected = topology.expected_bandwidth(src, dst) if topology is not None else None
+            threshold = MIN_EXPECTED_FRACTION * expected * 8 if expected else 20
+            if speed < threshold:
+                link = f" over {topology.link(src, dst)}" if expected else ""
+                print(f"\nWarning: Low transfer speed detected between GPU {src} and GPU {dst}{link}: "
+                      f"{speed:.2f} Gb/s, below {threshold:.0f} Gb/s.")
                 print("This might indicate a problem with the NVLink connection or configuration.")
 
     finally:
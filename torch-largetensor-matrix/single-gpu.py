@@ -3,71 +3,94 @@
 import torch
 import time
 import os
+import sys
+import argparse
 
-def create_large_tensor(size_gb):
-    # Calculate number of elements for a given size in GB
-    num_elements = int(size_gb * 1024 * 1024 * 1024 / 4)  # Assuming float32
-    return torch.rand(num_elements, device='cuda')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests import profiling
+from gpu_tests.diskio import DEFAULT_BLOCK_SIZE, DiskIOEngine, format_io_summary
+from gpu_tests.correctness import CorruptionLog, PatternTester
+from gpu_tests.hbm import ENGINES, ComputeEngine, create_large_tensor, format_bandwidth
 
-def perform_computations(tensor, iterations):
-    chunk_size = 1000000  # Adjust this value if needed
-    for _ in range(iterations):
-        # Process the tensor in chunks
-        for i in range(0, tensor.size(0), chunk_size):
-            chunk = tensor[i:i+chunk_size]
-            # Perform computations on the chunk
-            chunk = torch.sin(chunk)
-            chunk = torch.exp(chunk)
-            tensor[i:i+chunk_size] = chunk
-    return tensor
+def perform_computations(engine, iterations):
+    # sin then exp over the whole tensor, in place, using the selected engine (see gpu_tests/hbm.py)
+    with profiling.region("compute"):
+        bandwidths = engine.run(iterations)
+    print(f"{iterations} passes ({engine.mode}): {format_bandwidth(bandwidths)}")
+    return bandwidths
 
-def io_operations(file_size_gb, num_operations):
-    filename = "test_file.bin"
-    
-    # Generate random data
-    data = os.urandom(int(file_size_gb * 1024 * 1024 * 1024))
-    
-    for _ in range(num_operations):
-        # Write data
-        with open(filename, 'wb') as f:
-            f.write(data)
-        
-        # Read data
-        with open(filename, 'rb') as f:
-            _ = f.read()
-    
-    # Clean up
-    os.remove(filename)
+def io_operations(engine, num_operations):
+    # Write then read the whole file `num_operations` times with the I/O engine (see gpu_tests/diskio.py)
+    with profiling.region("io"):
+        results = engine.run(num_operations)
+    print("\n".join(format_io_summary(results, "I/O")))
+    return results
 
-def main():
-    # Parameters
-    gpu_memory_usage_gb = 72  # Aiming for 72GB usage
-    run_time_minutes = 5
-    io_file_size_gb = 10
-    io_operations_count = 50
+def main(engine_mode="inplace", io_options=None, run_time_minutes=5, gpu_memory_usage_gb=72, io_file_size_gb=10,
+         io_operations_count=50, verify=False):
+    # gpu_memory_usage_gb: aiming for 72GB usage by default
 
     print("Starting A100 GPU test...")
     
     # Create a large tensor to occupy GPU memory
-    large_tensor = create_large_tensor(gpu_memory_usage_gb)
-    
-    start_time = time.time()
-    iteration = 0
-    
-    while time.time() - start_time < run_time_minutes * 60:
-        # Perform GPU computations
-        large_tensor = perform_computations(large_tensor, 10)
-        
-        # Perform I/O operations every 10 iterations
-        if iteration % 10 == 0:
-            io_operations(io_file_size_gb, io_operations_count)
-        
-        iteration += 1
+    large_tensor = create_large_tensor(gpu_memory_usage_gb, torch.device('cuda'), seed=0 if verify else None)
+    engine = ComputeEngine(large_tensor, engine_mode)
+    corruption = CorruptionLog(torch.cuda.current_device()) if verify else None
+    tester = PatternTester(large_tensor, corruption) if verify else None
+    pattern_pass = 0
+    bandwidths = []
+    io_engine = DiskIOEngine("test_file.bin", int(io_file_size_gb * 1024**3), **(io_options or {}))
+    io_results = []
     
-    end_time = time.time()
+    # The test file is removed by close(), also when a pass fails
+    try:
+        start_time = time.time()
+        iteration = 0
+
+        while time.time() - start_time < run_time_minutes * 60:
+            # Perform GPU computations
+            bandwidths += perform_computations(engine, 10)
+
+            # Perform I/O operations every 10 iterations
+            if iteration % 10 == 0:
+                # With --verify an address pattern sits in the tensor while the disk is busy, and is then read back
+                # (see gpu_tests/correctness.py); the tensor is refilled with random values for the next passes
+                if tester is not None:
+                    tester.write(pattern_pass, seed=pattern_pass)
+                io_results += io_operations(io_engine, io_operations_count)
+                if tester is not None:
+                    tester.verify(pattern_pass, seed=pattern_pass)
+                    large_tensor.uniform_()
+                    pattern_pass += 1
+
+            iteration += 1
+
+        end_time = time.time()
+    finally:
+        io_engine.close()
     
     print(f"Test completed in {end_time - start_time:.2f} seconds")
     print(f"Iterations completed: {iteration}")
+    print(f"Memory bandwidth: {format_bandwidth(bandwidths)}")
+    print("\n".join(format_io_summary(io_results, "I/O total")))
+    if corruption is not None:
+        print("\n".join(corruption.format()))
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Large tensor GPU test")
+    parser.add_argument("--duration", type=float, default=300, help="Seconds to run (default: 300)")
+    parser.add_argument("--memory-gb", type=float, default=72, help="Size of the tensor in GB (default: 72)")
+    parser.add_argument("--io-file-size-gb", type=float, default=10, help="Size of the I/O test file in GB (default: 10)")
+    parser.add_argument("--io-operations", type=int, default=50, help="Write/read passes per I/O cycle (default: 50)")
+    parser.add_argument("--engine", choices=ENGINES, default="inplace", help="Compute engine for the tensor passes (default: inplace)")
+    parser.add_argument("--io-block-mb", type=int, default=DEFAULT_BLOCK_SIZE // 1024**2, help="Block size of each disk read/write in MB (default: 8)")
+    parser.add_argument("--io-queue-depth", type=int, default=4, help="Disk operations kept in flight (default: 4)")
+    parser.add_argument("--io-direct", action="store_true", help="Open the test file with O_DIRECT, bypassing the page cache")
+    parser.add_argument("--io-no-fsync", action="store_true", help="Do not fsync after each write pass")
+    parser.add_argument("--verify", action="store_true", help="Write an address pattern over the tensor before every I/O cycle and verify it afterwards")
+    args = parser.parse_args()
+
+    io_options = {"block_size": args.io_block_mb * 1024**2, "queue_depth": args.io_queue_depth,
+                  "direct": args.io_direct, "fsync": not args.io_no_fsync}
+    main(args.engine, io_options, args.duration / 60, args.memory_gb, args.io_file_size_gb, args.io_operations,
+         args.verify)
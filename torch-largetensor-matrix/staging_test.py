@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import socket
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests import devices
+from gpu_tests.diskio import DiskIOEngine
+from gpu_tests.hbm import ENGINES, ComputeEngine, create_large_tensor, format_bandwidth
+from gpu_tests.staging import DEFAULT_CHUNK_SIZE, DEFAULT_NUM_BUFFERS, READERS, StagingPipeline, format_pipeline
+
+def test_staging(gpu_index, backend, file_size_gb, tensor_size_gb, chunk_size, num_buffers, reader, engine_mode):
+    device = devices.get_device(backend, gpu_index)
+    filename = f"staging_file_{socket.gethostname()}_{gpu_index}.bin"
+    report = [f"GPU {gpu_index}: {devices.device_name(backend, gpu_index)}",
+              f"Reader: {reader}, chunk {chunk_size / 1024**2:g}MB x {num_buffers} buffers, file {file_size_gb:g}GB"]
+
+    # Write the source file with the disk I/O engine; it is removed again when the engine is closed
+    io_engine = DiskIOEngine(filename, int(file_size_gb * 1024**3))
+    io_engine.write_pass()
+    try:
+        pipeline = StagingPipeline(filename, device, chunk_size, num_buffers, reader)
+
+        report.append("Ingest only:")
+        report.extend(format_pipeline(pipeline.run()))
+
+        engine = ComputeEngine(create_large_tensor(tensor_size_gb, device), engine_mode)
+        bandwidths = []
+        report.append(f"Ingest overlapped with compute ({engine_mode}):")
+        report.extend(format_pipeline(pipeline.run(lambda: bandwidths.extend(engine.run(1)))))
+        report.append(f"Memory bandwidth during ingest: {format_bandwidth(bandwidths)}")
+    finally:
+        io_engine.close()
+    report.append("")
+    return report
+
+def main(gpus, backend, file_size_gb, tensor_size_gb, chunk_size, num_buffers, reader, engine_mode):
+    hostname = socket.gethostname()
+    report_file = f"{hostname}_staging.txt"
+    report = []
+
+    for gpu_index in gpus:
+        print(f"Testing storage to GPU staging for GPU {gpu_index}...")
+        gpu_report = test_staging(gpu_index, backend, file_size_gb, tensor_size_gb, chunk_size, num_buffers, reader, engine_mode)
+        print("\n".join(gpu_report))
+        report.extend(gpu_report)
+
+    with open(report_file, 'w') as f:
+        f.write("\n".join(report))
+
+    print(f"Report saved to {report_file}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Storage to GPU staging pipeline test")
+    parser.add_argument("--gpu", type=int, nargs='*', help="GPU indices to test (default: all GPUs)")
+    parser.add_argument("--device", choices=devices.BACKENDS, default="cuda", help="Device backend; 'cpu' runs on fake devices for testing (default: cuda)")
+    parser.add_argument("--file-size-gb", type=float, help="Size of the file streamed to each GPU in GB (default: 10, 0.25 on --device cpu)")
+    parser.add_argument("--tensor-size-gb", type=float, help="Size of the tensor computed on during ingest in GB (default: 16, 0.0625 on --device cpu)")
+    parser.add_argument("--chunk-mb", type=int, default=DEFAULT_CHUNK_SIZE // 1024**2, help="Chunk size in MB (default: 64)")
+    parser.add_argument("--buffers", type=int, default=DEFAULT_NUM_BUFFERS, help="Staging buffers; 2 = double, 3 = triple buffering (default: 3)")
+    parser.add_argument("--reader", choices=READERS, default="pread", help="How chunks are read from the file (default: pread)")
+    parser.add_argument("--engine", choices=ENGINES, default="inplace", help="Compute engine overlapped with ingest (default: inplace)")
+    args = parser.parse_args()
+
+    if devices.is_available(args.device):
+        gpus = args.gpu if args.gpu is not None else range(devices.device_count(args.device))
+        cuda = args.device == "cuda"
+        file_size_gb = args.file_size_gb or (10 if cuda else 0.25)
+        tensor_size_gb = args.tensor_size_gb or (16 if cuda else 0.0625)
+        main(gpus, args.device, file_size_gb, tensor_size_gb, args.chunk_mb * 1024**2, args.buffers, args.reader, args.engine)
+    else:
+        print("No CUDA-capable GPUs found.")
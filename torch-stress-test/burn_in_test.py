@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import socket
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests import devices
+from gpu_tests.burnin import (DUTY_PERIOD, SOLO_SECONDS, WORKLOADS, BurnIn, format_burn_in_table, make_workloads,
+                              parse_mix)
+from gpu_tests.results import ResultWriter, default_jsonl_path
+from gpu_tests.telemetry import TelemetrySampler
+
+def main(gpus, backend="cuda", mix="gemm,hbm,p2p", duration=600, solo_seconds=SOLO_SECONDS, period=DUTY_PERIOD,
+         timeseries_dir=None, results_path=None, baseline_db=None):
+    hostname = socket.gethostname()
+    timeseries_dir = timeseries_dir or f"{hostname}_burn_in"
+    duty_cycles = parse_mix(mix)
+    gpus = list(gpus)
+    if "p2p" in duty_cycles and len(gpus) < 2:
+        print("The p2p workload needs at least 2 GPUs; running without it.")
+
+    print(f"Allocating {', '.join(duty_cycles)} workloads on GPUs {', '.join(str(g) for g in gpus)}")
+    workloads = make_workloads(backend, gpus, duty_cycles)
+    burn_in = BurnIn(workloads, duty_cycles, timeseries_dir, period)
+    with TelemetrySampler(devices.telemetry_backend(backend, gpus)) as sampler:
+        rows = burn_in.run(duration, solo_seconds)
+        telemetry = {gpu_index: sampler.summary(gpu_index) for gpu_index in gpus}
+
+    report = [f"Burn-in on {hostname}: {mix}, period {period:g}s, {duration:.0f}s mixed after {solo_seconds:.0f}s solo "
+              f"per workload"]
+    report.extend(format_burn_in_table(rows))
+    for gpu_index in gpus:
+        summary = telemetry[gpu_index]
+        report.append(f"GPU {gpu_index}: peak temperature {summary['temperature']['peak']}°C, "
+                      f"peak power {summary['power']['peak']}W, mean SM clock {summary['sm_clock']['mean']}MHz")
+    report.append(f"Time series saved to {timeseries_dir}")
+    report.append("")
+    print("\n".join(report))
+
+    report_file = f"{hostname}_burn_in.txt"
+    with open(report_file, 'w') as f:
+        f.write("\n".join(report))
+    print(f"Report saved to {report_file}")
+
+    # One record per workload, on the GPU it runs on
+    result_writer = ResultWriter("burnin", backend, results_path or default_jsonl_path(), baseline_db)
+    for row in rows:
+        parameters = {"workload": row["workload"], "mix": mix, "period": period, "duration": duration}
+        throttle = row["throttling"] or {}
+        metrics = {"solo": row["solo"], "mixed": row["mixed"], "mixed_p5": row["p5"], "kept_fraction": row["fraction"],
+                   "all_busy": row["all_busy"], "throttle_onset_s": throttle.get("onset_s"),
+                   "throttle_severity": throttle.get("severity", 0.0), "peak_temperature_c":
+                   telemetry[row["gpu"]]["temperature"]["peak"]}
+        result_writer.add(row["gpu"], devices.device_name(backend, row["gpu"]), parameters, metrics, row["verdict"],
+                          {"timeseries": row["timeseries"], "unit": row["unit"]}, row["error"])
+    result_writer.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Burn-in: GEMM, HBM and P2P workloads running together")
+    parser.add_argument("--gpu", type=int, nargs='*', help="GPU indices to test (default: all GPUs)")
+    parser.add_argument("--device", choices=devices.BACKENDS, default="cuda", help="Device backend; 'cpu' runs on fake devices for testing (default: cuda)")
+    parser.add_argument("--mix", default="gemm,hbm,p2p", help=f"Workloads and the fraction of each period they are busy, e.g. gemm=1,hbm=0.5,p2p=0.25; choose from {', '.join(WORKLOADS)} (default: all, always busy)")
+    parser.add_argument("--period", type=float, default=DUTY_PERIOD, help=f"Duty cycle period in seconds (default: {DUTY_PERIOD:g})")
+    parser.add_argument("--solo", type=float, default=SOLO_SECONDS, help=f"Seconds each kind of workload first runs alone as its reference; 0 to skip (default: {SOLO_SECONDS})")
+    parser.add_argument("--duration", type=float, default=600, help="Seconds to run the workloads together (default: 600)")
+    parser.add_argument("--timeseries", help="Directory for the per-burst throughput of every workload (default: hostname_burn_in)")
+    parser.add_argument("--results", help="JSONL file the structured results are appended to (default: hostname_results.jsonl)")
+    parser.add_argument("--baseline-db", help="Also add the results to this SQLite baseline store")
+    args = parser.parse_args()
+
+    if devices.is_available(args.device):
+        gpus = args.gpu if args.gpu is not None else range(devices.device_count(args.device))
+        main(gpus, args.device, args.mix, args.duration, args.solo, args.period, args.timeseries, args.results,
+             args.baseline_db)
+    else:
+        print("No CUDA-capable GPUs found.")
@@ -1,31 +1,25 @@
 import torch
 import time
 import argparse
+import os
+import sys
 
-def gpu_stress_test(device, duration=180):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests.kernels import allocate_stress_kernel
+
+def gpu_stress_test(device, duration=180, in_place=False):
     print(f"Starting GPU stress test on {device}")
     start_time = time.time()
     
-    # Get the total amount of memory on the GPU
-    total_memory = torch.cuda.get_device_properties(device).total_memory
-    
-    # Calculate the size of the tensor to use most of the available memory
-    # We'll use 90% of the available memory to leave some headroom
-    tensor_size = int((total_memory * 0.9) ** 0.5 // 8)  # 8 bytes per float64
-    
-    print(f"Creating tensors of size {tensor_size}x{tensor_size}")
-    
     # Create large tensors that fill most of the GPU memory
-    a = torch.randn(tensor_size, tensor_size, dtype=torch.float64, device=device)
-    b = torch.randn(tensor_size, tensor_size, dtype=torch.float64, device=device)
+    # The size is calculated from the free memory so that a, b and every temporary of the loop
+    # together use 90% of the GPU, and is shrunk and retried on out-of-memory errors.
+    # With in_place the loop writes into preallocated buffers, so fewer temporaries need room.
+    tensor_size, kernel = allocate_stress_kernel(device, torch.float64, in_place=in_place)
     
     while time.time() - start_time < duration:
-        # Perform matrix multiplication
-        c = torch.matmul(a, b)
-        # Perform element-wise operations
-        d = torch.sin(c) + torch.cos(c)
-        # Reduce
-        result = torch.sum(d)
+        # Matrix multiplication, element-wise sin + cos, then reduce (see gpu_tests/kernels.py)
+        result = kernel()
         
         # Print progress
         elapsed = time.time() - start_time
@@ -36,7 +30,7 @@ def gpu_stress_test(device, duration=180):
     
     print(f"Test completed on {device}")
 
-def main(gpu_index):
+def main(gpu_index, in_place=False):
     if gpu_index >= torch.cuda.device_count():
         print(f"Error: GPU index {gpu_index} is out of range. Available GPUs: {torch.cuda.device_count()}")
         return
@@ -46,14 +40,15 @@ def main(gpu_index):
     total_memory_gb = torch.cuda.get_device_properties(device).total_memory / 1e9
     print(f"Testing GPU {gpu_index}: {gpu_name} (Total memory: {total_memory_gb:.2f} GB)")
     
-    gpu_stress_test(device)
+    gpu_stress_test(device, in_place=in_place)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="GPU Hardware Acceptance Test")
     parser.add_argument("--gpu", type=int, default=0, help="GPU index to test (default: 0)")
+    parser.add_argument("--in-place", action="store_true", help="Reuse preallocated output buffers instead of allocating every iteration")
     args = parser.parse_args()
 
     if torch.cuda.is_available():
-        main(args.gpu)
+        main(args.gpu, args.in_place)
     else:
         print("No CUDA-capable GPUs found.")
@@ -1,127 +1,439 @@
 import torch
 import time
 import argparse
-import subprocess
+import os
+import sys
 import socket
+import threading
 
-def run_command(command):
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, shell=True)
-    return result.stdout.strip()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests import devices, profiling
+from gpu_tests.adaptive import DEFAULT_REL_WIDTH, MAX_SECONDS, AdaptiveStop, escalation_reasons, format_adaptive
+from gpu_tests.gemm import DTYPES, MIN_EFFICIENCY, format_sweep_table, gemm_sweep
+from gpu_tests.parallel import run_parallel
+from gpu_tests.kernels import allocate_stress_kernel, allocation_count, allocations_per_iteration
+from gpu_tests.recorder import TimeSeriesRecorder, read_columns
+from gpu_tests.report import append_error, format_memory, format_temperature, format_utilization, missing_telemetry
+from gpu_tests.results import BaselineStore, ResultWriter, default_jsonl_path
+from gpu_tests.slurm import node_name
+from gpu_tests.telemetry import TelemetrySampler
+from gpu_tests.timing import KernelTimer, summarize
+from gpu_tests.verdict import baseline, performance_verdict
+from gpu_tests.warmup import DEFAULT_TIMEOUT, WarmupController, format_warmup
 
-def get_gpu_info(gpu_index):
-    memory_info = run_command(f"nvidia-smi --query-gpu=memory.total,memory.used --format=csv,noheader,nounits -i {gpu_index}")
-    total_memory, used_memory = map(int, memory_info.split(','))
-    temperature = int(run_command(f"nvidia-smi --query-gpu=temperature.gpu --format=csv,noheader,nounits -i {gpu_index}"))
-    return total_memory, used_memory, temperature
+KERNELS = ["gemm", "elementwise", "reduction"]
+TELEMETRY_FIELDS = ["memory_used", "temperature", "power", "sm_clock"]
 
-def gpu_benchmark(device, duration=600):  # 10 minutes
+def gpu_benchmark(device, sampler, duration=600, gpu_index=None, ready=None, warmup_iterations=3, in_place=False,
+                  timeseries_dir=None, steady_warmup=None, stop=None):  # 10 minutes
     print(f"Starting GPU benchmark on {device}")
-    start_time = time.time()
-    
-    total_memory = torch.cuda.get_device_properties(device).total_memory
-    tensor_size = int((total_memory * 0.9) ** 0.5 // 8)  # Using 90% of memory
-    
-    print(f"Creating tensors of size {tensor_size}x{tensor_size}")
-    
+    # Fake (CPU) devices have no index of their own, so telemetry is looked up by the requested GPU index
+    gpu_index = device.index if gpu_index is None else gpu_index
+    timeseries_path = os.path.join(timeseries_dir or f"{socket.gethostname()}_timeseries", f"gpu{gpu_index}")
+
+    # Sized from free memory for all live buffers, shrinking on OOM
     try:
-        a = torch.randn(tensor_size, tensor_size, dtype=torch.float64, device=device)
-        b = torch.randn(tensor_size, tensor_size, dtype=torch.float64, device=device)
+        tensor_size, kernel = allocate_stress_kernel(device, in_place=in_place)
     except torch.cuda.OutOfMemoryError:
         return None, None, None, "CUDA out of memory error during tensor creation"
-    
-    peak_memory_usage = 0
-    peak_temperature = 0
-    total_flops = 0
+
+    # In parallel mode, wait here until every device has allocated its tensors
+    if ready is not None:
+        ready()
+
+    # FLOPs per kernel for one iteration
+    # Matrix multiplication: 2 * N^3 FLOPs
+    # Sin, Cos and the addition: 4 * N^2 FLOPs
+    # Sum: N^2 FLOPs
+    kernel_flops = {"gemm": 2 * tensor_size**3, "elementwise": 4 * tensor_size**2, "reduction": tensor_size**2}
+    flops_per_iteration = sum(kernel_flops.values())
+
+    timer = KernelTimer(device)
+    # Every iteration goes to disk; memory holds one flush buffer and a decimated overview however long the run
+    recorder = TimeSeriesRecorder(timeseries_path, ["iteration_time", "flops"] + [f"{name}_time" for name in KERNELS]
+                                  + TELEMETRY_FIELDS)
     iteration_count = 0
-    
+
+    warmup = None
     try:
+        # Warmup iterations absorb cuBLAS handle creation and allocator growth and are excluded from the stats
+        for _ in range(warmup_iterations):
+            kernel()
+        devices.synchronize(device)
+
+        # With --steady-warmup the kernel keeps running until clocks, power and temperature settle, so the
+        # measurement starts from sustained rather than boost clock performance
+        if steady_warmup is not None:
+            def step():
+                kernel()
+                devices.synchronize(device)
+            warmup = WarmupController(sampler, [gpu_index], timeout=steady_warmup).run(step)
+            print("\n".join(format_warmup(warmup)))
+
+        start_time = time.time()
+        telemetry_start = time.monotonic()
+        allocations_start = allocation_count(device)
+
+        # The profiling regions (--profile) time the host side: kernel launches are asynchronous, so on CUDA the
+        # GPU time of the kernels shows up in "sync", where timer.elapsed() waits for them
         while time.time() - start_time < duration:
-            iteration_start = time.time()
-            
-            c = torch.matmul(a, b)
-            d = torch.sin(c) + torch.cos(c)
-            result = torch.sum(d)
-            
-            torch.cuda.synchronize(device)
-            
-            iteration_end = time.time()
-            iteration_time = iteration_end - iteration_start
-            
-            # Calculate FLOPS for this iteration
-            # Matrix multiplication: 2 * N^3 FLOPs
-            # Sin and Cos: 2 * N^2 FLOPs each
-            # Sum: N^2 FLOPs
-            flops_per_iteration = 2 * tensor_size**3 + 5 * tensor_size**2
-            total_flops += flops_per_iteration
+            timer.start()
+            with profiling.region("gemm"):
+                kernel.gemm()
+                timer.mark("gemm")
+            with profiling.region("elementwise"):
+                kernel.elementwise()
+                timer.mark("elementwise")
+            with profiling.region("reduction"):
+                kernel.reduction()
+                timer.mark("reduction")
+
+            with profiling.region("sync"):
+                times = timer.elapsed()
+            iteration_time = sum(times.values())
             iteration_count += 1
-            
-            _, used_memory, temperature = get_gpu_info(device.index)
-            peak_memory_usage = max(peak_memory_usage, used_memory)
-            peak_temperature = max(peak_temperature, temperature)
-            
-            print(f"Iteration {iteration_count}: Time: {iteration_time:.2f}s, FLOPS: {flops_per_iteration/iteration_time:.2e}, Memory: {used_memory}MB, Temp: {temperature}°C")
-    
+
+            # Latest reading from the background sampler; never blocks on nvidia-smi
+            with profiling.region("telemetry"):
+                sample = sampler.latest(gpu_index)
+            used_memory = sample.memory_used if sample else None
+            temperature = sample.temperature if sample else None
+            with profiling.region("record"):
+                recorder.record(iteration_time=iteration_time, flops=flops_per_iteration / iteration_time,
+                                **{f"{name}_time": times[name] for name in KERNELS},
+                                **{field: getattr(sample, field) if sample else None for field in TELEMETRY_FIELDS})
+
+            with profiling.region("log"):
+                print(f"Iteration {iteration_count}: Time: {iteration_time:.2f}s, FLOPS: {flops_per_iteration/iteration_time:.2e}, Memory: {used_memory}MB, Temp: {temperature}°C")
+
+            # With --adaptive, `duration` is the longest the measurement may take and it ends as soon as the
+            # throughput is known precisely enough (gpu_tests/adaptive.py)
+            if stop is not None and stop.add(flops_per_iteration / iteration_time, time.time() - start_time):
+                break
+
     except torch.cuda.CUDAError as e:
+        peak_memory_usage = sampler.peak(gpu_index, "memory_used")
+        peak_temperature = sampler.peak(gpu_index, "temperature")
         return peak_memory_usage, peak_temperature, None, f"CUDA error during computation: {str(e)}"
-    
-    total_time = time.time() - start_time
-    average_flops = total_flops / total_time
-    
+    finally:
+        # Flushes the rows recorded so far, whatever ended the loop
+        recorder.close()
+    print(f"Time series of {recorder.rows} iterations saved to {timeseries_path}")
+
+    # Median/p5/p95 of per-iteration throughput, plus the median time of each kernel, from the full series on disk.
+    # The verdict and the stored result use the decimated overview, which is the full series for short runs.
+    columns = read_columns(timeseries_path, ["flops"] + [f"{name}_time" for name in KERNELS])
+    flops_stats = summarize(columns["flops"])
+    allocations = allocations_per_iteration(device, allocations_start, iteration_count)
+    if flops_stats is not None:
+        flops_stats["kernels"] = {name: summarize(columns[f"{name}_time"])["median"] for name in KERNELS}
+        flops_stats["allocations"] = allocations
+        flops_stats["throughputs"] = recorder.overview.series("flops")
+        flops_stats["times"] = [t - telemetry_start for t in recorder.overview.series("timestamp")]
+        flops_stats["timeseries"] = timeseries_path
+        flops_stats["warmup"] = warmup
+        flops_stats["adaptive"] = stop.summary() if stop is not None else None
+        for name, kernel_time in flops_stats["kernels"].items():
+            print(f"{name}: median {kernel_time*1e3:.2f}ms, {kernel_flops[name]/kernel_time:.2e} FLOPS")
+    peak_memory_usage = sampler.peak(gpu_index, "memory_used", since=telemetry_start)
+    peak_temperature = sampler.peak(gpu_index, "temperature", since=telemetry_start)
+    mean_power = sampler.mean(gpu_index, "power", since=telemetry_start)
+    mean_sm_clock = sampler.mean(gpu_index, "sm_clock", since=telemetry_start)
+    if mean_power is not None and mean_sm_clock is not None:
+        print(f"Mean power: {mean_power:.1f}W, Mean SM clock: {mean_sm_clock:.0f}MHz")
+
     print(f"Benchmark completed on {device}")
-    return peak_memory_usage, peak_temperature, average_flops, None
+    return peak_memory_usage, peak_temperature, flops_stats, None
+
+def adaptive_benchmark(device, sampler, duration, gpu_index, adaptive=None, adaptive_max=MAX_SECONDS, reference=None,
+                       **options):
+    # gpu_benchmark for `duration` seconds, or with `adaptive` (a relative confidence interval width) until the
+    # throughput has settled, for at most `adaptive_max` seconds. A GPU whose short run looks suspicious (it did not
+    # settle, fails its verdict or runs hot) is benchmarked again for the full `duration`.
+    if adaptive is None:
+        return gpu_benchmark(device, sampler, duration, gpu_index=gpu_index, **options)
+    stop = AdaptiveStop(adaptive, max_seconds=min(adaptive_max, duration))
+    outcome = gpu_benchmark(device, sampler, stop.max_seconds, gpu_index=gpu_index, stop=stop, **options)
+    _, peak_temperature, flops_stats, error = outcome
+    if error or flops_stats is None:
+        return outcome
+    verdict = performance_verdict(flops_stats["throughputs"], flops_stats["times"], reference)
+    reasons = escalation_reasons(flops_stats["adaptive"], verdict, peak_temperature)
+    print("\n".join(f"GPU {gpu_index} {line}" for line in format_adaptive(flops_stats["adaptive"])))
+    if not reasons or duration <= stop.max_seconds:
+        return outcome
+    print(f"GPU {gpu_index}: escalating to the full {duration:.0f}s benchmark: {'; '.join(reasons)}")
+    # Already warm and past the start barrier
+    options.update(ready=None, steady_warmup=None)
+    outcome = gpu_benchmark(device, sampler, duration, gpu_index=gpu_index, **options)
+    if outcome[2] is not None:
+        outcome[2]["warmup"] = flops_stats["warmup"]
+        outcome[2]["adaptive"] = dict(flops_stats["adaptive"], escalated=reasons)
+    return outcome
+
+def benchmark_worker(gpu_index, ready, backend, warmup_iterations, in_place, duration, timeseries_dir, steady_warmup,
+                     adaptive, adaptive_max, references):
+    # Runs in its own process in --parallel mode, with a telemetry stream for just this device
+    device = devices.get_device(backend, gpu_index)
+    with TelemetrySampler(devices.telemetry_backend(backend, [gpu_index])) as sampler:
+        sampler.wait_ready(gpu_index)
+        total_memory = sampler.memory_total(gpu_index)
+        return (total_memory,) + adaptive_benchmark(device, sampler, duration, gpu_index, adaptive, adaptive_max,
+                                                    references[gpu_index], ready=ready, warmup_iterations=warmup_iterations,
+                                                    in_place=in_place, timeseries_dir=timeseries_dir,
+                                                    steady_warmup=steady_warmup)
+
+def append_report(report, gpu_index, gpu_name, total_memory, peak_memory_usage, peak_temperature, flops_stats, error,
+                  reference=None):
+    # `reference`: the FLOPS baseline of this GPU model, if the baseline store has one
+    if error:
+        status = "FAIL"
+        report.append(f"GPU {gpu_index}: {gpu_name}")
+        report.append(f"Status: {status}")
+        report.append(f"Error: {error}")
+    else:
+        telemetry_error = missing_telemetry(total_memory, peak_memory_usage, peak_temperature)
+        memory_utilization = (peak_memory_usage / total_memory) * 100 if telemetry_error is None else None
+        telemetry_ok = telemetry_error is None and memory_utilization > 75 and peak_temperature < 85
+        # Slow or throttling GPUs fail as well: see gpu_tests/verdict.py
+        if flops_stats is not None:
+            flops_stats["verdict"] = performance_verdict(flops_stats["throughputs"], flops_stats["times"], reference)
+        performance_ok = flops_stats is not None and flops_stats["verdict"]["verdict"] == "PASS"
+        status = "PASS" if telemetry_ok and performance_ok else "FAIL"
+
+        report.append(f"GPU {gpu_index}: {gpu_name}")
+        report.append(f"Status: {status}")
+        if telemetry_error is not None:
+            report.append(f"Error: {telemetry_error}")
+        if flops_stats is not None:
+            verdict = flops_stats["verdict"]
+            report.append(f"Performance: {flops_stats['median']:.2e} FLOPS")
+            report.append(f"Performance p5/p95: {flops_stats['p5']:.2e} / {flops_stats['p95']:.2e} FLOPS")
+            kernel_times = ", ".join(f"{name} {t*1e3:.2f}ms" for name, t in flops_stats["kernels"].items())
+            report.append(f"Kernel Time (median): {kernel_times}")
+            if flops_stats["allocations"] is not None:
+                report.append(f"Allocations per Iteration: {flops_stats['allocations']:.2f}")
+            if flops_stats["warmup"] is not None:
+                report.extend(format_warmup(flops_stats["warmup"]))
+            if flops_stats["adaptive"] is not None:
+                report.extend(format_adaptive(flops_stats["adaptive"]))
+            if reference is not None:
+                report.append(f"Baseline: {reference['median']:.2e} FLOPS over {reference['count']} GPUs, "
+                              f"deviation {verdict['deviation_sigmas']:.1f} sigma")
+            throttle = verdict["throttling"]
+            if throttle is not None:
+                report.append(f"Throttling: onset at {throttle['onset_s']:.0f}s, severity {throttle['severity']:.0%} "
+                              f"(worst {throttle['worst']:.0%})")
+            for reason in verdict["reasons"]:
+                report.append(f"Performance FAIL: {reason}")
+        report.append(f"Peak Memory Utilization: {format_utilization(memory_utilization)}")
+        report.append(f"Peak Temperature: {format_temperature(peak_temperature)}")
+
+    report.append("")
+    return status
 
-def main(gpus):
+def record_result(results, parameters, gpu_index, gpu_name, status, total_memory=None, peak_memory_usage=None,
+                  peak_temperature=None, flops_stats=None, error=None):
+    metrics = {
+        "memory_total_mb": total_memory,
+        "peak_memory_mb": peak_memory_usage,
+        "memory_utilization_pct": peak_memory_usage / total_memory * 100 if peak_memory_usage is not None and total_memory else None,
+        "peak_temperature_c": peak_temperature,
+    }
+    iterations = None
+    if flops_stats is not None:
+        metrics.update({f"flops_{stat}": flops_stats[stat] for stat in ["median", "mean", "min", "p5", "p95", "max"]})
+        metrics.update({f"{name}_time_s": kernel_time for name, kernel_time in flops_stats["kernels"].items()})
+        metrics["allocations_per_iteration"] = flops_stats["allocations"]
+        if flops_stats["warmup"] is not None:
+            metrics["warmup_s"] = flops_stats["warmup"]["seconds"]
+            metrics["warmup_steady"] = int(flops_stats["warmup"]["state"] == "steady")
+        if flops_stats["adaptive"] is not None:
+            metrics["adaptive_s"] = flops_stats["adaptive"]["seconds"]
+            metrics["adaptive_converged"] = int(flops_stats["adaptive"]["state"] == "converged")
+            metrics["escalated"] = int(bool(flops_stats["adaptive"]["escalated"]))
+        verdict = flops_stats.get("verdict")
+        if verdict is not None:
+            throttle = verdict["throttling"] or {}
+            metrics["baseline_deviation_sigmas"] = verdict["deviation_sigmas"]
+            metrics["throttle_onset_s"] = throttle.get("onset_s")
+            metrics["throttle_severity"] = throttle.get("severity", 0.0)
+            error = error or "; ".join(verdict["reasons"]) or None
+        # The decimated overview (at most OVERVIEW_BUCKETS values); the full series stays in flops_stats["timeseries"]
+        iterations = {"flops": flops_stats["throughputs"], "elapsed_s": flops_stats["times"],
+                      "timeseries": flops_stats["timeseries"]}
+    if error is None:
+        error = missing_telemetry(total_memory, peak_memory_usage, peak_temperature)
+    results.add(gpu_index, gpu_name, parameters, metrics, status, iterations, error)
+
+def main(gpus, backend="cuda", parallel=False, warmup_iterations=3, sweep=False, sweep_dtypes=None, sweep_size=None,
+         in_place=False, duration=600, results_path=None, baseline_db=None, timeseries_dir=None, steady_warmup=None,
+         adaptive=None, adaptive_max=MAX_SECONDS, threads=False):
     hostname = socket.gethostname()
-    report_file = f"{hostname}_performance.txt"
+    timeseries_dir = timeseries_dir or f"{hostname}_timeseries"
+    report_file = f"{hostname}_gemm_sweep.txt" if sweep else f"{hostname}_performance.txt"
     report = []
+    results = ResultWriter("gemm_sweep" if sweep else "perf", backend, results_path or default_jsonl_path(), baseline_db)
+    parameters = {"duration": duration, "warmup": warmup_iterations, "in_place": in_place, "parallel": parallel}
+    if steady_warmup is not None:
+        # Only set when used, so that warmed-up runs get their own baseline and earlier baselines still match
+        parameters["steady_warmup"] = True
+    if adaptive is not None:
+        # Likewise for adaptive runs, which are shorter
+        parameters["adaptive"] = adaptive
+    if threads:
+        # And for GPUs measured at the same time on threads, like "parallel"
+        parameters["threads"] = True
 
-    for gpu_index in gpus:
-        if gpu_index >= torch.cuda.device_count():
-            print(f"Error: GPU index {gpu_index} is out of range. Available GPUs: {torch.cuda.device_count()}")
-            continue
-
-        device = torch.device(f'cuda:{gpu_index}')
-        gpu_name = torch.cuda.get_device_name(gpu_index)
-        total_memory, _, _ = get_gpu_info(gpu_index)
-        print(f"Testing GPU {gpu_index}: {gpu_name} (Total memory: {total_memory} MB)")
-        
+    # Per-model FLOPS baselines from earlier runs on other hosts with the same parameters, looked up once per model
+    store = BaselineStore(baseline_db) if baseline_db and os.path.exists(baseline_db) else None
+    baselines = {}
+    def reference(gpu_name):
+        if store is not None and gpu_name not in baselines:
+            baselines[gpu_name] = baseline(store, "perf", "flops_median", gpu_name, parameters, exclude_host=node_name())
+        return baselines.get(gpu_name)
+
+    available = devices.device_count(backend)
+    for gpu_index in [g for g in gpus if g >= available]:
+        print(f"Error: GPU index {gpu_index} is out of range. Available GPUs: {available}")
+    gpus = [g for g in gpus if g < available]
+
+    if sweep:
+        # Fake CPU devices get a small default size so the sweep finishes in seconds
+        size = sweep_size or (8192 if backend == "cuda" else 256)
+        run_gemm_sweeps(gpus, backend, report, warmup_iterations, sweep_dtypes, size, results)
+    elif parallel:
+        run_benchmarks_parallel(gpus, backend, report, warmup_iterations, in_place, duration, results, parameters,
+                                reference, timeseries_dir, steady_warmup, adaptive, adaptive_max)
+    else:
+        sampler = TelemetrySampler(devices.telemetry_backend(backend, gpus)).start()
         try:
-            peak_memory_usage, peak_temperature, average_flops, error = gpu_benchmark(device)
-            
-            if error:
-                status = "FAIL"
-                report.append(f"GPU {gpu_index}: {gpu_name}")
-                report.append(f"Status: {status}")
-                report.append(f"Error: {error}")
-            else:
-                memory_utilization = (peak_memory_usage / total_memory) * 100
-                status = "PASS" if memory_utilization > 75 and peak_temperature < 85 and average_flops is not None else "FAIL"
-                
-                report.append(f"GPU {gpu_index}: {gpu_name}")
-                report.append(f"Status: {status}")
-                report.append(f"Performance: {average_flops:.2e} FLOPS")
-                report.append(f"Peak Memory Utilization: {memory_utilization:.2f}%")
-                report.append(f"Peak Temperature: {peak_temperature}°C")
-            
-            report.append("")
-        except Exception as e:
-            report.append(f"GPU {gpu_index}: {gpu_name}")
-            report.append(f"Status: FAIL")
-            report.append(f"Error: Unexpected error - {str(e)}")
-            report.append("")
+            run_benchmarks(gpus, backend, sampler, report, warmup_iterations, in_place, duration, results, parameters,
+                           reference, timeseries_dir, steady_warmup, adaptive, adaptive_max, threads)
+        finally:
+            sampler.stop()
+    if store is not None:
+        store.close()
 
     with open(report_file, 'w') as f:
         f.write("\n".join(report))
-    
+    results.close()
+
     print(f"Report saved to {report_file}")
 
+def run_benchmarks(gpus, backend, sampler, report, warmup_iterations, in_place, duration, results, parameters,
+                   reference, timeseries_dir, steady_warmup, adaptive=None, adaptive_max=MAX_SECONDS, threads=False):
+    # One GPU after another, or with `threads` all of them at once on threads of this process, which share its
+    # start-up, telemetry sampler and CUDA contexts (the kernels release the GIL while the GPUs work)
+    names = {gpu_index: devices.device_name(backend, gpu_index) for gpu_index in gpus}
+    references = {gpu_index: reference(names[gpu_index]) for gpu_index in gpus}
+    outcomes = {}
+
+    def measure(gpu_index):
+        device = devices.get_device(backend, gpu_index)
+        try:
+            with devices.device_context(device):
+                sampler.wait_ready(gpu_index)
+                total_memory = sampler.memory_total(gpu_index)
+                print(f"Testing GPU {gpu_index}: {names[gpu_index]} (Total memory: {format_memory(total_memory)})")
+                outcome = adaptive_benchmark(device, sampler, duration, gpu_index, adaptive, adaptive_max,
+                                             references[gpu_index], warmup_iterations=warmup_iterations,
+                                             in_place=in_place, timeseries_dir=timeseries_dir,
+                                             steady_warmup=steady_warmup)
+            outcomes[gpu_index] = ((total_memory,) + outcome, None)
+        except Exception as e:
+            outcomes[gpu_index] = (None, str(e))
+
+    if threads:
+        print(f"Benchmarking GPUs {', '.join(str(g) for g in gpus)} concurrently on threads")
+        workers = [threading.Thread(target=measure, args=(gpu_index,), name=f"gpu{gpu_index}") for gpu_index in gpus]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    for gpu_index in gpus:
+        if not threads:
+            measure(gpu_index)
+        result, error = outcomes[gpu_index]
+        if error:
+            append_error(report, gpu_index, names[gpu_index], error)
+            record_result(results, parameters, gpu_index, names[gpu_index], "FAIL", error=f"Unexpected error - {error}")
+        else:
+            status = append_report(report, gpu_index, names[gpu_index], *result, references[gpu_index])
+            record_result(results, parameters, gpu_index, names[gpu_index], status, *result)
+
+def run_gemm_sweeps(gpus, backend, report, warmup_iterations, dtypes, size, results):
+    for gpu_index in gpus:
+        device = devices.get_device(backend, gpu_index)
+        gpu_name = devices.device_name(backend, gpu_index)
+        print(f"GEMM sweep on GPU {gpu_index}: {gpu_name} (base size {size})")
+
+        try:
+            rows = gemm_sweep(device, dtypes, size=size, warmup_iterations=warmup_iterations)
+            table = format_sweep_table(rows)
+            print("\n".join(table))
+
+            report.append(f"GPU {gpu_index}: {gpu_name}")
+            report.extend(table)
+            report.append("")
+            for row in rows:
+                parameters = {"dtype": row["dtype"], "shape": row["shape"], "size": size, "warmup": warmup_iterations}
+                metrics = {"tflops": row["tflops"], "peak_tflops": row["peak_tflops"], "efficiency": row["efficiency"]}
+                verdict = None if row["efficiency"] is None else "PASS" if row["efficiency"] >= MIN_EFFICIENCY else "FAIL"
+                results.add(gpu_index, gpu_name, parameters, metrics, verdict, error=row["error"])
+        except Exception as e:
+            append_error(report, gpu_index, gpu_name, str(e))
+
+def run_benchmarks_parallel(gpus, backend, report, warmup_iterations, in_place, duration, results, parameters,
+                            reference, timeseries_dir, steady_warmup, adaptive=None, adaptive_max=MAX_SECONDS):
+    print(f"Benchmarking GPUs {', '.join(str(g) for g in gpus)} concurrently")
+    # The workers cannot use the baseline store, so they get the baselines of their models with their arguments
+    names = {gpu_index: devices.device_name(backend, gpu_index) for gpu_index in gpus}
+    references = {gpu_index: reference(names[gpu_index]) for gpu_index in gpus}
+    outcomes = run_parallel(benchmark_worker, gpus, args=(backend, warmup_iterations, in_place, duration,
+                                                          timeseries_dir, steady_warmup, adaptive, adaptive_max,
+                                                          references))
+    for gpu_index in gpus:
+        gpu_name = names[gpu_index]
+        result, error = outcomes[gpu_index]
+        if error:
+            append_error(report, gpu_index, gpu_name, error)
+            record_result(results, parameters, gpu_index, gpu_name, "FAIL", error=f"Unexpected error - {error}")
+        else:
+            status = append_report(report, gpu_index, gpu_name, *result, references[gpu_index])
+            record_result(results, parameters, gpu_index, gpu_name, status, *result)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="GPU Performance Benchmark")
     parser.add_argument("--gpu", type=int, nargs='*', help="GPU indices to test (default: all GPUs)")
+    parser.add_argument("--parallel", action="store_true", help="Benchmark all selected GPUs at the same time, one process per GPU")
+    parser.add_argument("--device", choices=devices.BACKENDS, default="cuda", help="Device backend; 'cpu' runs on fake devices for testing (default: cuda)")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed warmup iterations before measuring (default: 3)")
+    parser.add_argument("--sweep", action="store_true", help="Run a GEMM throughput sweep over dtypes and shapes instead of the 10 minute benchmark")
+    parser.add_argument("--sweep-dtypes", nargs='*', choices=list(DTYPES), help="Data types to sweep (default: all)")
+    parser.add_argument("--sweep-size", type=int, help="Base matrix size for the sweep (default: 8192, 256 on --device cpu)")
+    parser.add_argument("--in-place", action="store_true", help="Reuse preallocated output buffers instead of allocating every iteration")
+    parser.add_argument("--duration", type=float, default=600, help="Seconds to benchmark each GPU (default: 600)")
+    parser.add_argument("--results", help="JSONL file the structured results are appended to (default: hostname_results.jsonl)")
+    parser.add_argument("--baseline-db", help="Also add the results to this SQLite baseline store, and judge performance against it")
+    parser.add_argument("--timeseries", help="Directory for the per-iteration time series, one subdirectory per GPU (default: hostname_timeseries)")
+    parser.add_argument("--steady-warmup", type=float, nargs='?', const=DEFAULT_TIMEOUT, metavar="TIMEOUT", help=f"Before measuring, run the kernel until clocks, power and temperature reach steady state, for at most TIMEOUT seconds (default: off, {DEFAULT_TIMEOUT} if given without a value)")
+    parser.add_argument("--threads", action="store_true", help="Benchmark all selected GPUs at the same time on threads of one process, which share its start-up and CUDA contexts")
+    parser.add_argument("--adaptive", type=float, nargs='?', const=DEFAULT_REL_WIDTH, metavar="REL_WIDTH", help=f"Stop measuring each GPU once the 95%% confidence interval of its throughput is within ±REL_WIDTH of the mean; GPUs that do not settle, fail or run hot are benchmarked again for --duration (default: off, {DEFAULT_REL_WIDTH} if given without a value)")
+    parser.add_argument("--adaptive-max", type=float, default=MAX_SECONDS, help=f"Longest adaptive measurement in seconds (default: {MAX_SECONDS})")
+    parser.add_argument("--profile", metavar="DIR", help="Time the sections of the benchmark loop and write a Chrome trace and summary per process to DIR (default: off)")
+    parser.add_argument("--torch-profiler", action="store_true", help="With --profile, also run torch.profiler and export its trace; for short runs")
     args = parser.parse_args()
+    if args.sweep and args.parallel:
+        parser.error("--sweep runs one GPU at a time and cannot be combined with --parallel")
+    if args.threads and args.parallel:
+        parser.error("--threads and --parallel are two ways of benchmarking the GPUs at the same time; give one")
 
-    if torch.cuda.is_available():
-        gpus = args.gpu if args.gpu is not None else range(torch.cuda.device_count())
-        main(gpus)
+    if devices.is_available(args.device):
+        gpus = args.gpu if args.gpu is not None else range(devices.device_count(args.device))
+        with profiling.session(args.profile, "perf", args.torch_profiler):
+            main(gpus, args.device, args.parallel, args.warmup, args.sweep, args.sweep_dtypes, args.sweep_size,
+                 args.in_place, args.duration, args.results, args.baseline_db, args.timeseries, args.steady_warmup,
+                 args.adaptive, args.adaptive_max, args.threads)
     else:
-        print("No CUDA-capable GPUs found.")
\ No newline at end of file
+        print("No CUDA-capable GPUs found.")
@@ -1,109 +1,214 @@
 import torch
 import time
 import argparse
-import subprocess
 import os
+import sys
 import socket
 
-def run_command(command):
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, shell=True)
-    return result.stdout.strip()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests import devices
+from gpu_tests.correctness import CorruptionLog, GemmVerifier
+from gpu_tests.parallel import run_parallel
+from gpu_tests.kernels import allocate_stress_kernel, allocation_count, allocations_per_iteration
+from gpu_tests.report import append_error, format_memory, format_temperature, format_utilization, missing_telemetry
+from gpu_tests.results import ResultWriter, default_jsonl_path
+from gpu_tests.telemetry import TelemetrySampler
 
-def get_gpu_info(gpu_index):
-    memory_info = run_command(f"nvidia-smi --query-gpu=memory.total,memory.used --format=csv,noheader,nounits -i {gpu_index}")
-    total_memory, used_memory = map(int, memory_info.split(','))
-    temperature = int(run_command(f"nvidia-smi --query-gpu=temperature.gpu --format=csv,noheader,nounits -i {gpu_index}"))
-    return total_memory, used_memory, temperature
-
-def gpu_stress_test(device, duration=180):
+def gpu_stress_test(device, sampler, duration=180, gpu_index=None, ready=None, in_place=False, verify=False,
+                    reference_gpu=None):
     print(f"Starting GPU stress test on {device}")
-    start_time = time.time()
-    
-    total_memory = torch.cuda.get_device_properties(device).total_memory
-    tensor_size = int((total_memory * 0.9) ** 0.5 // 8)
-    
-    print(f"Creating tensors of size {tensor_size}x{tensor_size}")
-    
+    # Fake (CPU) devices have no index of their own, so telemetry is looked up by the requested GPU index
+    gpu_index = device.index if gpu_index is None else gpu_index
+
+    # Sized from free memory for all live buffers, shrinking on OOM. Verification seeds the inputs, so that every
+    # run of the same size multiplies the same matrices.
     try:
-        a = torch.randn(tensor_size, tensor_size, dtype=torch.float64, device=device)
-        b = torch.randn(tensor_size, tensor_size, dtype=torch.float64, device=device)
+        tensor_size, kernel = allocate_stress_kernel(device, in_place=in_place, seed=0 if verify else None)
     except torch.cuda.OutOfMemoryError:
-        return None, None, "CUDA out of memory error during tensor creation"
-    
-    peak_memory_usage = 0
-    peak_temperature = 0
-    
+        return None, None, None, None, "CUDA out of memory error during tensor creation"
+
+    # Silent data corruption checks (see gpu_tests/correctness.py), cross-checked on the CPU or another GPU
+    corruption = CorruptionLog(gpu_index) if verify else None
+    verifier = None
+    if verify:
+        reference_device = devices.get_device(device.type, reference_gpu) if reference_gpu is not None else None
+        verifier = GemmVerifier(kernel, corruption, reference_device, seed=gpu_index)
+
+    # In parallel mode, wait here until every device has allocated its tensors
+    if ready is not None:
+        ready()
+    start_time = time.time()
+    telemetry_start = time.monotonic()
+    allocations_start = allocation_count(device)
+    iteration_count = 0
+
     while time.time() - start_time < duration:
         try:
-            c = torch.matmul(a, b)
-            d = torch.sin(c) + torch.cos(c)
-            result = torch.sum(d)
-            
+            if verifier is None:
+                result = kernel()
+            else:
+                kernel.gemm()
+                verifier.check_gemm()
+                kernel.elementwise()
+                kernel.reduction()
+                result = kernel.result
+            iteration_count += 1
+
             elapsed = time.time() - start_time
-            print(f"Elapsed time: {elapsed:.2f} seconds, Result: {result.item()}")
-            
-            torch.cuda.synchronize(device)
-            
-            _, used_memory, temperature = get_gpu_info(device.index)
-            peak_memory_usage = max(peak_memory_usage, used_memory)
-            peak_temperature = max(peak_temperature, temperature)
+            value = result.item()
+            print(f"Elapsed time: {elapsed:.2f} seconds, Result: {value}")
+            if verifier is not None:
+                verifier.check_result(value)
+
+            devices.synchronize(device)
         except torch.cuda.CUDAError as e:
-            return peak_memory_usage, peak_temperature, f"CUDA error during computation: {str(e)}"
-    
+            peak_memory_usage = sampler.peak(gpu_index, "memory_used", since=telemetry_start)
+            peak_temperature = sampler.peak(gpu_index, "temperature", since=telemetry_start)
+            return peak_memory_usage, peak_temperature, None, corruption, f"CUDA error during computation: {str(e)}"
+
+    # Peaks come from the background sampler so nvidia-smi never runs inside the loop
+    peak_memory_usage = sampler.peak(gpu_index, "memory_used", since=telemetry_start)
+    peak_temperature = sampler.peak(gpu_index, "temperature", since=telemetry_start)
+    allocations = allocations_per_iteration(device, allocations_start, iteration_count)
     print(f"Test completed on {device}")
-    return peak_memory_usage, peak_temperature, None
+    return peak_memory_usage, peak_temperature, allocations, corruption, None
+
+def stress_worker(gpu_index, ready, backend, in_place, duration, verify, reference_gpu):
+    # Runs in its own process in --parallel mode, with a telemetry stream for just this device
+    device = devices.get_device(backend, gpu_index)
+    with TelemetrySampler(devices.telemetry_backend(backend, [gpu_index])) as sampler:
+        sampler.wait_ready(gpu_index)
+        total_memory = sampler.memory_total(gpu_index)
+        return (total_memory,) + gpu_stress_test(device, sampler, duration, gpu_index=gpu_index, ready=ready, in_place=in_place,
+                                                 verify=verify, reference_gpu=reference_gpu)
+
+def append_report(report, gpu_index, gpu_name, total_memory, peak_memory_usage, peak_temperature, allocations, corruption,
+                  cuda_error):
+    if cuda_error:
+        status = "FAIL"
+        report.append(f"GPU {gpu_index}: {gpu_name}")
+        report.append(f"Status: {status}")
+        report.append(f"Error: {cuda_error}")
+        if corruption is not None:
+            report.extend(corruption.format())
+    else:
+        telemetry_error = missing_telemetry(total_memory, peak_memory_usage, peak_temperature)
+        memory_utilization = (peak_memory_usage / total_memory) * 100 if telemetry_error is None else None
+        telemetry_ok = telemetry_error is None and memory_utilization > 75 and peak_temperature < 85
+        # A GPU that computes wrong results fails however well it runs otherwise
+        data_ok = corruption is None or corruption.total == 0
+        status = "PASS" if telemetry_ok and data_ok else "FAIL"
+
+        report.append(f"GPU {gpu_index}: {gpu_name}")
+        report.append(f"Status: {status}")
+        if telemetry_error is not None:
+            report.append(f"Error: {telemetry_error}")
+        report.append(f"Peak Memory Utilization: {format_utilization(memory_utilization)}")
+        report.append(f"Peak Temperature: {format_temperature(peak_temperature)}")
+        if allocations is not None:
+            report.append(f"Allocations per Iteration: {allocations:.2f}")
+        if corruption is not None:
+            report.extend(corruption.format())
 
-def main(gpus):
+    report.append("")
+    return status
+
+def record_result(results, parameters, gpu_index, gpu_name, status, total_memory=None, peak_memory_usage=None,
+                  peak_temperature=None, allocations=None, corruption=None, error=None):
+    metrics = {
+        "memory_total_mb": total_memory,
+        "peak_memory_mb": peak_memory_usage,
+        "memory_utilization_pct": peak_memory_usage / total_memory * 100 if peak_memory_usage is not None and total_memory else None,
+        "peak_temperature_c": peak_temperature,
+        "allocations_per_iteration": allocations,
+    }
+    iterations = None
+    if corruption is not None:
+        metrics["data_errors"] = corruption.total
+        metrics.update({f"data_errors_{kind}": count for kind, count in corruption.counts.items()})
+        iterations = {"data_errors": corruption.to_dict()}
+        if corruption.total and error is None:
+            error = f"{corruption.total} data errors"
+    if error is None:
+        error = missing_telemetry(total_memory, peak_memory_usage, peak_temperature)
+    results.add(gpu_index, gpu_name, parameters, metrics, status, iterations, error)
+
+def main(gpus, backend="cuda", parallel=False, in_place=False, duration=180, results_path=None, baseline_db=None,
+         verify=False, reference_gpu=None):
     hostname = socket.gethostname()
     report_file = f"{hostname}.txt"
     report = []
+    results = ResultWriter("stress", backend, results_path or default_jsonl_path(), baseline_db)
+    parameters = {"duration": duration, "in_place": in_place, "parallel": parallel}
+    if verify:
+        parameters["verify"] = True
 
-    for gpu_index in gpus:
-        if gpu_index >= torch.cuda.device_count():
-            print(f"Error: GPU index {gpu_index} is out of range. Available GPUs: {torch.cuda.device_count()}")
-            continue
-
-        device = torch.device(f'cuda:{gpu_index}')
-        gpu_name = torch.cuda.get_device_name(gpu_index)
-        total_memory, _, _ = get_gpu_info(gpu_index)
-        print(f"Testing GPU {gpu_index}: {gpu_name} (Total memory: {total_memory} MB)")
-        
+    available = devices.device_count(backend)
+    for gpu_index in [g for g in gpus if g >= available]:
+        print(f"Error: GPU index {gpu_index} is out of range. Available GPUs: {available}")
+    gpus = [g for g in gpus if g < available]
+
+    if parallel:
+        run_tests_parallel(gpus, backend, report, in_place, duration, results, parameters, verify, reference_gpu)
+    else:
+        sampler = TelemetrySampler(devices.telemetry_backend(backend, gpus)).start()
         try:
-            peak_memory_usage, peak_temperature, cuda_error = gpu_stress_test(device)
-            
-            if cuda_error:
-                status = "FAIL"
-                report.append(f"GPU {gpu_index}: {gpu_name}")
-                report.append(f"Status: {status}")
-                report.append(f"Error: {cuda_error}")
-            else:
-                memory_utilization = (peak_memory_usage / total_memory) * 100
-                status = "PASS" if memory_utilization > 75 and peak_temperature < 85 else "FAIL"
-                
-                report.append(f"GPU {gpu_index}: {gpu_name}")
-                report.append(f"Status: {status}")
-                report.append(f"Peak Memory Utilization: {memory_utilization:.2f}%")
-                report.append(f"Peak Temperature: {peak_temperature}°C")
-            
-            report.append("")
-        except Exception as e:
-            report.append(f"GPU {gpu_index}: {gpu_name}")
-            report.append(f"Status: FAIL")
-            report.append(f"Error: Unexpected error - {str(e)}")
-            report.append("")
+            run_tests(gpus, backend, sampler, report, in_place, duration, results, parameters, verify, reference_gpu)
+        finally:
+            sampler.stop()
 
     with open(report_file, 'w') as f:
         f.write("\n".join(report))
-    
+    results.close()
+
     print(f"Report saved to {report_file}")
 
+def run_tests(gpus, backend, sampler, report, in_place, duration, results, parameters, verify, reference_gpu):
+    for gpu_index in gpus:
+        device = devices.get_device(backend, gpu_index)
+        gpu_name = devices.device_name(backend, gpu_index)
+        sampler.wait_ready(gpu_index)
+        total_memory = sampler.memory_total(gpu_index)
+        print(f"Testing GPU {gpu_index}: {gpu_name} (Total memory: {format_memory(total_memory)})")
+
+        try:
+            outcome = gpu_stress_test(device, sampler, duration, gpu_index=gpu_index, in_place=in_place, verify=verify,
+                                      reference_gpu=reference_gpu)
+            status = append_report(report, gpu_index, gpu_name, total_memory, *outcome)
+            record_result(results, parameters, gpu_index, gpu_name, status, total_memory, *outcome)
+        except Exception as e:
+            append_error(report, gpu_index, gpu_name, str(e))
+            record_result(results, parameters, gpu_index, gpu_name, "FAIL", error=f"Unexpected error - {e}")
+
+def run_tests_parallel(gpus, backend, report, in_place, duration, results, parameters, verify, reference_gpu):
+    print(f"Testing GPUs {', '.join(str(g) for g in gpus)} concurrently")
+    outcomes = run_parallel(stress_worker, gpus, args=(backend, in_place, duration, verify, reference_gpu))
+    for gpu_index in gpus:
+        gpu_name = devices.device_name(backend, gpu_index)
+        result, error = outcomes[gpu_index]
+        if error:
+            append_error(report, gpu_index, gpu_name, error)
+            record_result(results, parameters, gpu_index, gpu_name, "FAIL", error=f"Unexpected error - {error}")
+        else:
+            status = append_report(report, gpu_index, gpu_name, *result)
+            record_result(results, parameters, gpu_index, gpu_name, status, *result)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="GPU Hardware Acceptance Test")
     parser.add_argument("--gpu", type=int, nargs='*', help="GPU indices to test (default: all GPUs)")
+    parser.add_argument("--parallel", action="store_true", help="Test all selected GPUs at the same time, one process per GPU")
+    parser.add_argument("--device", choices=devices.BACKENDS, default="cuda", help="Device backend; 'cpu' runs on fake devices for testing (default: cuda)")
+    parser.add_argument("--in-place", action="store_true", help="Reuse preallocated output buffers instead of allocating every iteration")
+    parser.add_argument("--duration", type=float, default=180, help="Seconds to stress each GPU (default: 180)")
+    parser.add_argument("--results", help="JSONL file the structured results are appended to (default: hostname_results.jsonl)")
+    parser.add_argument("--baseline-db", help="Also add the results to this SQLite baseline store")
+    parser.add_argument("--verify", action="store_true", help="Check the results for silent data corruption: GEMM checksums every iteration, a CPU cross-check every minute and a repeatable reduction")
+    parser.add_argument("--reference-gpu", type=int, help="Cross-check on this GPU instead of the CPU")
     args = parser.parse_args()
 
-    if torch.cuda.is_available():
-        gpus = args.gpu if args.gpu is not None else range(torch.cuda.device_count())
-        main(gpus)
+    if devices.is_available(args.device):
+        gpus = args.gpu if args.gpu is not None else range(devices.device_count(args.device))
+        main(gpus, args.device, args.parallel, args.in_place, args.duration, args.results, args.baseline_db, args.verify,
+             args.reference_gpu)
     else:
-        print("No CUDA-capable GPUs found.")
\ No newline at end of file
+        print("No CUDA-capable GPUs found.")
@@ -1,22 +1,21 @@
 import torch
 import time
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gpu_tests.kernels import allocate_stress_kernel
 
 def gpu_stress_test(device, duration=180):
     print(f"Starting GPU stress test on {device}")
     start_time = time.time()
     
-    # Create a large tensor
-    size = 10000
-    a = torch.randn(size, size, device=device)
-    b = torch.randn(size, size, device=device)
+    # Create a large tensor, shrinking it if it does not fit on a smaller GPU
+    size, kernel = allocate_stress_kernel(device, torch.float32, size=10000)
     
     while time.time() - start_time < duration:
-        # Perform matrix multiplication
-        c = torch.matmul(a, b)
-        # Perform element-wise operations
-        d = torch.sin(c) + torch.cos(c)
-        # Reduce
-        result = torch.sum(d)
+        # Matrix multiplication, element-wise sin + cos, then reduce (see gpu_tests/kernels.py)
+        result = kernel()
         
         # Print progress
         elapsed = time.time() - start_time